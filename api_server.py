@@ -3,9 +3,10 @@ import os
 # os.environ["CUDA_VISIBLE_DEVICES"] = "7"
 
 import asyncio
+import base64
 import io
 import traceback
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,22 +15,296 @@ import argparse
 import json
 import asyncio
 import time
+import struct
 import numpy as np
 import soundfile as sf
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from indextts.infer_vllm import IndexTTS
+from indextts.utils.admission import AdmissionController, AdmissionRejected
+from indextts.utils.job_manager import JobManager
+from indextts.utils.metrics import RequestTimings, update_service_gauges
+from indextts.utils.priority import PRIORITY_NORMAL, parse_priority
+from indextts.utils.replica_router import ReplicaRouter
+from indextts.utils.sampling import parse_sampling
+from indextts.utils.warmup import load_warmup_texts, run_startup_warmup, select_warmup_speaker
 
 tts = None
+admission = None
+jobs = None
+# 因客户端断开 / 超过截止时间而中止的请求数
+abort_stats = {"client_disconnected": 0, "deadline_exceeded": 0}
+# 启动预热的状态：pending / running / done / failed / disabled，/ready 在 pending / running 时返回 503
+# failed 表示重试后仍然失败，此时服务照常就绪，失败原因在 /ready 的 warmup 字段中
+warmup_state = {"status": "pending"}
+
+
+class RequestAborted(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason  # "client_disconnected" / "deadline_exceeded"
+
+
+class InvalidRequest(Exception):
+    """请求参数不合法（如采样参数越界），返回 400"""
+
+
+def request_sampling(data):
+    """请求中的采样参数（indextts.utils.sampling.parse_sampling），不合法时抛出 InvalidRequest"""
+    try:
+        return parse_sampling(data)
+    except ValueError as ex:
+        raise InvalidRequest(str(ex)) from ex
+
+
+def request_deadline(request: Request, data=None):
+    """
+    请求的截止时间（time.perf_counter 时刻），None 表示不限。
+    超时秒数依次取自请求头 X-Request-Timeout、请求体字段 timeout、启动参数 --request_timeout。
+    """
+    timeout = request.headers.get("x-request-timeout")
+    if timeout is None and data is not None:
+        timeout = data.get("timeout")
+    if timeout is None:
+        timeout = args.request_timeout
+    timeout = float(timeout) if timeout else 0.0
+    return time.perf_counter() + timeout if timeout > 0 else None
+
+
+def request_priority(request: Request, data=None):
+    """
+    请求优先级：interactive / normal / background（或 0 / 1 / 2），默认 normal。
+    依次取自请求头 X-Priority、请求体字段 priority。
+    """
+    priority = request.headers.get("x-priority")
+    if priority is None and data is not None:
+        priority = data.get("priority")
+    return parse_priority(priority)
+
+
+async def run_until_aborted(request: Request, coro, deadline=None, poll_interval=0.2):
+    """
+    执行 coro，期间定期检查客户端是否断开、是否超过截止时间；
+    中止时取消 coro（进而 abort vllm 中该请求的所有句子、跳过未执行的 bigvgan 工作）并抛出 RequestAborted。
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            timeout = poll_interval
+            if deadline is not None:
+                timeout = max(min(timeout, deadline - time.perf_counter()), 0.0)
+            done, _ = await asyncio.wait([task], timeout=timeout)
+            if done:
+                return task.result()
+            reason = None
+            if deadline is not None and time.perf_counter() >= deadline:
+                reason = "deadline_exceeded"
+            elif await request.is_disconnected():
+                reason = "client_disconnected"
+            if reason is not None:
+                abort_stats[reason] += 1
+                raise RequestAborted(reason)
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def wav_stream_header(sample_rate, channels=1, bits_per_sample=16):
+    """流式 WAV 头：总长度未知，RIFF/data 长度字段填 0xFFFFFFFF"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return b"".join([
+        b"RIFF", struct.pack("<I", 0xFFFFFFFF), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample),
+        b"data", struct.pack("<I", 0xFFFFFFFF),
+    ])
+
+
+def encode_wav(wav, sr):
+    with io.BytesIO() as wav_buffer:
+        sf.write(wav_buffer, wav, sr, format='WAV')
+        return wav_buffer.getvalue()
+
+
+async def wav_response(sr, wav, timings=None, priority=PRIORITY_NORMAL):
+    """WAV 编码在 tts 的 CPU 线程池中按请求优先级执行，不阻塞 event loop"""
+    start_time = time.perf_counter()
+    wav_bytes = await tts.run_on_cpu(encode_wav, wav, sr, priority=priority)
+    if timings is not None:
+        timings.observe("encode", time.perf_counter() - start_time)
+    return Response(content=wav_bytes, media_type="audio/wav")
+
+
+def file_range_response(request: Request, path, media_type, chunk_size=1024 * 1024):
+    """返回文件，支持单个 Range（bytes=start-end / start- / -suffix），用于大文件的断点续传与拖动播放"""
+    file_size = os.path.getsize(path)
+    start, end = 0, file_size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header and range_header.startswith("bytes=") and "," not in range_header:
+        first, _, last = range_header[len("bytes="):].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = min(int(last), file_size - 1) if last else file_size - 1
+            else:
+                start = max(file_size - int(last), 0)
+        except ValueError:
+            start, end = 0, file_size - 1
+        else:
+            if start > end or start >= file_size:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+            status_code = 206
+
+    def read_range():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if status_code == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    return StreamingResponse(read_range(), status_code=status_code, media_type=media_type, headers=headers)
+
+
+def aborted_response(ex: RequestAborted):
+    print(f">> request aborted: {ex.reason}")
+    if ex.reason == "deadline_exceeded":
+        return JSONResponse(status_code=504, content={"status": "error", "error": "request deadline exceeded"})
+    # 客户端已断开，响应不会被收到
+    return Response(status_code=499)
+
+
+def invalid_response(ex: InvalidRequest):
+    return JSONResponse(status_code=400, content={"status": "error", "error": str(ex)})
+
+
+def busy_response(ex: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(ex.retry_after)},
+        content={
+            "status": "busy",
+            "retry_after": ex.retry_after,
+            "queue": ex.status,
+        }
+    )
+
+
+async def stream_response(request, character, text, response_format="wav", seed=None, reuse_cache=False, ticket=None,
+                          deadline=None, timings=None, priority=PRIORITY_NORMAL, sampling=None):
+    """
+    先等待第一句音频合成完毕，再返回 StreamingResponse。
+    这样可以把首包时延放进响应头（X-Time-To-First-Audio-Ms），总时延由服务端日志与客户端自行统计。
+    ticket 为准入控制的 ticket，流结束时释放；timings 为请求的 RequestTimings，流结束时 finish。
+    客户端断开时 StreamingResponse 会取消 body；超过 deadline 时流被截断，剩余句子的生成随之中止。
+    """
+    sampling_rate = 24000
+    start_time = time.perf_counter()
+    if timings is None:
+        timings = RequestTimings(priority=priority)
+    chunks = tts.infer_stream(character, text, seed=seed, reuse_cache=reuse_cache, timings=timings, priority=priority,
+                              sampling=sampling)
+    try:
+        first_chunk = await run_until_aborted(request, chunks.__anext__(), deadline)
+    except StopAsyncIteration:
+        first_chunk = None
+    except BaseException:
+        await chunks.aclose()
+        timings.finish()
+        if ticket is not None:
+            await admission.release(ticket)
+        raise
+    ttfa = time.perf_counter() - start_time
+
+    async def body():
+        finished = False
+        try:
+            if response_format == "wav":
+                yield wav_stream_header(sampling_rate)
+            if first_chunk is not None:
+                yield first_chunk.tobytes()
+            while first_chunk is not None:
+                try:
+                    if deadline is None:
+                        chunk = await chunks.__anext__()
+                    else:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.perf_counter(), 0.0))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    abort_stats["deadline_exceeded"] += 1
+                    print(">> stream truncated: request deadline exceeded")
+                    break
+                yield chunk.tobytes()
+            finished = True
+        except Exception:
+            finished = True  # 合成出错，不计为客户端断开
+            raise
+        finally:
+            if not finished:
+                # body 被取消 / 关闭而没有走完，说明客户端已断开
+                abort_stats["client_disconnected"] += 1
+            await chunks.aclose()
+            timings.finish()
+            if ticket is not None:
+                await admission.release(ticket)
+            print(f">> stream done, ttfa: {ttfa * 1000:.1f} ms, total: {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    headers = {
+        "X-Sample-Rate": str(sampling_rate),
+        "X-Request-Start": f"{time.time() - ttfa:.6f}",
+        "X-Time-To-First-Audio-Ms": f"{ttfa * 1000:.1f}",
+    }
+    media_type = "audio/wav" if response_format == "wav" else "audio/pcm"
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global tts
+    global tts, admission, jobs
     cfg_path = os.path.join(args.model_dir, "config.yaml")
-    tts = IndexTTS(model_dir=args.model_dir, cfg_path=cfg_path, gpu_memory_utilization=args.gpu_memory_utilization)
-
     current_file_path = os.path.abspath(__file__)
     cur_dir = os.path.dirname(current_file_path)
+    speaker_store_dir = os.path.join(cur_dir, args.speaker_store_dir) if args.speaker_store_dir else None
+    engine_kwargs = dict(
+        model_dir=args.model_dir, cfg_path=cfg_path, gpu_memory_utilization=args.gpu_memory_utilization,
+        max_sentence_concurrency=args.max_sentence_concurrency, hf_latent=args.hf_latent,
+        vocoder_batch_size=args.vocoder_batch_size, vocoder_batch_wait_ms=args.vocoder_batch_wait_ms,
+        latent_batch_size=args.latent_batch_size, cpu_workers=args.cpu_workers,
+        sentence_cache_bytes=int(args.sentence_cache_mb * 1024 * 1024), sentence_cache_dir=args.sentence_cache_dir,
+        sentence_cache_disk_bytes=int(args.sentence_cache_disk_mb * 1024 * 1024) if args.sentence_cache_disk_mb else None,
+        speaker_store_dir=speaker_store_dir, coalesce_requests=not args.no_request_coalescing,
+        max_tokens_factor=args.max_tokens_factor, early_stop=not args.no_early_stop,
+        prefix_caching=args.prefix_caching,
+    )
+    if args.num_replicas > 1 or args.router_backend == "stub":
+        # router 模式：每个 replica 是一个固定到一块 GPU 的 worker 进程，接口与 IndexTTS 相同
+        devices = [device.strip() for device in args.replica_devices.split(",")] if args.replica_devices else None
+        if args.router_backend == "stub":
+            engine_kwargs = {}
+        tts = ReplicaRouter(args.num_replicas, backend=args.router_backend, engine_kwargs=engine_kwargs, devices=devices,
+                            affinity_slack_seconds=args.affinity_slack_seconds, cpu_workers=args.cpu_workers)
+        await asyncio.get_running_loop().run_in_executor(None, tts.start)
+    else:
+        tts = IndexTTS(**engine_kwargs)
+    admission = AdmissionController(max_outstanding_seconds=args.max_outstanding_audio_seconds,
+                                    max_requests=args.max_concurrent_requests,
+                                    max_defer_seconds=args.admission_defer_seconds,
+                                    initial_throughput=args.admission_throughput,
+                                    background_share=args.background_share,
+                                    interactive_burst=args.interactive_burst)
+
     speaker_path = os.path.join(cur_dir, "assets/speaker.json")
+    speaker_dict = {}
+    speaker_audio_paths = {}
     if os.path.exists(speaker_path):
         speaker_dict = json.load(open(speaker_path, 'r'))
 
@@ -37,8 +312,34 @@ async def lifespan(app: FastAPI):
             audio_paths_ = []
             for audio_path in audio_paths:
                 audio_paths_.append(os.path.join(cur_dir, audio_path))
-            tts.registry_speaker(speaker, audio_paths_)
+            speaker_audio_paths[speaker] = audio_paths_
+            # 只登记参考音频，第一次请求该 speaker 时才从 speaker store 加载（或计算并写入）
+            tts.add_speaker(speaker, audio_paths_)
+            if args.preload_speakers:
+                tts.registry_speaker(speaker, audio_paths_)
+
+    warmup_task = None
+    if args.warmup_rounds > 0:
+        # 指定的 speaker，否则用 speaker.json 中第一个参考音频都存在的，都没有时用默认参考音频
+        warmup_speaker = select_warmup_speaker(speaker_audio_paths, args.warmup_speaker)
+        warmup_texts = load_warmup_texts(args.warmup_texts) if args.warmup_texts else None
+        warmup_task = asyncio.ensure_future(run_startup_warmup(
+            tts, warmup_state, warmup_speaker, warmup_texts, rounds=args.warmup_rounds,
+            attempts=args.warmup_attempts, backoff_seconds=args.warmup_backoff_seconds))
+    else:
+        warmup_state["status"] = "disabled"
+
+    if args.jobs_dir:
+        jobs = JobManager(tts, os.path.join(cur_dir, args.jobs_dir), admission=admission,
+                          max_concurrent_sentences=args.job_sentence_concurrency)
+        jobs.resume()
     yield
+    if jobs is not None:
+        await jobs.close()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if isinstance(tts, ReplicaRouter):
+        tts.close()
     # Clean up the ML models and release the resources
     # ml_models.clear()
 
@@ -55,7 +356,7 @@ app.add_middleware(
 
 @app.get("/health")
 async def health_check():
-    """健康检查接口"""
+    """存活检查接口：进程与模型已加载即通过，不等待预热完成（就绪检查见 /ready）"""
     try:
         global tts
         if tts is None:
@@ -85,26 +386,64 @@ async def health_check():
         )
 
 
+@app.get("/ready")
+async def ready_check():
+    """就绪检查接口：启动预热结束（完成、重试后仍失败或未开启预热）后才返回 200，同时返回预热耗时或失败原因"""
+    ready = tts is not None and warmup_state["status"] in ("done", "failed", "disabled")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "warmup": warmup_state},
+    )
+
+
 @app.post("/tts_url", responses={
     200: {"content": {"application/octet-stream": {}}},
     500: {"content": {"application/json": {}}}
 })
 async def tts_api_url(request: Request):
+    """
+    参考音频可以是服务端路径（json: audio_paths）、base64 编码的音频文件（json: audio_base64），
+    或 multipart/form-data 上传的文件（字段 audio，可多个；text、seed、timeout、priority 及采样参数为表单字段）。
+    相同内容的参考音频只计算一次 conditioning。
+    """
     try:
-        data = await request.json()
-        text = data["text"]
-        audio_paths = data["audio_paths"]
-        seed = data.get("seed", 8)
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            text = form["text"]
+            seed = int(form.get("seed", 8))
+            audio_prompt = [await upload.read() for upload in form.getlist("audio")]
+            deadline = request_deadline(request, form)
+            priority = request_priority(request, form)
+            sampling = request_sampling(form)
+        else:
+            data = await request.json()
+            text = data["text"]
+            seed = data.get("seed", 8)
+            audio_prompt = list(data.get("audio_paths", []))
+            audio_prompt += [base64.b64decode(audio) for audio in data.get("audio_base64", [])]
+            deadline = request_deadline(request, data)
+            priority = request_priority(request, data)
+            sampling = request_sampling(data)
 
         global tts
-        sr, wav = await tts.infer(audio_paths, text, seed=seed)
-        
-        with io.BytesIO() as wav_buffer:
-            sf.write(wav_buffer, wav, sr, format='WAV')
-            wav_bytes = wav_buffer.getvalue()
+        timings = RequestTimings(priority=priority)
+        ticket = await admission.acquire(admission.estimate_cost(text), priority)
+        try:
+            sr, wav = await run_until_aborted(
+                request, tts.infer(audio_prompt, text, verbose=True, seed=seed, timings=timings, priority=priority,
+                                   sampling=sampling),
+                deadline)
+            return await wav_response(sr, wav, timings, priority)
+        finally:
+            await admission.release(ticket)
+            timings.finish()
 
-        return Response(content=wav_bytes, media_type="audio/wav")
-    
+    except InvalidRequest as ex:
+        return invalid_response(ex)
+    except AdmissionRejected as ex:
+        return busy_response(ex)
+    except RequestAborted as ex:
+        return aborted_response(ex)
     except Exception as ex:
         tb_str = ''.join(traceback.format_exception(type(ex), ex, ex.__traceback__))
         return JSONResponse(
@@ -125,16 +464,73 @@ async def tts_api(request: Request):
         data = await request.json()
         text = data["text"]
         character = data["character"]
+        # 固定 seed（或 reuse_cache=true）时，重复的句子直接使用句子级缓存，并发请求中相同的句子只生成一次
+        seed = data.get("seed")
+        reuse_cache = data.get("reuse_cache", False)
+        deadline = request_deadline(request, data)
+        priority = request_priority(request, data)
+        sampling = request_sampling(data)
 
         global tts
-        sr, wav = await tts.infer_with_ref_audio_embed(character, text)
-        
-        with io.BytesIO() as wav_buffer:
-            sf.write(wav_buffer, wav, sr, format='WAV')
-            wav_bytes = wav_buffer.getvalue()
+        timings = RequestTimings(priority=priority)
+        ticket = await admission.acquire(admission.estimate_cost(text), priority)
+        try:
+            sr, wav = await run_until_aborted(
+                request, tts.infer_with_ref_audio_embed(character, text, seed=seed, reuse_cache=reuse_cache, timings=timings,
+                                                        priority=priority, sampling=sampling),
+                deadline)
+            return await wav_response(sr, wav, timings, priority)
+        finally:
+            await admission.release(ticket)
+            timings.finish()
+
+    except InvalidRequest as ex:
+        return invalid_response(ex)
+    except AdmissionRejected as ex:
+        return busy_response(ex)
+    except RequestAborted as ex:
+        return aborted_response(ex)
+    except Exception as ex:
+        tb_str = ''.join(traceback.format_exception(type(ex), ex, ex.__traceback__))
+        print(tb_str)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status": "error",
+                "error": str(tb_str)
+            }
+        )
+
+
+@app.post("/tts_stream", responses={
+    200: {"content": {"audio/wav": {}, "audio/pcm": {}}},
+    500: {"content": {"application/json": {}}}
+})
+async def tts_api_stream(request: Request):
+    """ 流式接口：先返回 WAV 头（format=pcm 时不返回），随后每合成完一句就返回该句的 int16 PCM """
+    try:
+        data = await request.json()
+        text = data["text"]
+        character = data["character"]
+        response_format = data.get("format", "wav")
+        seed = data.get("seed")
+        reuse_cache = data.get("reuse_cache", False)
+        deadline = request_deadline(request, data)
+        priority = request_priority(request, data)
+        sampling = request_sampling(data)
 
-        return Response(content=wav_bytes, media_type="audio/wav")
-    
+        timings = RequestTimings(priority=priority)
+        ticket = await admission.acquire(admission.estimate_cost(text), priority)
+        return await stream_response(request, character, text, response_format, seed=seed, reuse_cache=reuse_cache,
+                                     ticket=ticket, deadline=deadline, timings=timings, priority=priority,
+                                     sampling=sampling)
+
+    except InvalidRequest as ex:
+        return invalid_response(ex)
+    except AdmissionRejected as ex:
+        return busy_response(ex)
+    except RequestAborted as ex:
+        return aborted_response(ex)
     except Exception as ex:
         tb_str = ''.join(traceback.format_exception(type(ex), ex, ex.__traceback__))
         print(tb_str)
@@ -147,6 +543,194 @@ async def tts_api(request: Request):
         )
 
 
+def ws_fragment(data: dict):
+    return data.get("text", ""), data.get("event") == "end" or bool(data.get("end", False))
+
+
+def parse_ws_message(message: str):
+    """WebSocket 消息：json {"text": ..., "event": "end"} 或纯文本；返回 (text, end)"""
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return message, False
+    if not isinstance(data, dict):
+        return message, False
+    return ws_fragment(data)
+
+
+async def receive_fragments(websocket: WebSocket, fragments: asyncio.Queue, on_text):
+    """把客户端发来的文本放入 fragments；输入结束时放入 None，连接断开时放入异常"""
+    try:
+        while True:
+            text, end = parse_ws_message(await websocket.receive_text())
+            if text:
+                on_text(text)
+                fragments.put_nowait(text)
+            if end:
+                fragments.put_nowait(None)
+                return
+    except Exception as ex:
+        fragments.put_nowait(ex)
+
+
+@app.websocket("/tts_ws")
+async def tts_websocket(websocket: WebSocket):
+    """
+    增量文本输入、流式音频输出（例如直接接在 LLM 的流式输出后面）。
+    第一条消息为 json 配置：character、format（pcm / wav，默认 pcm）、seed、reuse_cache、priority 及采样参数，可同时带 text / end；
+    之后每条消息是一段文本（json {"text": ...} 或纯文本），{"event": "end"} 表示输入结束。
+    服务端在句末标点或 token 上限处切出句子立即开始合成，同时继续接收文本；音频按顺序以二进制帧发送
+    （format=wav 时先发送 WAV 头），最后发送 {"event": "done", ...}。出错时发送 {"event": "error", ...}。
+    """
+    await websocket.accept()
+    sampling_rate = 24000
+    start_time = time.perf_counter()
+    ticket = None
+    timings = None
+    receiver = None
+    try:
+        config = json.loads(await websocket.receive_text())
+        character = config.get("character") or config.get("voice")
+        response_format = config.get("format", "pcm")
+        priority = parse_priority(config.get("priority"))
+        sampling = request_sampling(config)
+        timings = RequestTimings(priority=priority)
+        # 文本长度事先未知，先按 0 接收，之后随文本到达追加预估工作量
+        ticket = await admission.acquire(0.0, priority)
+
+        def on_text(text):
+            admission.extend(ticket, admission.estimate_cost(text))
+
+        fragments = asyncio.Queue()
+        initial_text, end = ws_fragment(config)
+        if initial_text:
+            on_text(initial_text)
+            fragments.put_nowait(initial_text)
+        if end:
+            fragments.put_nowait(None)
+        else:
+            receiver = asyncio.ensure_future(receive_fragments(websocket, fragments, on_text))
+
+        async def read_fragments():
+            while True:
+                fragment = await fragments.get()
+                if fragment is None:
+                    return
+                if isinstance(fragment, Exception):
+                    raise fragment
+                yield fragment
+
+        if response_format == "wav":
+            await websocket.send_bytes(wav_stream_header(sampling_rate))
+        chunks = tts.infer_text_stream(character, read_fragments(), seed=config.get("seed"),
+                                       reuse_cache=config.get("reuse_cache", False), timings=timings, priority=priority,
+                                       sampling=sampling)
+        try:
+            async for chunk in chunks:
+                await websocket.send_bytes(chunk.tobytes())
+        finally:
+            await chunks.aclose()
+        await websocket.send_json({
+            "event": "done",
+            "audio_seconds": round(timings.audio_seconds, 3),
+            "ttfa_ms": round(timings.ttfa * 1000, 1) if timings.ttfa is not None else None,
+            "total_ms": round((time.perf_counter() - start_time) * 1000, 1),
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        abort_stats["client_disconnected"] += 1
+        print(">> websocket disconnected")
+    except InvalidRequest as ex:
+        await websocket.send_json({"event": "error", "error": str(ex)})
+        await websocket.close(code=1007)  # Invalid frame payload data
+    except AdmissionRejected as ex:
+        await websocket.send_json({"event": "busy", "retry_after": ex.retry_after, "queue": ex.status})
+        await websocket.close(code=1013)  # Try Again Later
+    except Exception as ex:
+        traceback.print_exc()
+        try:
+            await websocket.send_json({"event": "error", "error": str(ex)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        if receiver is not None and not receiver.done():
+            receiver.cancel()
+        if ticket is not None:
+            await admission.release(ticket)
+        if timings is not None:
+            timings.finish()
+
+
+@app.get("/queue")
+async def queue_status():
+    """准入控制状态：在途请求数、未完成的预估音频时长、吞吐量与预估等待时间，以及被中止的请求 / 句子数"""
+    status = admission.status()
+    status["aborts"] = {**abort_stats, **tts.get_abort_stats()}
+    return status
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    prometheus 指标：各阶段耗时直方图、请求 RTF / TTFA、mel token 与音频时长计数，
+    以及在途 / 排队请求数、微批队列深度、缓存命中率与中止计数。
+    """
+    update_service_gauges(admission.status(), tts.get_stats(), abort_stats)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post("/jobs")
+async def create_job(request: Request):
+    """
+    长文本异步任务：json 字段 text、character（或 speaker）、seed 及采样参数，立即返回 job id。
+    句子以 background 优先级合成并逐句写入磁盘，进度见 GET /jobs/{id}，完成后从 GET /jobs/{id}/audio 下载。
+    """
+    if jobs is None:
+        return JSONResponse(status_code=404, content={"status": "error", "error": "jobs are disabled (--jobs_dir)"})
+    try:
+        data = await request.json()
+        speaker = data.get("character") or data.get("speaker")
+        status = await jobs.submit(data["text"], speaker, seed=data.get("seed"), sampling=parse_sampling(data))
+        return JSONResponse(status_code=202, content=status)
+    except (KeyError, ValueError) as ex:
+        return JSONResponse(status_code=400, content={"status": "error", "error": str(ex)})
+
+
+@app.get("/jobs")
+async def list_jobs():
+    if jobs is None:
+        return []
+    return jobs.list()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """进度（已完成句子数 / 总句子数、已合成音频时长）与预计剩余时间"""
+    status = jobs.get(job_id) if jobs is not None else None
+    if status is None:
+        return JSONResponse(status_code=404, content={"status": "error", "error": "job not found"})
+    return status
+
+
+@app.get("/jobs/{job_id}/audio")
+async def job_audio(request: Request, job_id: str):
+    """完成后拼接好的 WAV，支持 Range 请求"""
+    status = jobs.get(job_id) if jobs is not None else None
+    if status is None:
+        return JSONResponse(status_code=404, content={"status": "error", "error": "job not found"})
+    path = jobs.output_path(job_id)
+    if path is None:
+        return JSONResponse(status_code=409, content=status)
+    return file_range_response(request, path, "audio/wav")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if jobs is None or not await jobs.cancel(job_id):
+        return JSONResponse(status_code=404, content={"status": "error", "error": "no running job with this id"})
+    return jobs.get(job_id)
+
 
 @app.get("/audio/voices")
 async def tts_voices():
@@ -175,15 +759,37 @@ async def tts_api_openai(request: Request):
         #model param is omitted
         _model = data["model"]
 
+        seed = data.get("seed")
+        reuse_cache = data.get("reuse_cache", False)
+        deadline = request_deadline(request, data)
+        priority = request_priority(request, data)
+        sampling = request_sampling(data)
+
         global tts
-        sr, wav = await tts.infer_with_ref_audio_embed(character, text)
-        
-        with io.BytesIO() as wav_buffer:
-            sf.write(wav_buffer, wav, sr, format='WAV')
-            wav_bytes = wav_buffer.getvalue()
+        timings = RequestTimings(priority=priority)
+        ticket = await admission.acquire(admission.estimate_cost(text), priority)
+        if data.get("stream", False):
+            response_format = "pcm" if data.get("response_format") == "pcm" else "wav"
+            return await stream_response(request, character, text, response_format, seed=seed, reuse_cache=reuse_cache,
+                                         ticket=ticket, deadline=deadline, timings=timings, priority=priority,
+                                         sampling=sampling)
+
+        try:
+            sr, wav = await run_until_aborted(
+                request, tts.infer_with_ref_audio_embed(character, text, seed=seed, reuse_cache=reuse_cache, timings=timings,
+                                                        priority=priority, sampling=sampling),
+                deadline)
+            return await wav_response(sr, wav, timings, priority)
+        finally:
+            await admission.release(ticket)
+            timings.finish()
 
-        return Response(content=wav_bytes, media_type="audio/wav")
-    
+    except InvalidRequest as ex:
+        return invalid_response(ex)
+    except AdmissionRejected as ex:
+        return busy_response(ex)
+    except RequestAborted as ex:
+        return aborted_response(ex)
     except Exception as ex:
         tb_str = ''.join(traceback.format_exception(type(ex), ex, ex.__traceback__))
         print(tb_str)
@@ -202,6 +808,39 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=11996)
     parser.add_argument("--model_dir", type=str, default="/path/to/IndexTeam/Index-TTS")
     parser.add_argument("--gpu_memory_utilization", type=float, default=0.25)
+    parser.add_argument("--hf_latent", action="store_true", default=False, help="用 HF GPT2Model 的 teacher-forced 前向计算 latent（需额外加载一份 transformer 权重）")
+    parser.add_argument("--max_sentence_concurrency", type=int, default=8, help="单个请求内同时提交给 vllm 的句子数上限")
+    parser.add_argument("--vocoder_batch_size", type=int, default=8, help="bigvgan 跨请求微批的最大 batch，1 表示不合批")
+    parser.add_argument("--vocoder_batch_wait_ms", type=float, default=5.0, help="bigvgan 微批的最长等待时间（毫秒）")
+    parser.add_argument("--latent_batch_size", type=int, default=8, help="--hf_latent 时 teacher-forced 前向跨句子/请求合批的最大 batch，1 表示不合批")
+    parser.add_argument("--cpu_workers", type=int, default=2, help="文本处理、音频后处理与 WAV 编码所用的 CPU 线程数")
+    parser.add_argument("--sentence_cache_mb", type=float, default=256, help="句子级合成结果缓存的内存上限（MB），0 表示关闭内存缓存")
+    parser.add_argument("--sentence_cache_dir", type=str, default=None, help="句子级缓存的磁盘目录，不设置则只缓存在内存中")
+    parser.add_argument("--sentence_cache_disk_mb", type=float, default=None, help="句子级缓存磁盘目录的容量上限（MB），默认不限制")
+    parser.add_argument("--max_tokens_factor", type=float, default=1.5, help="每个句子最多生成按最慢语速预估时长 × 该系数的 mel token（不超过 768），0 表示固定使用 768")
+    parser.add_argument("--no_early_stop", action="store_true", default=False, help="关闭连续静音 / 重复循环的提前停止与长静音过滤")
+    parser.add_argument("--prefix_caching", action="store_true", default=False, help="开启 vllm prefix caching：同一 speaker 的 conditioning 前缀的 KV 在请求之间复用")
+    parser.add_argument("--no_request_coalescing", action="store_true", default=False, help="关闭 single-flight：并发请求中相同的句子不再共享同一次生成")
+    parser.add_argument("--speaker_store_dir", type=str, default="assets/speaker_store", help="speaker 注册结果的持久化目录（相对路径基于本文件所在目录），设为空字符串则不持久化")
+    parser.add_argument("--preload_speakers", action="store_true", default=False, help="启动时注册所有 speaker，而不是第一次请求时再加载")
+    parser.add_argument("--max_outstanding_audio_seconds", type=float, default=120.0, help="已接收但未完成的请求的预估音频总时长上限（秒），超过后返回 429")
+    parser.add_argument("--max_concurrent_requests", type=int, default=0, help="同时处理的请求数上限，0 表示不限制")
+    parser.add_argument("--admission_defer_seconds", type=float, default=0.0, help="超出上限时最多等待的秒数，0 表示立即返回 429")
+    parser.add_argument("--admission_throughput", type=float, default=20.0, help="初始的吞吐量估计（每秒合成的音频秒数），用于计算 Retry-After")
+    parser.add_argument("--num_replicas", type=int, default=1, help="replica 数，大于 1 时启动 router 模式：每个 replica 是一个独立进程，持有一个 IndexTTS")
+    parser.add_argument("--replica_devices", type=str, default=None, help="各 replica 使用的 GPU（逗号分隔，如 0,1,2,3），默认 0..num_replicas-1")
+    parser.add_argument("--affinity_slack_seconds", type=float, default=10.0, help="同一 speaker 优先发往已合成过它的 replica，除非其未完成工作量比最空闲的 replica 多出该秒数")
+    parser.add_argument("--router_backend", type=str, default="indextts", choices=["indextts", "stub"], help="replica 引擎，stub 不加载模型，用于在 CPU 上测试 router")
+    parser.add_argument("--background_share", type=float, default=0.5, help="background 优先级的请求最多占用 --max_outstanding_audio_seconds 的比例，其余留给 interactive / normal 请求")
+    parser.add_argument("--interactive_burst", type=float, default=1.25, help="interactive 优先级的请求可超出 --max_outstanding_audio_seconds 的倍数")
+    parser.add_argument("--warmup_rounds", type=int, default=2, help="启动预热的轮数（第一轮逐条、之后并发合成预热文本），完成前 /ready 返回 503；0 表示不预热")
+    parser.add_argument("--warmup_speaker", type=str, default=None, help="预热使用的 speaker，默认为 speaker.json 中第一个参考音频都存在的；指定的不可用时同样回退")
+    parser.add_argument("--warmup_texts", type=str, default=None, help="预热文本文件（每行一条），默认使用内置的不同长度的文本")
+    parser.add_argument("--warmup_attempts", type=int, default=3, help="预热失败时的最多尝试次数，全部失败后 /ready 仍返回 200 并带上失败原因")
+    parser.add_argument("--warmup_backoff_seconds", type=float, default=5.0, help="预热第一次重试前的等待秒数，之后每次翻倍")
+    parser.add_argument("--jobs_dir", type=str, default="outputs/jobs", help="长文本异步任务（/jobs）的持久化目录（相对路径基于本文件所在目录），重启后继续未完成的任务；设为空字符串则关闭 /jobs")
+    parser.add_argument("--job_sentence_concurrency", type=int, default=4, help="所有长文本任务同时合成的句子数")
+    parser.add_argument("--request_timeout", type=float, default=0.0, help="默认的请求超时（秒），超时后中止生成并返回 504，0 表示不限；可由请求头 X-Request-Timeout 或请求体 timeout 覆盖")
     args = parser.parse_args()
 
     uvicorn.run(app=app, host=args.host, port=args.port)
@@ -198,13 +198,33 @@ class BigVGAN(torch.nn.Module):
 
         # self.logit_scale = nn.Parameter(torch.ones([]) * np.log(1 / 0.07))
 
-    def forward(self, x, mel_ref, lens=None):
+    def compute_speaker_embedding(self, mel_ref, lens=None):
+        """
+        ECAPA_TDNN speaker embedding averaged over the reference mels.
+        It only depends on the reference audio, so callers can compute it once per speaker and pass it to forward.
+
+        Args:
+            mel_ref: list of reference mels, (b, t_ref, num_mels) each.
+        Returns:
+            (b, 1, speaker_embedding_dim)
+        """
         speaker_embedding = []
         for mel_ref_ in mel_ref:
             speaker_embedding_ = self.speaker_encoder(mel_ref_, lens)
             speaker_embedding.append(speaker_embedding_)
         speaker_embedding = torch.stack(speaker_embedding).sum(dim=0)
         speaker_embedding = speaker_embedding / len(mel_ref)
+        return speaker_embedding
+
+    def forward(self, x, mel_ref, lens=None, speaker_embedding=None):
+        """
+        Args:
+            x: gpt latent, (b, t, gpt_dim)
+            mel_ref: list of reference mels, (b, t_ref, num_mels) each. Ignored when speaker_embedding is given.
+            speaker_embedding: (b, 1, speaker_embedding_dim), allows every batch item to use its own speaker.
+        """
+        if speaker_embedding is None:
+            speaker_embedding = self.compute_speaker_embedding(mel_ref, lens)
         
         n_batch = x.size(0)
         contrastive_loss = None
@@ -6,7 +6,12 @@ ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=Tr
 # Suppress warnings from tensorflow and other libraries
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
+        return
     import argparse
     parser = argparse.ArgumentParser(description="IndexTTS Command Line")
     parser.add_argument("text", type=str, help="Text to be synthesized")
@@ -17,6 +22,8 @@ def main():
     parser.add_argument("--fp16", action="store_true", default=True, help="Use FP16 for inference if available")
     parser.add_argument("-f", "--force", action="store_true", default=False, help="Force to overwrite the output file if it exists")
     parser.add_argument("-d", "--device", type=str, default="cuda", help="Device to run the model on (cpu, cuda, mps)." )
+    parser.add_argument("--gpt_engine", type=str, default="hf", choices=["hf", "static"], help="Mel token generation: HuggingFace generate or the static KV cache decoder (faster on CPU)")
+    parser.add_argument("--compile_decoder", action="store_true", default=False, help="Compile the decode step of the static engine with torch.compile")
     args = parser.parse_args()
     if len(args.text.strip()) == 0:
         print("ERROR: Text is empty.")
@@ -57,8 +64,58 @@ def main():
             print("WARNING: Running on CPU may be slow.")
 
     from indextts.infer import IndexTTS
-    tts = IndexTTS(cfg_path=args.config, model_dir=args.model_dir, is_fp16=args.fp16, device=args.device)
+    tts = IndexTTS(cfg_path=args.config, model_dir=args.model_dir, is_fp16=args.fp16, device=args.device,
+                   gpt_engine=args.gpt_engine, compile_decoder=args.compile_decoder)
     tts.infer(audio_prompt=args.voice, text=args.text.strip(), output_path=output_path)
 
+
+def batch_main(argv):
+    """
+    批量离线合成：python indextts/cli.py batch lines.jsonl --output_dir outputs
+    模型只加载一次，按预估时长分桶后以有限并发提交给 vllm 引擎；重新运行时跳过 manifest 中已完成的任务。
+    与 main 的单条合成不同，这里使用 infer_vllm.IndexTTS：批量任务需要它的异步接口、多句并发与 speaker store，
+    单条合成仍使用不依赖 vllm 的 infer.IndexTTS（可在 CPU / mps 上运行）。
+    """
+    import argparse
+    import asyncio
+    import json
+    parser = argparse.ArgumentParser(prog="cli.py batch", description="IndexTTS offline bulk synthesis")
+    parser.add_argument("input", type=str, help="JSONL (text, speaker, output, seed, id) or TSV (text[, speaker[, output[, seed]]]) file")
+    parser.add_argument("--output_dir", type=str, default="outputs", help="Directory of outputs without an explicit output path")
+    parser.add_argument("--manifest", type=str, default=None, help="Manifest of finished items, default is {output_dir}/manifest.jsonl")
+    parser.add_argument("-v", "--voice", type=str, default=None, help="Default speaker: a name in --speaker_json or a reference audio path")
+    parser.add_argument("--seed", type=int, default=None, help="Default sampling seed")
+    parser.add_argument("--speaker_json", type=str, default=str(ROOT / "assets/speaker.json"), help="Registered speakers (name -> reference audios)")
+    parser.add_argument("--speaker_store_dir", type=str, default=str(ROOT / "assets/speaker_store"), help="Speaker store directory, empty to disable")
+    parser.add_argument("-c", "--config", type=str, default="checkpoints/config.yaml", help="Path to the config file")
+    parser.add_argument("--model_dir", type=str, default="checkpoints", help="Path to the model directory")
+    parser.add_argument("--gpu_memory_utilization", type=float, default=0.25)
+    parser.add_argument("--concurrency", type=int, default=16, help="Max items synthesized at the same time")
+    parser.add_argument("--writers", type=int, default=4, help="Threads writing wav files")
+    parser.add_argument("--bucket_seconds", type=float, default=2.0, help="Width of the estimated-duration buckets")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.input):
+        print(f"Input file {args.input} does not exist.")
+        sys.exit(1)
+
+    from indextts.utils.batch_synthesis import Manifest, load_jobs, run_batch
+    jobs = load_jobs(args.input, args.output_dir, default_speaker=args.voice, default_seed=args.seed)
+    manifest = Manifest(args.manifest or os.path.join(args.output_dir, "manifest.jsonl"))
+    if all(manifest.is_done(job) for job in jobs):
+        print(f">> all {len(jobs)} items already done")
+        return
+
+    from indextts.infer_vllm import IndexTTS
+    tts = IndexTTS(cfg_path=args.config, model_dir=args.model_dir, gpu_memory_utilization=args.gpu_memory_utilization,
+                   max_sentence_concurrency=max(8, args.concurrency), speaker_store_dir=args.speaker_store_dir or None)
+    if os.path.exists(args.speaker_json):
+        for speaker, audio_paths in json.load(open(args.speaker_json, "r", encoding="utf-8")).items():
+            tts.add_speaker(speaker, [str(ROOT / audio_path) for audio_path in audio_paths])
+
+    stats = asyncio.run(run_batch(tts, jobs, manifest, concurrency=args.concurrency, writers=args.writers,
+                                  bucket_seconds=args.bucket_seconds))
+    print(json.dumps(stats, indent=2))
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
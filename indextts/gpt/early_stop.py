@@ -0,0 +1,84 @@
+import torch
+
+SILENT_MEL_TOKEN = 52
+
+
+def long_silence_keep_mask(codes, silent_token=SILENT_MEL_TOKEN, max_consecutive=15) -> torch.Tensor:
+    """
+    去除过长静音的保留掩码（向量化）：连续的 silent_token 只保留前 max_consecutive 个。
+    codes 为一维的 list 或 tensor，返回同长度的 bool tensor（与 codes 同 device）。
+    """
+    codes = torch.as_tensor(codes)
+    silent = codes == silent_token
+    positions = torch.arange(codes.shape[0], device=codes.device)
+    # 每个位置之前（含）最后一个非静音 token 的下标，静音 token 在其所在静音段中的序号 = 下标之差
+    last_voiced = torch.where(silent, torch.full_like(positions, -1), positions).cummax(dim=0).values
+    return ~silent | (positions - last_voiced <= max_consecutive)
+
+
+class EarlyStopProcessor:
+    """
+    vllm 的 per-request logits processor：检测到退化的生成时强制输出 stop_mel_token，提前结束该序列。
+        - 连续 max_silent_tokens 个静音 token（52）
+        - 重复循环：最近 min_loop_tokens 个 token 以不超过 max_loop_period 的周期重复
+    这类序列原本会一直生成到 max_tokens，是最耗时的请求。
+    与 HiddenStatesCollector 一样挂在 SamplingParams.logits_processors 上，clone() 返回自身，
+    生成结束后可从本对象读取停止原因与需要截掉的循环部分。
+    """
+
+    def __init__(self, stop_token, max_tokens, silent_token=SILENT_MEL_TOKEN, max_silent_tokens=30, max_loop_period=8,
+                 min_loop_tokens=48):
+        """
+        Args:
+            stop_token (int): token forced once a degenerate run is detected.
+            max_tokens (int): token budget of the request, used to count the decode steps saved.
+            max_silent_tokens (int): consecutive silent tokens that stop the generation, 0 disables the check.
+            max_loop_period (int): longest repeating pattern (in tokens) detected as a loop, 0 disables the check.
+            min_loop_tokens (int): a loop is detected once the last min_loop_tokens tokens are periodic.
+        """
+        self.stop_token = stop_token
+        self.max_tokens = max_tokens
+        self.silent_token = silent_token
+        self.max_silent_tokens = max_silent_tokens
+        self.max_loop_period = max_loop_period
+        self.min_loop_tokens = min_loop_tokens
+        self.reason = None  # "silence" / "repetition"
+        self.stop_step = None
+        self.trim_to = None  # 重复循环只保留第一个周期，之后的 codes 截掉
+
+    def __call__(self, token_ids, logits):
+        if self.reason is None:
+            self.check(token_ids)
+        if self.reason is not None:
+            logits.fill_(float("-inf"))
+            logits[self.stop_token] = 0.0
+        return logits
+
+    def clone(self):
+        return self
+
+    def check(self, token_ids):
+        num_tokens = len(token_ids)
+        if 0 < self.max_silent_tokens <= num_tokens and token_ids[-1] == self.silent_token:
+            if all(token == self.silent_token for token in token_ids[-self.max_silent_tokens:]):
+                self._stop("silence", num_tokens)
+                return
+        if self.max_loop_period > 0 and num_tokens >= self.min_loop_tokens:
+            tail = list(token_ids[-self.min_loop_tokens:])
+            for period in range(1, self.max_loop_period + 1):
+                # 周期为 period 的序列错开 period 位后与自身相同；列表比较在第一个不同处即返回
+                if tail[period:] == tail[:-period]:
+                    self._stop("repetition", num_tokens)
+                    self.trim_to = num_tokens - self.min_loop_tokens + period
+                    return
+
+    def _stop(self, reason, num_tokens):
+        self.reason = reason
+        self.stop_step = num_tokens
+
+    @property
+    def steps_saved(self) -> int:
+        """假设退化的序列会一直生成到 max_tokens，提前停止省下的 decode 步数"""
+        if self.stop_step is None:
+            return 0
+        return max(self.max_tokens - self.stop_step - 1, 0)
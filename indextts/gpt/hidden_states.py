@@ -0,0 +1,47 @@
+import torch
+
+
+class HiddenStatesCollector:
+    """
+    收集 vllm 每一步 decode 采样位置的 final_norm hidden state，供 bigvgan 直接使用，
+    从而省去 HF GPT2Model 的第二次 teacher-forced 前向。
+
+    以 logits processor 的形式挂在请求的 SamplingParams.logits_processors 上：
+    vllm 复制 SamplingParams 时会调用 clone()，这里返回自身，保证 engine 内外是同一个对象；
+    __call__ 不修改 logits，真正的收集由 GPT2TTSModel.compute_logits 调用 collect() 完成。
+    """
+
+    def __init__(self):
+        self.hidden_states = []
+
+    def __call__(self, token_ids, logits):
+        return logits
+
+    def clone(self):
+        return self
+
+    def collect(self, hidden_state: torch.Tensor):
+        self.hidden_states.append(hidden_state)
+
+    def get_latent(self, length: int) -> torch.Tensor:
+        """返回前 length 步的 hidden states，形状 (1, length, dim)，float32"""
+        latent = torch.cat(self.hidden_states, dim=0)[:length]
+        return latent.unsqueeze(0).float()
+
+
+def collect_hidden_states(hidden_states: torch.Tensor, sampling_metadata) -> None:
+    """
+    在 compute_logits 中调用：把本步每个请求采样位置的 hidden state 交给其 HiddenStatesCollector。
+    hidden_states 为 model forward 的输出（已经过 final_norm），按 selected_token_indices 取出采样位置。
+    """
+    if sampling_metadata is None or not sampling_metadata.seq_groups:
+        return
+    selected = None
+    for seq_group in sampling_metadata.seq_groups:
+        if not seq_group.do_sample:
+            continue
+        for processor in seq_group.sampling_params.logits_processors or []:
+            if isinstance(processor, HiddenStatesCollector):
+                if selected is None:
+                    selected = hidden_states.index_select(0, sampling_metadata.selected_token_indices)
+                processor.collect(selected[seq_group.sample_indices])
@@ -30,6 +30,7 @@ from transformers import BatchFeature
 from vllm.attention import Attention, AttentionMetadata
 from vllm.compilation.decorators import support_torch_compile
 from vllm.config import CacheConfig, VllmConfig
+from vllm.forward_context import get_forward_context
 from vllm.distributed.parallel_state import (
     get_pp_group, get_tensor_model_parallel_world_size)
 from vllm.model_executor.layers.activation import get_act_fn
@@ -62,6 +63,9 @@ from vllm.multimodal.parse import MultiModalDataItems
 
 from vllm.model_executor.models.gpt2 import GPT2Block  #, GPT2MLP, GPT2Attention
 
+from indextts.gpt.hidden_states import collect_hidden_states
+from indextts.gpt.prefix_cache import uncomputed_prompt_embeds
+
 class TTSProcessingInfo(BaseProcessingInfo):
 
     def get_supported_mm_limits(self) -> Mapping[str, Optional[int]]:
@@ -332,6 +336,15 @@ class LearnedPositionEmbeddings(nn.Module):
     def get_fixed_embedding(self, ind, dev):
         return self.emb(ind).unsqueeze(0)  # torch.tensor([ind], device=dev)
 
+    def get_decode_embedding(self, positions):
+        """
+        decode 步整个 batch 的位置编码 (num_tokens, dim)：一次 gather 取出，代替逐个 token 调用 get_fixed_embedding 再 cat。
+        positions[0] 为 0 时（profile 的 dummy 输入）不加位置编码：用乘法代替 if，
+        每步 decode 不再有 device -> host 同步，CUDA graph 捕获时与回放时走同一条路径。
+        """
+        pos_emb = self.emb(positions)
+        return pos_emb * (positions[:1] > 0).unsqueeze(-1).to(pos_emb.dtype)
+
 
 # from vllm.model_executor.models.llava import (
 #     _build_llava_or_pixtral_hf_processor,
@@ -392,17 +405,15 @@ class GPT2TTSModel(nn.Module, SupportsPP, SupportsMultiModal):
             else:
                 audio_embeds = torch.cat(audio_embeds, dim=1).squeeze(0)
             audio_embeds = audio_embeds.to(dtype=self.audio_emb.weight.dtype)
+            # prefix caching 命中时 vllm 只为未缓存的 token 做 prefill
+            audio_embeds = uncomputed_prompt_embeds(audio_embeds, input_ids.shape[0], get_forward_context().attn_metadata)
 
         if audio_embeds is not None:  # and audio_embeds.shape[0] == input_ids.shape[0]   prefill
             inputs_embeds = audio_embeds
         else:  # decode
             inputs_embeds = self.audio_emb(input_ids)
             # print("positions", positions)
-            if torch.cuda.is_current_stream_capturing() or positions[0] > 0:
-                pos_emb = [self.text_pos_embedding.get_fixed_embedding(ind, inputs_embeds.device)
-                            for ind in positions]  #  - mel_len + 2
-                pos_emb = torch.cat(pos_emb, dim=0)
-                inputs_embeds = inputs_embeds + pos_emb
+            inputs_embeds = inputs_embeds + self.text_pos_embedding.get_decode_embedding(positions)
         # print("inputs_embeds", inputs_embeds.shape)
         hidden_states = self.transformer(input_ids, positions, intermediate_tensors,
                                          inputs_embeds)  # input_ids no used
@@ -414,6 +425,8 @@ class GPT2TTSModel(nn.Module, SupportsPP, SupportsMultiModal):
         hidden_states: torch.Tensor,
         sampling_metadata: SamplingMetadata,
     ) -> Optional[torch.Tensor]:
+        # 把采样位置的 final_norm hidden state 交给请求的 HiddenStatesCollector（若有）
+        collect_hidden_states(hidden_states, sampling_metadata)
         logits = self.logits_processor(self.lm_head, hidden_states,
                                        sampling_metadata)
         return logits
@@ -240,9 +240,8 @@ class UnifiedVoice(nn.Module):
         conds = self.perceiver_encoder(speech_conditioning_input, conds_mask)  # (b, 32, d)
         return conds
 
-    def inference_speech(self, speech_conditioning_latent, text_inputs, cond_mel_lengths=None, input_tokens=None, num_return_sequences=1,
-                         max_generate_length=None, typical_sampling=False, typical_mass=.9, **hf_generate_kwargs):
-
+    def build_prompt_embeds(self, speech_conditioning_latent, text_inputs):
+        """prompt 的 embeds：[conditioning latent, start_text, text, stop_text, start_mel]"""
         text_inputs = F.pad(text_inputs, (0, 1), value=self.stop_text_token)
         text_inputs, _ = self.build_aligned_inputs_and_targets(text_inputs, self.start_text_token, self.stop_text_token)
         text_emb = self.text_embedding(text_inputs) + self.text_pos_embedding(text_inputs)
@@ -250,12 +249,18 @@ class UnifiedVoice(nn.Module):
         # speech_conditioning_latent = self.get_conditioning(speech_conditioning_latent, cond_mel_lengths)
         # conds = speech_conditioning_latent
         emb = torch.cat([speech_conditioning_latent, text_emb], dim=1)
-        self.inference_model.store_mel_emb(emb)
-        trunc_index = emb.shape[1] + 1
 
         mel_start_emb = self.mel_embedding(torch.full((emb.shape[0], 1,), fill_value=self.start_mel_token, dtype=torch.long, device=text_inputs.device))
         mel_start_emb = mel_start_emb + self.mel_pos_embedding(mel_start_emb)
-        inputs_embeds = torch.cat([emb, mel_start_emb], dim=1)
+        return torch.cat([emb, mel_start_emb], dim=1)
+
+    def inference_speech(self, speech_conditioning_latent, text_inputs, cond_mel_lengths=None, input_tokens=None, num_return_sequences=1,
+                         max_generate_length=None, typical_sampling=False, typical_mass=.9, **hf_generate_kwargs):
+
+        inputs_embeds = self.build_prompt_embeds(speech_conditioning_latent, text_inputs)
+        emb = inputs_embeds[:, :-1]
+        self.inference_model.store_mel_emb(emb)
+        trunc_index = emb.shape[1] + 1
 
         logits_processor = LogitsProcessorList()
         max_length = trunc_index + self.max_mel_tokens - 1 if max_generate_length is None else trunc_index + max_generate_length
@@ -1,3 +1,4 @@
+import time
 import uuid
 import os
 import functools
@@ -13,8 +14,13 @@ from transformers.utils.model_parallel_utils import (assert_device_map,
 from transformers import GPT2Config, GPT2Model
 
 from indextts.gpt.conformer_encoder import ConformerEncoder
+from indextts.gpt.early_stop import EarlyStopProcessor
+from indextts.gpt.hidden_states import HiddenStatesCollector
 from indextts.gpt.perceiver import PerceiverResampler
+from indextts.gpt.prefix_cache import prompt_token_ids, speaker_digest
 from indextts.utils.arch_util import AttentionBlock
+from indextts.utils.priority import PRIORITY_NORMAL
+from indextts.utils.sampling import DEFAULT_SAMPLING
 from indextts.utils.typical_sampling import TypicalLogitsWarper
 
 from vllm import AsyncLLMEngine, SamplingParams, TokensPrompt
@@ -26,6 +32,24 @@ def null_position_embeddings(range, dim):
     return torch.zeros((range.shape[0], range.shape[1], dim), device=range.device)
     
 
+def build_engine_args(vllm_dir, gpu_memory_utilization, enable_prefix_caching=False):
+    """
+    vllm 引擎参数。调度使用默认的 fcfs：priority 策略会以 recompute 方式抢占正在运行的序列，
+    重新 prefill prompt 与已生成的 token，而 GPT2TTSModel.forward 的 prompt embeds（multi_modal_data）只覆盖 prompt、
+    位置编码也按 prompt_len 计算，恢复后会形状不匹配或生成错误的音频。
+    请求优先级只作用于应用层的队列（准入控制、latent / bigvgan 微批队列与 GPU / CPU 线程池）。
+    """
+    return AsyncEngineArgs(
+        model=vllm_dir,
+        tensor_parallel_size=1,
+        dtype="auto",
+        gpu_memory_utilization=gpu_memory_utilization,
+        scheduling_policy="fcfs",
+        enable_prefix_caching=enable_prefix_caching,
+        # enforce_eager=True,
+    )
+
+
 class LearnedPositionEmbeddings(nn.Module):
     def __init__(self, seq_len, model_dim, init=.02):
         super().__init__()
@@ -48,7 +72,7 @@ class UnifiedVoice(nn.Module):
                  start_text_token=0, stop_text_token=1, number_mel_codes=8194, start_mel_token=8192, stop_mel_token=8193,
                  types=1, activation_function=None,
                  model_dir=None,
-                 condition_num_latent=32, condition_module=None, **kwargs):
+                 condition_num_latent=32, condition_module=None, enable_prefix_caching=False, **kwargs):
         """
         Args:
             layers: Number of layers in transformer stack.
@@ -65,6 +89,8 @@ class UnifiedVoice(nn.Module):
             start_mel_token:
             stop_mel_token:
             checkpointing:
+            enable_prefix_caching: Enable vllm prefix caching, prompts get content-derived pseudo token ids so that
+                the KV blocks of a speaker's conditioning prefix are shared by all requests for that speaker.
         """
         super().__init__()
         self.number_text_tokens = number_text_tokens
@@ -130,21 +156,20 @@ class UnifiedVoice(nn.Module):
 
         # init vllm engine
         vllm_dir = os.path.join(model_dir, "vllm")
-        engine_args = AsyncEngineArgs(
-            model=vllm_dir,
-            tensor_parallel_size=1,
-            dtype="auto",
-            gpu_memory_utilization=gpu_memory_utilization,
-            # enforce_eager=True,
-        )
+        engine_args = build_engine_args(vllm_dir, gpu_memory_utilization, enable_prefix_caching)
         self.llm = AsyncLLMEngine.from_engine_args(engine_args)
-        self.sampling_params = SamplingParams(
-            temperature=1.0,
-            top_p=0.8,
-            top_k=30,  # 5, 30
-            repetition_penalty=10.0,  # 8.0
-            max_tokens=768,  # 605
-        )
+        # 为 True 时 inference_speech 直接返回 vllm decode 时的 final_norm hidden states 作为 latent
+        self.capture_hidden_states = False
+        # 默认采样参数，只读；每次生成由 build_sampling_params 构造自己的 SamplingParams，并发请求互不影响
+        self.sampling_params = SamplingParams(**DEFAULT_SAMPLING)
+        # 因客户端断开 / 超时而被取消、在 vllm 中 abort 掉的生成请求数
+        self.aborted_requests = 0
+        # 为 True 时检测连续静音与重复循环并提前输出 stop_mel_token（EarlyStopProcessor）
+        self.early_stop = True
+        self.early_stop_stats = {"silence": 0, "repetition": 0, "decode_steps_saved": 0}
+        self.enable_prefix_caching = enable_prefix_caching
+        # prompt token 总数与其中命中 prefix cache（无需 prefill）的数量
+        self.prefix_cache_stats = {"prompt_tokens": 0, "cached_tokens": 0}
 
     def build_aligned_inputs_and_targets(self, input, start_token, stop_token):
         inp = F.pad(input, (1, 0), value=start_token)
@@ -158,36 +183,128 @@ class UnifiedVoice(nn.Module):
         conds = self.perceiver_encoder(speech_conditioning_input, conds_mask)  # (b, 32, d)
         return conds
 
-    async def inference_speech(self, speech_conditioning_latent, text_inputs, cond_mel_lengths=None):
-
+    @torch.no_grad()
+    def build_prompt_embeds(self, speech_conditioning_latent, text_inputs):
         text_inputs = F.pad(text_inputs, (0, 1), value=self.stop_text_token)
         text_inputs, _ = self.build_aligned_inputs_and_targets(text_inputs, self.start_text_token, self.stop_text_token)
         text_emb = self.text_embedding(text_inputs) + self.text_pos_embedding(text_inputs)
 
         # speech_conditioning_latent = self.get_conditioning(speech_conditioning_latent, cond_mel_lengths)
         emb = torch.cat([speech_conditioning_latent, text_emb], dim=1)
-        trunc_index = emb.shape[1] + 1
 
         mel_start_emb = self.mel_embedding(torch.full((emb.shape[0], 1,), fill_value=self.start_mel_token, dtype=torch.long, device=text_inputs.device))
         mel_start_emb = mel_start_emb + self.mel_pos_embedding(mel_start_emb)
         inputs_embeds = torch.cat([emb, mel_start_emb], dim=1)
+        return inputs_embeds
+
+    def build_sampling_params(self, sampling=None, seed=None, max_tokens=None):
+        """
+        单次生成的 SamplingParams：默认参数被 sampling（temperature / top_p / top_k / repetition_penalty）覆盖，
+        max_tokens 为该句子的 token 预算（不超过默认上限）。参数不合法时 vllm 抛出 ValueError。
+        """
+        params = {**DEFAULT_SAMPLING, **(sampling or {})}
+        if max_tokens is not None:
+            params["max_tokens"] = min(int(max_tokens), DEFAULT_SAMPLING["max_tokens"])
+        if seed is not None:
+            params["seed"] = int(seed)
+        # 由 logits processor 强制输出的 stop_mel_token 总能结束生成
+        params["stop_token_ids"] = [self.stop_mel_token]
+        return SamplingParams(**params)
+
+    async def inference_speech(self, speech_conditioning_latent, text_inputs, cond_mel_lengths=None, seed=None, timings=None,
+                               priority=PRIORITY_NORMAL, sampling=None, max_tokens=None, digest=None):
+        """
+        Args:
+            timings (RequestTimings | None): records vllm queue wait, prefill and decode time and the generated mel tokens.
+            priority (int): request priority. Not passed to vllm, which schedules first-come-first-served
+                (see build_engine_args); kept so that callers share one signature with the app-level queues.
+            sampling (dict | None): overrides of temperature / top_p / top_k / repetition_penalty.
+            max_tokens (int | None): token budget of this sentence, None uses the default limit.
+            digest (bytes | None): speaker_digest of speech_conditioning_latent, precomputed when the speaker is
+                registered; computed here if None.
+        """
+        inputs_embeds = self.build_prompt_embeds(speech_conditioning_latent, text_inputs)
+
+        sampling_params = self.build_sampling_params(sampling, seed, max_tokens)
+        processors = []
+        collector = None
+        if self.capture_hidden_states:
+            collector = HiddenStatesCollector()
+            processors.append(collector)
+        stopper = None
+        if self.early_stop:
+            stopper = EarlyStopProcessor(self.stop_mel_token, sampling_params.max_tokens)
+            processors.append(stopper)
+        if processors:
+            sampling_params.logits_processors = [*(sampling_params.logits_processors or []), *processors]
 
-        fake_inputs = [idx for idx in range(inputs_embeds.shape[1])]
+        if self.enable_prefix_caching:
+            if digest is None:
+                digest = speaker_digest(speech_conditioning_latent)
+            fake_inputs = prompt_token_ids(digest, text_inputs.view(-1).tolist(),
+                                           inputs_embeds.shape[1], prefix_len=speech_conditioning_latent.shape[1])
+        else:
+            fake_inputs = [idx for idx in range(inputs_embeds.shape[1])]
         multi_modal_data = {"image": inputs_embeds}
         tokens_prompt = TokensPrompt(prompt_token_ids=fake_inputs, multi_modal_data=multi_modal_data)
-        output_generator = self.llm.generate(tokens_prompt, sampling_params=self.sampling_params, request_id=uuid.uuid4())
-        # latent = []
-        async for output in output_generator:
-            # latent.append(output.hidden_states.clone())
-            pass
+        request_id = str(uuid.uuid4())
+        output = None
+        start_time = time.perf_counter()
+        first_output_time = None
+        try:
+            output_generator = self.llm.generate(tokens_prompt, sampling_params=sampling_params, request_id=request_id)
+            async for output in output_generator:
+                if first_output_time is None:
+                    first_output_time = time.perf_counter()
+        finally:
+            if output is None or not output.finished:
+                # 被取消（客户端断开、超过截止时间）时立即从 vllm 的调度中移除，不再为它 decode
+                self.aborted_requests += 1
+                try:
+                    await self.llm.abort(request_id)
+                except Exception:
+                    pass
+        if self.enable_prefix_caching:
+            self.prefix_cache_stats["prompt_tokens"] += len(fake_inputs)
+            self.prefix_cache_stats["cached_tokens"] += getattr(output, "num_cached_tokens", None) or 0
         codes = output.outputs[0].token_ids[:-2]
+        if stopper is not None and stopper.reason is not None:
+            self.early_stop_stats[stopper.reason] += 1
+            self.early_stop_stats["decode_steps_saved"] += stopper.steps_saved
+            if stopper.trim_to is not None:
+                codes = codes[:stopper.trim_to]
+        if timings is not None:
+            self.observe_generation(timings, output, start_time, first_output_time, time.perf_counter())
+            timings.add_mel_tokens(len(output.outputs[0].token_ids))
 
-        # latent = torch.cat(latent[:-2], dim=0).unsqueeze(0)
-        # # latent = self.final_norm(latent.float())
-        # latent = latent.float()
-        # print("codes", len(codes), codes)
-        # print("latent", latent.shape, latent)
-        return codes, None  # , latent
+        # 第 i 步 decode 的 hidden state 用于预测第 i 个 code，与 forward(return_latent=True) 的输出一一对应
+        latent = collector.get_latent(len(codes)) if collector is not None else None
+        return codes, latent
+
+    @staticmethod
+    def observe_generation(timings, output, start_time, first_output_time, end_time):
+        """
+        由 vllm 的 RequestMetrics 拆分排队（到第一次被调度）、prefill（到第一个 token）与 decode 耗时。
+        没有 metrics 时（如关闭了统计）退化为本地计时：排队计入 prefill。
+        """
+        metrics = getattr(output, "metrics", None)
+        if metrics is not None and metrics.first_scheduled_time and metrics.first_token_time:
+            finished_time = metrics.finished_time or metrics.last_token_time
+            timings.observe("vllm_queue", metrics.first_scheduled_time - metrics.arrival_time)
+            timings.observe("prefill", metrics.first_token_time - metrics.first_scheduled_time)
+            timings.observe("decode", max(finished_time - metrics.first_token_time, 0.0))
+        else:
+            first_output_time = first_output_time or end_time
+            timings.observe("prefill", first_output_time - start_time)
+            timings.observe("decode", end_time - first_output_time)
+
+    def release_hf_gpt(self):
+        """
+        latent 改由 vllm decode 时捕获后，HF GPT2Model 只在 forward 中用到，可释放以节省一份 transformer 权重。
+        释放后不能再调用 forward。
+        """
+        self.capture_hidden_states = True
+        self.gpt = None
 
     def set_mel_padding(self, mel_input_tokens, mel_lengths):
         """
@@ -195,12 +312,11 @@ class UnifiedVoice(nn.Module):
         that audio clip, reformats the tokens with STOP_MEL_TOKEN in place of the zero padding. This is required
         preformatting to create a working TTS model.
         """
-        for b in range(len(mel_lengths)):
-            # Due to the convolutional nature of how these tokens are generated,
-            # it would be best if the model predicts a token past the actual last token.
-            actual_end = mel_lengths[b]
-            if actual_end < mel_input_tokens.shape[-1]:
-                mel_input_tokens[b, actual_end:] = self.stop_mel_token
+        # Due to the convolutional nature of how these tokens are generated,
+        # it would be best if the model predicts a token past the actual last token.
+        positions = torch.arange(mel_input_tokens.shape[-1], device=mel_input_tokens.device)
+        mel_lengths = torch.as_tensor(mel_lengths, device=mel_input_tokens.device)
+        mel_input_tokens.masked_fill_(positions[None, :] >= mel_lengths[:, None], self.stop_mel_token)
         return mel_input_tokens
 
     def set_text_padding(self, text_input_tokens, text_lengths):
@@ -209,12 +325,9 @@ class UnifiedVoice(nn.Module):
         that audio clip, reformats the tokens with STOP_MEL_TOKEN in place of the zero padding. This is required
         preformatting to create a working TTS model.
         """
-        for b in range(len(text_lengths)):
-            # Due to the convolutional nature of how these tokens are generated,
-            # it would be best if the model predicts a token past the actual last token.
-            actual_end = text_lengths[b]
-            if actual_end < text_input_tokens.shape[-1]:
-                text_input_tokens[b, actual_end:] = self.stop_text_token
+        positions = torch.arange(text_input_tokens.shape[-1], device=text_input_tokens.device)
+        text_lengths = torch.as_tensor(text_lengths, device=text_input_tokens.device)
+        text_input_tokens.masked_fill_(positions[None, :] >= text_lengths[:, None], self.stop_text_token)
         return text_input_tokens
 
     def forward(self, speech_conditioning_latent, text_inputs, text_lengths, mel_codes, wav_lengths,
@@ -244,3 +357,45 @@ class UnifiedVoice(nn.Module):
         enc = self.final_norm(enc)
         
         return enc[:, -mel_emb.shape[1]:][:, :-2]
+
+
+    @torch.no_grad()
+    def forward_latents(self, items):
+        """
+        批量 teacher-forced 前向，所有 item 只跑一次 GPT2 stack。
+
+        每个 item 按 forward 的方式拼成 [conds, start_text, text, stop_text, start_mel, codes, stop_mel]，
+        各自计算 text / mel 的 position embedding，再右侧补零到同一长度并带上 attention_mask。
+        因果注意力下右侧补零不影响有效位置的输出。
+
+        Args:
+            items: list of (speech_conditioning_latent (1, cond_len, dim), text_tokens (1, t), mel_codes (list or (m,) tensor))
+        Returns:
+            list of final_norm latents (1, m, dim)，与 forward(return_latent=True) 对单个 item 的输出一致
+        """
+        embs, mel_offsets, mel_lengths = [], [], []
+        for speech_conditioning_latent, text_inputs, mel_codes in items:
+            device = text_inputs.device
+            mel_codes = torch.as_tensor(mel_codes, dtype=torch.long, device=device).view(1, -1)
+            text_inputs = F.pad(text_inputs.view(1, -1), (0, 1), value=self.stop_text_token)
+            text_inputs, _ = self.build_aligned_inputs_and_targets(text_inputs, self.start_text_token, self.stop_text_token)
+            text_emb = self.text_embedding(text_inputs) + self.text_pos_embedding(text_inputs)
+            mel_inputs = F.pad(mel_codes, (0, 1), value=self.stop_mel_token)
+            mel_inputs, _ = self.build_aligned_inputs_and_targets(mel_inputs, self.start_mel_token, self.stop_mel_token)
+            mel_emb = self.mel_embedding(mel_inputs) + self.mel_pos_embedding(mel_inputs)
+
+            emb = torch.cat([speech_conditioning_latent, text_emb, mel_emb], dim=1)[0]
+            embs.append(emb)
+            mel_offsets.append(speech_conditioning_latent.shape[1] + text_emb.shape[1])
+            mel_lengths.append(mel_codes.shape[1])
+
+        seq_lens = torch.tensor([emb.shape[0] for emb in embs], device=embs[0].device)
+        emb = nn.utils.rnn.pad_sequence(embs, batch_first=True)
+        attention_mask = (torch.arange(emb.shape[1], device=emb.device)[None, :] < seq_lens[:, None]).long()
+        gpt_out = self.gpt(inputs_embeds=emb, attention_mask=attention_mask, return_dict=True)
+
+        latents = []
+        for i, (offset, length) in enumerate(zip(mel_offsets, mel_lengths)):
+            # 第 i 个 mel 输入（start_mel, codes[:-1]）位置的输出用于预测第 i 个 code
+            latents.append(self.final_norm(gpt_out.last_hidden_state[i:i + 1, offset:offset + length]))
+        return latents
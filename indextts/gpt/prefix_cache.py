@@ -0,0 +1,67 @@
+import hashlib
+import random
+
+import torch
+
+# prompt = [speaker conditioning latent (32), start_text, text tokens, stop_text, start_mel]
+
+
+def speaker_digest(speech_conditioning_latent) -> bytes:
+    """speaker conditioning latent 内容的 hash，与所在 device 无关"""
+    data = speech_conditioning_latent.detach().float().cpu().numpy().tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def prompt_token_ids(digest, text_tokens, prompt_len, prefix_len=32):
+    """
+    vllm prompt 的伪 token id。prompt 以 embeds（multi_modal_data）传入，token id 只用于 vllm 的调度、
+    prefix caching 的 block hash 与 repetition_penalty，原先固定为 range(prompt_len)，任意两条 prompt 的 block hash 都相同，
+    prefix caching 无法使用。这里改为由内容决定的排列：
+        - 前 prefix_len 个（conditioning latent）是 range(prefix_len) 按 speaker digest 打乱的排列，
+          同一 speaker 的所有请求相同，KV block 在请求之间共享
+        - 其余是 range(prefix_len, prompt_len) 按 speaker digest 与文本 token 打乱的排列，完全相同的 prompt 整条命中
+    id 的集合仍是 range(prompt_len)，repetition_penalty 的作用与原来完全一致；
+    0 固定在第一位，仍是唯一的 "image" placeholder。
+
+    Args:
+        digest (bytes): speaker_digest of the conditioning latent.
+        text_tokens (list[int]): text token ids of the sentence.
+        prompt_len (int): number of prompt embeds.
+        prefix_len (int): length of the speaker conditioning prefix.
+    """
+    prefix_ids = list(range(1, prefix_len))
+    random.Random(digest).shuffle(prefix_ids)
+    text_key = hashlib.blake2b(digest + ",".join(map(str, text_tokens)).encode(), digest_size=16).digest()
+    text_ids = list(range(prefix_len, prompt_len))
+    random.Random(text_key).shuffle(text_ids)
+    return [0, *prefix_ids, *text_ids]
+
+
+def select_uncomputed_embeds(prompt_embeds, seq_lens, context_lens):
+    """
+    prefix caching 命中时 vllm 只为未命中的 token 做 prefill，multi_modal_data 却仍是整条 prompt 的 embeds：
+    按各序列已缓存的长度去掉命中的部分，与 input_ids 对齐。
+
+    Args:
+        prompt_embeds: (sum(seq_lens), dim) prompt embeds of the prefill sequences, concatenated in batch order.
+        seq_lens (list[int]): prompt length of each prefill sequence.
+        context_lens (list[int]): leading tokens of each prefill sequence whose KV is already cached.
+    """
+    pieces, offset = [], 0
+    for seq_len, context_len in zip(seq_lens, context_lens):
+        pieces.append(prompt_embeds[offset + context_len:offset + seq_len])
+        offset += seq_len
+    return torch.cat(pieces, dim=0)
+
+
+def uncomputed_prompt_embeds(prompt_embeds, num_tokens, attn_metadata):
+    """
+    GPT2TTSModel.forward 的 prefill 分支使用：embeds 与 input_ids 等长（没有命中）时原样返回，不产生额外的同步；
+    否则由 attn_metadata 中 prefill 序列的 seq_lens / context_lens 去掉已缓存的部分。
+    """
+    if prompt_embeds.shape[0] == num_tokens or attn_metadata is None:
+        return prompt_embeds
+    num_prefills = attn_metadata.num_prefills
+    seq_lens = list(attn_metadata.seq_lens[:num_prefills])
+    context_lens = attn_metadata.context_lens_tensor[:num_prefills].tolist()
+    return select_uncomputed_embeds(prompt_embeds, seq_lens, context_lens)
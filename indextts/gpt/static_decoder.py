@@ -0,0 +1,163 @@
+import torch
+import torch.nn.functional as F
+
+
+def find_multiple(n: int, k: int) -> int:
+    if n % k == 0:
+        return n
+    return n + k - (n % k)
+
+
+def multinomial_sample_one_no_sync(probs):  # Does multinomial sampling without a cuda synchronization
+    q = torch.empty_like(probs).exponential_(1)
+    return torch.argmax(probs / q, dim=-1, keepdim=True)
+
+
+def apply_repetition_penalty(logits, generated_mask, repetition_penalty=1.0):
+    """与 HF 的 RepetitionPenaltyLogitsProcessor 相同：已生成过的 token，正的 logit 除以 penalty，负的乘以 penalty"""
+    if repetition_penalty == 1.0:
+        return logits
+    penalized = torch.where(logits < 0, logits * repetition_penalty, logits / repetition_penalty)
+    return torch.where(generated_mask, penalized, logits)
+
+
+def logits_to_probs(logits, temperature=1.0, top_k=None, top_p=None):
+    """依次应用 temperature、top_k、top_p，与 HF generate 的 logits warper 顺序及行为相同"""
+    logits = logits / max(temperature, 1e-5)
+    if top_k is not None and top_k > 0:
+        v, _ = torch.topk(logits, min(top_k, logits.size(-1)))
+        logits = torch.where(logits < v[..., -1:], -float("Inf"), logits)
+    if top_p is not None and top_p < 1.0:
+        sorted_logits, sorted_indices = torch.sort(logits, descending=False)
+        cumulative_probs = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+        sorted_to_remove = cumulative_probs <= (1 - top_p)
+        sorted_to_remove[..., -1:] = False  # 至少保留一个 token
+        to_remove = sorted_to_remove.scatter(-1, sorted_indices, sorted_to_remove)
+        logits = logits.masked_fill(to_remove, -float("Inf"))
+    return F.softmax(logits, dim=-1)
+
+
+class StaticKVDecoder:
+    """
+    不依赖 vllm 与 HF generate 的 gpt 解码器，面向没有 GPU 的部署（参考 s2mel/modules/gpt_fast/generate.py）：
+        - 每层的 KV cache 按最大长度预先分配，decode 时原地写入，不再每步拼接出更长的 past_key_values
+        - 单 token 的 decode 步输入输出形状固定，可用 torch.compile 编译
+        - 只保留每步 final_norm 之后的 hidden state 作为 latent，不保存每一层每一步的 hidden states
+    直接使用 UnifiedVoice（indextts/gpt/model.py）的权重，不复制参数；
+    generate 的参数与返回值与 UnifiedVoice.inference_speech 相同，可在 IndexTTS 中互换。
+    """
+
+    def __init__(self, unified_voice, compile=False):
+        """
+        Args:
+            unified_voice (UnifiedVoice): loaded model whose GPT2 blocks, norms, mel embeddings and mel head are used.
+            compile (bool): compile the single-token decode step with torch.compile.
+        """
+        self.model = unified_voice
+        self.blocks = unified_voice.gpt.h
+        self.n_head = unified_voice.gpt.config.n_head
+        self.head_dim = unified_voice.model_dim // self.n_head
+        self.kv_caches = []
+        self.causal_mask = None
+        self.max_batch_size = -1
+        self.max_seq_length = -1
+        self.decode_one_token = self._decode_one_token
+        if compile:
+            self.decode_one_token = torch.compile(self._decode_one_token, fullgraph=True, dynamic=False)
+
+    def setup_caches(self, batch_size, max_seq_length):
+        """按 batch 与最大序列长度分配 KV cache；已分配的足够大时复用（形状不变，编译后的 decode 步不会重新编译）"""
+        if self.max_seq_length >= max_seq_length and self.max_batch_size == batch_size:
+            return
+        max_seq_length = find_multiple(max_seq_length, 8)
+        weight = self.model.mel_head.weight
+        cache_shape = (batch_size, self.n_head, max_seq_length, self.head_dim)
+        self.kv_caches = [(torch.zeros(cache_shape, dtype=weight.dtype, device=weight.device),
+                           torch.zeros(cache_shape, dtype=weight.dtype, device=weight.device))
+                          for _ in self.blocks]
+        self.causal_mask = torch.tril(torch.ones(max_seq_length, max_seq_length, dtype=torch.bool, device=weight.device))
+        self.max_batch_size = batch_size
+        self.max_seq_length = max_seq_length
+
+    def forward(self, inputs_embeds, input_pos):
+        """
+        GPT2 transformer（含 ln_f），K/V 写入 input_pos 处的 cache 后对 cache 中的全部位置做因果注意力。
+        Args:
+            inputs_embeds: (batch, seq, dim)
+            input_pos: (seq,) positions of inputs_embeds in the sequence.
+        """
+        batch_size, seq_len, dim = inputs_embeds.shape
+        mask = self.causal_mask[input_pos][None, None]  # (1, 1, seq, max_seq_length)
+        x = inputs_embeds
+        for block, (k_cache, v_cache) in zip(self.blocks, self.kv_caches):
+            q, k, v = block.attn.c_attn(block.ln_1(x)).split(dim, dim=-1)
+            q, k, v = [t.view(batch_size, seq_len, self.n_head, self.head_dim).transpose(1, 2) for t in (q, k, v)]
+            k_cache[:, :, input_pos] = k
+            v_cache[:, :, input_pos] = v
+            y = F.scaled_dot_product_attention(q, k_cache, v_cache, attn_mask=mask)
+            y = y.transpose(1, 2).reshape(batch_size, seq_len, dim)
+            x = x + block.attn.c_proj(y)
+            x = x + block.mlp(block.ln_2(x))
+        return self.model.gpt.ln_f(x)
+
+    def _decode_one_token(self, token, input_pos, mel_pos):
+        """
+        单个 mel token 的 decode 步，返回下一个 token 的 logits 与本步的 latent（final_norm 之后）。
+        Args:
+            token: (batch, 1) the last generated mel token.
+            input_pos: (1,) position of the token in the sequence.
+            mel_pos: (1,) index of its mel position embedding.
+        """
+        x = self.model.mel_embedding(token) + self.model.mel_pos_embedding.emb(mel_pos)
+        latent = self.model.final_norm(self.forward(x, input_pos)[:, -1])
+        return self.model.mel_head(latent).float(), latent
+
+    @torch.no_grad()
+    def generate(self, speech_conditioning_latent, text_inputs, max_generate_length=None, do_sample=True, top_p=None,
+                 top_k=None, temperature=1.0, repetition_penalty=1.0, num_return_sequences=1, **kwargs):
+        """
+        与 UnifiedVoice.inference_speech 相同的输入与输出：codes 为 HF generate 的 sequences[:, 1:]，
+        latent 为第 0 ~ n-3 个生成 token 所在位置的 final_norm hidden state。
+        其余 HF generate 参数（cond_mel_lengths、length_penalty、num_beams 等）被忽略。
+        """
+        model = self.model
+        inputs_embeds = model.build_prompt_embeds(speech_conditioning_latent, text_inputs)
+        if num_return_sequences > 1:
+            inputs_embeds = inputs_embeds.repeat_interleave(num_return_sequences, dim=0)
+        batch_size, prompt_len, _ = inputs_embeds.shape
+        device = inputs_embeds.device
+        max_new_tokens = max_generate_length if max_generate_length is not None else model.max_mel_tokens - 1
+        self.setup_caches(batch_size, prompt_len + max_new_tokens)
+
+        hidden = self.forward(inputs_embeds, torch.arange(prompt_len, device=device))[:, -1]
+        logits = model.mel_head(model.final_norm(hidden)).float()
+
+        tokens = torch.full((batch_size, max_new_tokens), model.stop_mel_token, dtype=torch.long, device=device)
+        latents = torch.empty((batch_size, max_new_tokens, model.model_dim), dtype=hidden.dtype, device=device)
+        generated_mask = torch.zeros_like(logits, dtype=torch.bool)
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        # 第 i 个生成的 token 作为输入时，位于序列的 prompt_len + i，mel 位置编码取第 i + 2 个（与 GPT2InferenceModel 相同）
+        input_pos = torch.tensor([prompt_len], device=device)
+        mel_pos = torch.tensor([2], device=device)
+        num_tokens = max_new_tokens
+        for step in range(max_new_tokens):
+            logits = apply_repetition_penalty(logits, generated_mask, repetition_penalty)
+            if do_sample:
+                next_token = multinomial_sample_one_no_sync(logits_to_probs(logits, temperature, top_k, top_p))
+            else:
+                next_token = logits.argmax(dim=-1, keepdim=True)
+            # 已结束的序列之后只填充 stop_mel_token
+            next_token = next_token.masked_fill(finished[:, None], model.stop_mel_token)
+            tokens[:, step] = next_token[:, 0]
+            generated_mask.scatter_(1, next_token, True)
+            finished |= next_token[:, 0] == model.stop_mel_token
+            if step == max_new_tokens - 1 or finished.all():
+                num_tokens = step + 1
+                break
+            logits, latents[:, step] = self.decode_one_token(next_token, input_pos, mel_pos)
+            input_pos += 1
+            mel_pos += 1
+
+        codes = tokens[:, 1:num_tokens]
+        latent = latents[:, :max(num_tokens - 2, 0)]
+        return codes, latent
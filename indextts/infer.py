@@ -19,7 +19,9 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 from indextts.BigVGAN.models import BigVGAN as Generator
+from indextts.gpt.early_stop import long_silence_keep_mask
 from indextts.gpt.model import UnifiedVoice
+from indextts.gpt.static_decoder import StaticKVDecoder
 from indextts.utils.checkpoint import load_checkpoint
 from indextts.utils.feature_extractors import MelSpectrogramFeatures
 
@@ -29,6 +31,7 @@ from indextts.utils.front import TextNormalizer, TextTokenizer
 class IndexTTS:
     def __init__(
         self, cfg_path="checkpoints/config.yaml", model_dir="checkpoints", is_fp16=True, device=None, use_cuda_kernel=None,
+        gpt_engine="hf", compile_decoder=False,
     ):
         """
         Args:
@@ -37,6 +40,9 @@ class IndexTTS:
             is_fp16 (bool): whether to use fp16.
             device (str): device to use (e.g., 'cuda:0', 'cpu'). If None, it will be set automatically based on the availability of CUDA or MPS.
             use_cuda_kernel (None | bool): whether to use BigVGan custom fused activation CUDA kernel, only for CUDA device.
+            gpt_engine (str): "hf" generates mel tokens with HuggingFace generate, "static" with StaticKVDecoder
+                (preallocated KV cache, only the final_norm hidden states are kept), suited to CPU deployments.
+            compile_decoder (bool): compile the decode step of the "static" engine with torch.compile.
         """
         if device is not None:
             self.device = device
@@ -64,12 +70,17 @@ class IndexTTS:
         self.gpt = UnifiedVoice(**self.cfg.gpt)
         self.gpt_path = os.path.join(self.model_dir, self.cfg.gpt_checkpoint)
         load_checkpoint(self.gpt, self.gpt_path)
+        if gpt_engine == "hf":
+            self.gpt.post_init_gpt2_config()
+        elif gpt_engine != "static":
+            raise ValueError(f"unknown gpt_engine: {gpt_engine}")
         self.gpt = self.gpt.to(self.device)
         if self.is_fp16:
             self.gpt.eval().half()
         else:
             self.gpt.eval()
         print(">> GPT weights restored from:", self.gpt_path)
+        self.static_decoder = StaticKVDecoder(self.gpt, compile=compile_decoder) if gpt_engine == "static" else None
 
         if self.use_cuda_kernel:
             # preload the CUDA kernel for BigVGAN
@@ -121,20 +132,10 @@ class IndexTTS:
 
             count = torch.sum(code == silent_token).item()
             if count > max_consecutive:
-                code = code.cpu().tolist()
-                ncode = []
-                n = 0
-                for k in range(0, len_):
-                    if code[k] != silent_token:
-                        ncode.append(code[k])
-                        n = 0
-                    elif code[k] == silent_token and n < 10:
-                        ncode.append(code[k])
-                        n += 1
-                    # if (k == 0 and code[k] == 52) or (code[k] == 52 and code[k-1] == 52):
-                    #    n += 1
+                # 连续的静音 token 只保留前 10 个
+                code = code[:len_]
+                ncode = code[long_silence_keep_mask(code, silent_token, 10)]
                 len_ = len(ncode)
-                ncode = torch.LongTensor(ncode)
                 codes_list.append(ncode.to(device, dtype=dtype))
                 isfix = True
                 # codes[i] = self.stop_mel_token
@@ -201,9 +202,12 @@ class IndexTTS:
         bigvgan_time = 0
 
         speech_conditioning_latent = self.gpt.get_conditioning(
-            auto_conditioning.half(),
+            auto_conditioning.half() if self.is_fp16 else auto_conditioning,
             torch.tensor([auto_conditioning.shape[-1]], device=self.device)
         )
+        # speaker embedding 只与参考音频有关，所有句子共用
+        with torch.no_grad():
+            speaker_embedding = self.bigvgan.compute_speaker_embedding(auto_conditioning.transpose(1, 2))
 
         for sent in sentences:
             text_tokens = self.tokenizer.convert_tokens_to_ids(sent)
@@ -224,19 +228,20 @@ class IndexTTS:
             m_start_time = time.perf_counter()
             with torch.no_grad():
                 with torch.amp.autocast(text_tokens.device.type, enabled=self.dtype is not None, dtype=self.dtype):
-                    codes, latent = self.gpt.inference_speech(speech_conditioning_latent, text_tokens,
-                                                        cond_mel_lengths=torch.tensor([auto_conditioning.shape[-1]],
-                                                                                      device=text_tokens.device),
-                                                        # text_lengths=text_len,
-                                                        do_sample=True,
-                                                        top_p=top_p,
-                                                        top_k=top_k,
-                                                        temperature=temperature,
-                                                        num_return_sequences=autoregressive_batch_size,
-                                                        length_penalty=length_penalty,
-                                                        num_beams=num_beams,
-                                                        repetition_penalty=repetition_penalty,
-                                                        max_generate_length=max_mel_tokens)
+                    generate = self.static_decoder.generate if self.static_decoder is not None else self.gpt.inference_speech
+                    codes, latent = generate(speech_conditioning_latent, text_tokens,
+                                             cond_mel_lengths=torch.tensor([auto_conditioning.shape[-1]],
+                                                                           device=text_tokens.device),
+                                             # text_lengths=text_len,
+                                             do_sample=True,
+                                             top_p=top_p,
+                                             top_k=top_k,
+                                             temperature=temperature,
+                                             num_return_sequences=autoregressive_batch_size,
+                                             length_penalty=length_penalty,
+                                             num_beams=num_beams,
+                                             repetition_penalty=repetition_penalty,
+                                             max_generate_length=max_mel_tokens)
                 gpt_gen_time += time.perf_counter() - m_start_time
                 
                 # code_lens = torch.tensor([codes.shape[-1]], device=codes.device, dtype=codes.dtype)
@@ -254,7 +259,7 @@ class IndexTTS:
                 #     print(f"code len: {code_lens}")
 
                 m_start_time = time.perf_counter()
-                wav, _ = self.bigvgan(latent, auto_conditioning.transpose(1, 2))
+                wav, _ = self.bigvgan(latent, None, speaker_embedding=speaker_embedding)
                 bigvgan_time += time.perf_counter() - m_start_time
                 wav = wav.squeeze(1)
 
@@ -1,3 +1,6 @@
+import asyncio
+import functools
+import io
 import os
 import re
 import time
@@ -20,11 +23,22 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 from indextts.BigVGAN.models import BigVGAN as Generator
+from indextts.gpt.early_stop import SILENT_MEL_TOKEN, long_silence_keep_mask
 from indextts.gpt.model_vllm import UnifiedVoice
+from indextts.gpt.prefix_cache import speaker_digest
 from indextts.utils.checkpoint import load_checkpoint
 from indextts.utils.feature_extractors import MelSpectrogramFeatures
 
-from indextts.utils.front import TextNormalizer, TextTokenizer
+from indextts.utils.front import IncrementalSentenceSplitter, TextNormalizer, TextTokenizer
+from indextts.utils.latent_batcher import LatentBatcher
+from indextts.utils.metrics import RequestTimings
+from indextts.utils.priority import PRIORITY_BACKGROUND, PRIORITY_NORMAL, PriorityThreadPoolExecutor
+from indextts.utils.sampling import DEFAULT_SAMPLING, estimate_max_mel_tokens
+from indextts.utils.single_flight import SingleFlight
+from indextts.utils.speaker_store import ConditioningCache, SpeakerStore, checkpoint_version
+from indextts.utils.synthesis_cache import SentenceCache, file_fingerprint, make_sentence_key
+from indextts.utils.vocoder_batcher import VocoderBatcher
+from indextts.utils.warmup import run_warmup
 
 import matplotlib.pyplot as plt
 
@@ -43,6 +57,16 @@ import matplotlib.pyplot as plt
 #     wav = np.concatenate([np.zeros((int(0.4 * 24000), 1)), wav], axis=0).astype(np.int16)
 #     return wav
 
+def tail_silence_pad_length(wav_data, threshold=1000, min_silence=int(24000*0.4)):
+    """返回需要在末尾补零的采样点数，使后端静音至少为 min_silence"""
+    abs_trimmed = np.abs(wav_data).flatten()
+    last_non_silent = len(abs_trimmed) - np.argmax(abs_trimmed[::-1] >= threshold)  # 最后一个≥threshold的索引+1
+    
+    # 计算后端静音长度
+    back_silence_length = len(wav_data) - last_non_silent
+    return max(min_silence - back_silence_length, 0)
+
+
 def trim_and_pad_silence(wav_data, threshold=1000, min_silence=int(24000*0.4)):
     # # 1. 去除前端静音
     # abs_data = np.abs(wav_data).flatten()
@@ -50,13 +74,8 @@ def trim_and_pad_silence(wav_data, threshold=1000, min_silence=int(24000*0.4)):
     # wav_data = wav_data[max(0, first_non_silent-int(24000*0.1)):]  # 切片保留后端
     
     # 2. 处理后端静音
-    abs_trimmed = np.abs(wav_data).flatten()
-    last_non_silent = len(abs_trimmed) - np.argmax(abs_trimmed[::-1] >= threshold)  # 最后一个≥threshold的索引+1
-    
-    # 计算后端静音长度
-    back_silence_length = len(wav_data) - last_non_silent
-    if back_silence_length < min_silence:
-        pad_length = min_silence - back_silence_length
+    pad_length = tail_silence_pad_length(wav_data, threshold, min_silence)
+    if pad_length > 0:
         padded = np.vstack([wav_data, np.zeros((pad_length, 1))])  # 补0
     else:
         padded = wav_data
@@ -67,6 +86,10 @@ def trim_and_pad_silence(wav_data, threshold=1000, min_silence=int(24000*0.4)):
 class IndexTTS:
     def __init__(
         self, cfg_path="checkpoints/config.yaml", model_dir="checkpoints", gpu_memory_utilization=0.25, is_fp16=True, device=None, use_cuda_kernel=None,
+        max_sentence_concurrency=8, hf_latent=False, vocoder_batch_size=8, vocoder_batch_wait_ms=5.0, latent_batch_size=8,
+        cpu_workers=2, sentence_cache_bytes=256 * 1024 * 1024, sentence_cache_dir=None, sentence_cache_disk_bytes=None,
+        speaker_store_dir=None, conditioning_cache_size=256, coalesce_requests=True, max_tokens_factor=1.5, early_stop=True,
+        prefix_caching=False,
     ):
         """
         Args:
@@ -75,6 +98,29 @@ class IndexTTS:
             is_fp16 (bool): whether to use fp16.
             device (str): device to use (e.g., 'cuda:0', 'cpu'). If None, it will be set automatically based on the availability of CUDA or MPS.
             use_cuda_kernel (None | bool): whether to use BigVGan custom fused activation CUDA kernel, only for CUDA device.
+            max_sentence_concurrency (int): max number of sentences of a single request submitted to vllm at the same time.
+            hf_latent (bool): compute bigvgan latents with a second teacher-forced pass through the HF GPT2Model,
+                instead of capturing the final_norm hidden states during vllm decode. The HF transformer is only kept in memory when True.
+            vocoder_batch_size (int): max number of sentences (across all in-flight requests) vocoded in one bigvgan forward. 1 disables batching.
+            vocoder_batch_wait_ms (float): max time a sentence waits for others to join its bigvgan (or hf latent) batch.
+            latent_batch_size (int): max number of sentences (across all in-flight requests) sharing one teacher-forced
+                HF GPT2Model pass, only used when hf_latent is True. 1 disables batching.
+            cpu_workers (int): threads for cpu-only stages (text normalisation, audio loading, post-processing, wav encoding).
+            sentence_cache_bytes (int): memory budget of the per-sentence synthesis cache (int16 PCM), 0 disables the cache.
+            sentence_cache_dir (str | None): directory of the on-disk cache tier, None keeps the cache in memory only.
+            sentence_cache_disk_bytes (int | None): max size of the on-disk cache tier, None means unbounded.
+            speaker_store_dir (str | None): directory of the persisted speaker registry (safetensors), None disables it.
+            conditioning_cache_size (int): number of reference-audio sets (keyed by content hash) whose conditioning
+                is kept in memory for infer(), 0 disables the cache.
+            coalesce_requests (bool): identical sentences (same speaker, normalised tokens, seed and sampling params)
+                of concurrent requests are generated once and shared, with or without the sentence cache. Only requests
+                with a fixed seed (or reuse_cache=True) are coalesced, unseeded ones keep their own sampling.
+            max_tokens_factor (float): each sentence may generate at most its estimated duration (at the slowest
+                speech rate) times this factor in mel tokens, capped at the default max_tokens; 0 always uses the cap.
+            early_stop (bool): stop a generation early on a long run of silent tokens or a repetition loop
+                (EarlyStopProcessor), and drop over-long silences from the latent before bigvgan.
+            prefix_caching (bool): enable vllm prefix caching with content-derived prompt token ids, the KV of a
+                speaker's conditioning prefix (and of repeated identical prompts) is reused instead of prefilled again.
         """
         if device is not None:
             self.device = device
@@ -94,21 +140,35 @@ class IndexTTS:
             self.use_cuda_kernel = False
             print(">> Be patient, it may take a while to run in CPU mode.")
 
+        # 非 vllm 的 GPU 计算（conditioning、latent、bigvgan 及 .cpu() 拷贝）在同一个专用线程上串行执行，
+        # 纯 CPU 的工作放到单独的线程池，event loop 只负责调度与 vllm 的结果流。
+        # 两个线程池都按请求优先级出队，interactive 请求的工作不会排在 background 任务之后
+        self.gpu_executor = PriorityThreadPoolExecutor(max_workers=1, thread_name_prefix="indextts-gpu")
+        self.cpu_executor = PriorityThreadPoolExecutor(max_workers=max(1, cpu_workers), thread_name_prefix="indextts-cpu")
+
         self.cfg = OmegaConf.load(cfg_path)
         self.model_dir = model_dir
         self.dtype = torch.float16 if self.is_fp16 else None
         self.stop_mel_token = self.cfg.gpt.stop_mel_token
 
-        self.gpt = UnifiedVoice(gpu_memory_utilization, **self.cfg.gpt, model_dir=model_dir)
+        self.gpt = UnifiedVoice(gpu_memory_utilization, **self.cfg.gpt, model_dir=model_dir, enable_prefix_caching=prefix_caching)
         self.gpt_path = os.path.join(self.model_dir, self.cfg.gpt_checkpoint)
         load_checkpoint(self.gpt, self.gpt_path)
+        self.hf_latent = hf_latent
+        if not self.hf_latent:
+            self.gpt.release_hf_gpt()
         self.gpt = self.gpt.to(self.device)
         # if self.is_fp16:
         #     self.gpt.eval().half()
         # else:
         #     self.gpt.eval()
         self.gpt.eval()
+        self.gpt.early_stop = early_stop
         print(">> GPT weights restored from:", self.gpt_path)
+        self.latent_batcher = None
+        if self.hf_latent and latent_batch_size > 1:
+            self.latent_batcher = LatentBatcher(self.gpt, max_batch_size=latent_batch_size, max_wait_ms=vocoder_batch_wait_ms,
+                                               executor=self.gpu_executor)
 
         if self.use_cuda_kernel:
             # preload the CUDA kernel for BigVGAN
@@ -130,6 +190,10 @@ class IndexTTS:
         self.bigvgan.remove_weight_norm()
         self.bigvgan.eval()
         print(">> bigvgan weights restored from:", self.bigvgan_path)
+        self.vocoder_batcher = None
+        if vocoder_batch_size > 1:
+            self.vocoder_batcher = VocoderBatcher(self.bigvgan, max_batch_size=vocoder_batch_size, max_wait_ms=vocoder_batch_wait_ms,
+                                                 executor=self.gpu_executor, output_device="cpu")
         self.bpe_path = os.path.join(self.model_dir, "bpe.model")  # self.cfg.dataset["bpe_model"]
         self.normalizer = TextNormalizer()
         self.normalizer.load()
@@ -137,230 +201,601 @@ class IndexTTS:
         self.tokenizer = TextTokenizer(self.bpe_path, self.normalizer)
         print(">> bpe model loaded from:", self.bpe_path)
 
+        self.max_sentence_concurrency = max(1, max_sentence_concurrency)
+        self.max_tokens_factor = max_tokens_factor
         self.speaker_dict = {}
+
+        # 句子级合成结果缓存，只在固定 seed 或调用方显式允许复用非确定性结果时使用
+        self.sentence_cache = None
+        if sentence_cache_bytes > 0 or sentence_cache_dir is not None:
+            self.sentence_cache = SentenceCache(sentence_cache_bytes, sentence_cache_dir, sentence_cache_disk_bytes)
+        self.model_fingerprint = f"{file_fingerprint(self.gpt_path, self.bigvgan_path)}-hf_latent={self.hf_latent}"
+
+        # 并发请求中相同的句子只生成一次（single-flight），同时到达的相同请求共享结果与流
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        self.coalesced_requests = 0
+
+        # speaker 注册结果持久化到 speaker store；add_speaker 只记录参考音频，第一次用到时才加载 / 计算
+        self.speaker_store = None
+        if speaker_store_dir is not None:
+            self.speaker_store = SpeakerStore(speaker_store_dir, checkpoint_version(self.gpt_path, self.bigvgan_path))
+        self.speaker_sources = {}
+        # 正在注册的 speaker -> future，并发的第一次使用只计算 / 写入 store 一次
+        self.speaker_futures = {}
+
+        # infer() 的参考音频按内容哈希缓存 conditioning；重采样器按源采样率缓存，mel 前端只构建一次
+        self.conditioning_cache = ConditioningCache(conditioning_cache_size)
+        self.resamplers = {}
+        self.mel_frontend = MelSpectrogramFeatures()
+
+        # 请求被取消时尚未完成、被中止的句子数
+        self.cancelled_sentences = 0
     
-    def remove_long_silence(self, codes: list, latent: torch.Tensor, max_consecutive=15, silent_token=52):
+    def remove_long_silence(self, codes: list, latent: torch.Tensor, max_consecutive=15, silent_token=SILENT_MEL_TOKEN):
+        """去除 latent 中过长的静音：连续的静音 token 只保留前 max_consecutive 帧（GPU）"""
         assert latent.dim() == 3 and latent.size(0) == 1, "Latent should be (1, seq_len, dim)"
-        seq_len, dim = latent.size(1), latent.size(2)
-        # print("latent", latent.shape)
-        
+        codes = list(codes)
+        valid_len = len(codes)
         if self.stop_mel_token in codes:
-            try:
-                stop_idx = codes.index(self.stop_mel_token)
-                valid_len = max(stop_idx - 1, 0)  # 保留至停止标记前一位
-            except ValueError:
-                valid_len = len(codes)
-        else:
-            valid_len = len(codes)
-        
-        valid_codes = codes[:min(valid_len, len(codes))]
-        valid_latent = latent[0, :seq_len]  # 保持维度兼容性
-        
-        keep_indices = []
-        silence_counter = 0
-        
-        for idx, token in enumerate(valid_codes):
-            if token == silent_token:
-                silence_counter += 1
-            else:
-                silence_counter = 0
-            
-            if silence_counter <= max_consecutive:
-                keep_indices.append(idx)
-        
-        filtered_latent = valid_latent[keep_indices].unsqueeze(0)  # [1, new_seq, dim]
-        # print("filtered_latent", filtered_latent.shape)
-        return filtered_latent
-
-    async def infer(self, audio_prompt: List[str]=[], text:str="", output_path=None, verbose=False, seed=None):
-        print(">> start inference...")
+            valid_len = max(codes.index(self.stop_mel_token) - 1, 0)  # 保留至停止标记前一位
+        keep = long_silence_keep_mask(codes[:valid_len], silent_token, max_consecutive)
+        return latent[:, :valid_len][:, keep.to(latent.device)]  # [1, new_seq, dim]
+
+    async def run_on_gpu(self, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """在专用 GPU 线程上执行同步的模型计算，不阻塞 event loop"""
+        return await asyncio.wrap_future(self.gpu_executor.submit(functools.partial(fn, *args, **kwargs), priority=priority))
+
+    async def run_on_cpu(self, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """在 CPU 线程池上执行文本处理、音频后处理、编码等纯 CPU 工作"""
+        return await asyncio.wrap_future(self.cpu_executor.submit(functools.partial(fn, *args, **kwargs), priority=priority))
+
+    async def infer(self, audio_prompt: List[str]=[], text:str="", output_path=None, verbose=False, seed=None, timings=None,
+                    priority=PRIORITY_NORMAL, sampling=None):
+        """
+        Args:
+            audio_prompt: reference audios, each a file path or the raw bytes of an audio file.
+            verbose (bool): print the progress, per-sentence wav stats and timing summary of the request;
+                batch synthesis turns it off so bulk runs only log per-job records.
+            sampling (dict | None): per-request overrides of temperature / top_p / top_k / repetition_penalty
+                (indextts.utils.sampling.parse_sampling).
+            timings (RequestTimings | None): timing context of the request; a new one is created and finished here if None.
+            priority (int): request priority (indextts.utils.priority), applied to the micro-batchers
+                and the gpu / cpu thread pools.
+        """
+        if verbose:
+            print(">> start inference...")
+        own_timings = timings is None
+        if own_timings:
+            timings = RequestTimings(priority=priority)
         start_time = time.perf_counter()
         if not audio_prompt:
             audio_prompt = [
                 ROOT / "assets/wangrui/0.16kclean.wav",
                 ROOT / "assets/wangrui/0.16kclean.wav"
             ]
-        auto_conditioning = []
-        for ap_ in audio_prompt:
-            audio, sr = torchaudio.load(ap_)
-            audio = torch.mean(audio, dim=0, keepdim=True)
-            if audio.shape[0] > 1:
-                audio = audio[0].unsqueeze(0)
-            audio = torchaudio.transforms.Resample(sr, 24000)(audio)
-            cond_mel = MelSpectrogramFeatures()(audio).to(self.device)
-            # cond_mel_frame = cond_mel.shape[-1]
-            auto_conditioning.append(cond_mel)
+        with timings.stage("conditioning"):
+            reference_key, speaker_entry = await self.get_reference_speaker(audio_prompt, priority=priority)
+        speech_conditioning_latent = speaker_entry["speech_conditioning_latent"]
+        speaker_embedding = speaker_entry["speaker_embedding"]
 
-        text_tokens_list = self.tokenizer.tokenize(text)
-        sentences = self.tokenizer.split_sentences(text_tokens_list)
+        sentences = await self.run_on_cpu(self.split_sentences, text, timings, priority=priority)
         sampling_rate = 24000
         # lang = "EN"
         # lang = "ZH"
         wavs = []
-        gpt_gen_time = 0
-        bigvgan_time = 0
-
-        speech_conditioning_latent = []
-        for cond_mel in auto_conditioning:
-            speech_conditioning_latent_ = self.gpt.get_conditioning(
-                cond_mel,  # .half()
-                torch.tensor([cond_mel.shape[-1]], device=self.device)
-            )
-            speech_conditioning_latent.append(speech_conditioning_latent_)
-        speech_conditioning_latent = torch.stack(speech_conditioning_latent).sum(dim=0)
-        speech_conditioning_latent = speech_conditioning_latent / len(auto_conditioning)
-
-        for sent in sentences:
-            text_tokens = self.tokenizer.convert_tokens_to_ids(sent)
-            text_tokens = torch.tensor(text_tokens, dtype=torch.int32, device=self.device).unsqueeze(0)
 
-            m_start_time = time.perf_counter()
-            with torch.no_grad():
-                # 设置采样参数的seed
-                if seed is not None:
-                    self.gpt.sampling_params.seed = int(seed)
-                else:
-                    self.gpt.sampling_params.seed = None
-                codes, latent = await self.gpt.inference_speech(
-                    speech_conditioning_latent,
-                    text_tokens,
-                    # cond_mel_lengths=torch.tensor([auto_conditioning.shape[-1]], device=text_tokens.device)
-                )
-                gpt_gen_time += time.perf_counter() - m_start_time
-
-                # # remove ultra-long silence if exits
-                # # temporarily fix the long silence bug.
-                # latent = self.remove_long_silence(codes, latent)
-
-                codes = torch.tensor(codes, dtype=torch.long, device=self.device).unsqueeze(0)
-                code_lens = torch.tensor([codes.shape[-1]], device=codes.device, dtype=codes.dtype)
-                latent = self.gpt(speech_conditioning_latent, text_tokens,
-                                torch.tensor([text_tokens.shape[-1]], device=text_tokens.device), codes,
-                                code_lens*self.gpt.mel_length_compression,
-                                cond_mel_lengths=torch.tensor([speech_conditioning_latent.shape[-1]], device=text_tokens.device),
-                                return_latent=True, clip_inputs=False)
-
-                m_start_time = time.perf_counter()
-                wav, _ = self.bigvgan(latent, [ap_.transpose(1, 2) for ap_ in auto_conditioning])
-                bigvgan_time += time.perf_counter() - m_start_time
-                wav = wav.squeeze(1)
-
-                wav = torch.clamp(32767 * wav, -32767.0, 32767.0)
-                print(f"wav shape: {wav.shape}", "min:", wav.min(), "max:", wav.max())
-                # wavs.append(wav[:, :-512])
-                wavs.append(wav.cpu())  # to cpu before saving
+        # seed 与 sampling 只作用于本次请求的采样参数
+        async for wav_data in self._infer_sentences(speech_conditioning_latent, speaker_embedding, sentences, timings, seed=seed,
+                                                  speaker_id=f"ref-{reference_key}", digest=speaker_entry["digest"],
+                                                  priority=priority, sampling=sampling):
+            if verbose:
+                print(f"wav shape: {wav_data.shape}", "min:", wav_data.min(), "max:", wav_data.max())
+            wavs.append(wav_data)
         torch.cuda.empty_cache()
         end_time = time.perf_counter()
 
-        wav = torch.cat(wavs, dim=1)
-        wav_length = wav.shape[-1] / sampling_rate
-        print(f">> gpt_gen_time: {gpt_gen_time:.2f} seconds")
-        print(f">> bigvgan_time: {bigvgan_time:.2f} seconds")
-        print(f">> Total inference time: {end_time - start_time:.2f} seconds")
-        print(f">> Generated audio length: {wav_length:.2f} seconds")
-        print(f">> RTF: {(end_time - start_time) / wav_length:.4f}")
+        wav_data = await self.run_on_cpu(np.concatenate, wavs, axis=0, priority=priority)
+        wav_length = wav_data.shape[0] / sampling_rate
+        if verbose:
+            print(f">> gpt_gen_time: {timings.stages['vllm_queue'] + timings.stages['prefill'] + timings.stages['decode']:.2f} seconds")
+            print(f">> bigvgan_time: {timings.stages['vocoder']:.2f} seconds")
+            print(f">> Total inference time: {end_time - start_time:.2f} seconds")
+            print(f">> Generated audio length: {wav_length:.2f} seconds")
+            print(f">> RTF: {(end_time - start_time) / wav_length:.4f}")
 
         # save audio
-        wav = wav.cpu()  # to cpu
         if output_path:
             # 直接保存音频到指定路径中
-            if os.path.isfile(output_path):
-                os.remove(output_path)
-                print(">> remove old wav file:", output_path)
-            if os.path.dirname(output_path) != "":
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            torchaudio.save(output_path, wav.type(torch.int16), sampling_rate)
-            print(">> wav file saved to:", output_path)
-            return output_path
+            with timings.stage("encode"):
+                await self.run_on_cpu(self._save_wav, wav_data, output_path, sampling_rate, priority=priority)
+            result = output_path
         else:
             # 返回以符合Gradio的格式要求
-            wav_data = wav.type(torch.int16)
-            wav_data = wav_data.numpy().T
-            wav_data = trim_and_pad_silence(wav_data)
-            return (sampling_rate, wav_data)
-        
-    async def infer_with_ref_audio_embed(self, speaker: str, text):
-        start_time = time.perf_counter()
+            wav_data = await self.run_on_cpu(trim_and_pad_silence, wav_data, priority=priority)
+            result = (sampling_rate, wav_data)
+        if own_timings:
+            timings.finish()
+        return result
+
+    async def get_reference_speaker(self, audio_prompt, priority=PRIORITY_NORMAL):
+        """
+        按参考音频内容哈希查 conditioning_cache，未命中时计算 speaker 条目并放入缓存。
+        Returns:
+            (reference_key, speaker_entry)
+        """
+        references = await self.run_on_cpu(self.read_references, audio_prompt, priority=priority)
+        reference_key = ConditioningCache.make_key(references)
+        speaker_entry = self.conditioning_cache.get(reference_key)
+        if speaker_entry is None:
+            cond_mels = await self.run_on_cpu(self.load_cond_mels, references, priority=priority)
+            speaker_entry = await self.run_on_gpu(self.compute_speaker, cond_mels, priority=priority)
+            self.conditioning_cache.put(reference_key, speaker_entry)
+        return reference_key, speaker_entry
+
+    @staticmethod
+    def _save_wav(wav_data, output_path, sampling_rate):
+        if os.path.isfile(output_path):
+            os.remove(output_path)
+            print(">> remove old wav file:", output_path)
+        if os.path.dirname(output_path) != "":
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        torchaudio.save(output_path, torch.from_numpy(wav_data.T), sampling_rate)
+        print(">> wav file saved to:", output_path)
+
+    async def infer_with_ref_audio_embed(self, speaker: str, text, seed=None, reuse_cache=False, timings=None,
+                                         priority=PRIORITY_NORMAL, sampling=None):
+        """
+        Args:
+            seed (int | None): sampling seed. With a fixed seed, repeated sentences are served from the sentence cache
+                and identical sentences of concurrent requests are generated once.
+            reuse_cache (bool): also use the sentence cache and request coalescing without a fixed seed, i.e. accept
+                a previous or concurrent (non-deterministic) synthesis of the same sentence.
+            timings (RequestTimings | None): timing context of the request; a new one is created and finished here if None.
+            priority (int): request priority, see infer.
+            sampling (dict | None): sampling overrides, see infer.
+        """
+        own_timings = timings is None
+        if own_timings:
+            timings = RequestTimings(priority=priority)
+        sampling_rate = 24000
+        wavs = []
+        async for wav_chunk in self.infer_stream(speaker, text, pad_tail=False, seed=seed, reuse_cache=reuse_cache,
+                                                 timings=timings, priority=priority, sampling=sampling):
+            wavs.append(wav_chunk)
+
+        wav_data = await self.run_on_cpu(lambda: trim_and_pad_silence(np.concatenate(wavs, axis=0)), priority=priority)
+        if own_timings:
+            timings.finish()
+            print(f">> {timings.summary()}")
+        return (sampling_rate, wav_data)
+
+    async def infer_stream(self, speaker: str, text, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                           priority=PRIORITY_NORMAL, sampling=None):
+        """
+        流式推理：每个句子经 bigvgan 合成后立即 yield，而不是等待全部句子完成。
+        seed / reuse_cache / timings / priority / sampling 的含义见 infer_with_ref_audio_embed。
+
+        Yields:
+            np.ndarray: int16 音频块，形状为 (n, 1)，采样率 24000。
+                pad_tail 为 True 时，最后会额外 yield 一段补齐后端静音的零值块（与 trim_and_pad_silence 一致）。
+        """
+        text = self._replace_interjections(text)
+
+        own_timings = timings is None
+        if own_timings:
+            timings = RequestTimings(priority=priority)
+        with timings.stage("conditioning"):
+            speaker_entry = await self.get_speaker(speaker)
+        speech_conditioning_latent = speaker_entry["speech_conditioning_latent"]
+        speaker_embedding = speaker_entry["speaker_embedding"]
+
+        sentences = await self.run_on_cpu(self.split_sentences, text, timings, priority=priority)
+
+        wav_data = None
+        sentence_wavs = self._infer_sentences(speech_conditioning_latent, speaker_embedding, sentences, timings,
+                                              seed=seed, speaker_id=speaker_entry["cache_id"], digest=speaker_entry["digest"],
+                                              use_cache=seed is not None or reuse_cache, priority=priority,
+                                              sampling=sampling)
+        try:
+            async for wav_data in sentence_wavs:
+                yield wav_data
+        finally:
+            # 调用方提前关闭本生成器时，立即取消剩余句子，而不是等待垃圾回收
+            await sentence_wavs.aclose()
+            if own_timings:
+                timings.finish()
+
+        if pad_tail and wav_data is not None:
+            pad_length = tail_silence_pad_length(wav_data)
+            if pad_length > 0:
+                yield np.zeros((pad_length, 1), dtype=np.int16)
+
+    @staticmethod
+    def _replace_interjections(text):
         text = text.replace("嗯", "EN4")
         text = text.replace("嘿", "HEI1")
         text = text.replace("嗨", "HAI4")
         text = text.replace("哈哈", "HA1HA1")
-        sampling_rate = 24000
+        return text
 
-        auto_conditioning = self.speaker_dict[speaker]["auto_conditioning"]
+    async def split_text(self, text, priority=PRIORITY_NORMAL):
+        """按 infer_stream 的规则切分句子，返回的各句子（token 列表）可逐个交给 infer_sentence"""
+        return await self.run_on_cpu(self.split_sentences, self._replace_interjections(text), priority=priority)
 
-        text_tokens_list = self.tokenizer.tokenize(text)
-        sentences = self.tokenizer.split_sentences(text_tokens_list)
-        wavs = []
-        gpt_gen_time = 0
-        bigvgan_time = 0
-
-        speech_conditioning_latent = self.speaker_dict[speaker]["speech_conditioning_latent"]
-
-        for sent in sentences:
-            text_tokens = self.tokenizer.convert_tokens_to_ids(sent)
-            text_tokens = torch.tensor(text_tokens, dtype=torch.int32, device=self.device).unsqueeze(0)
-
-            m_start_time = time.perf_counter()
-            with torch.no_grad():
-                codes, latent = await self.gpt.inference_speech(
-                    speech_conditioning_latent,
-                    text_tokens,
-                    # cond_mel_lengths=torch.tensor([auto_conditioning.shape[-1]], device=text_tokens.device)
-                )
-                gpt_gen_time += time.perf_counter() - m_start_time
-
-                # # remove ultra-long silence if exits
-                # # temporarily fix the long silence bug.
-                # latent = self.remove_long_silence(codes, latent)
-
-                codes = torch.tensor(codes, dtype=torch.long, device=self.device).unsqueeze(0)
-                code_lens = torch.tensor([codes.shape[-1]], device=codes.device, dtype=codes.dtype)
-                latent = self.gpt(speech_conditioning_latent, text_tokens,
-                                torch.tensor([text_tokens.shape[-1]], device=text_tokens.device), codes,
-                                code_lens*self.gpt.mel_length_compression,
-                                cond_mel_lengths=torch.tensor([speech_conditioning_latent.shape[-1]], device=text_tokens.device),
-                                return_latent=True, clip_inputs=False)
-
-                m_start_time = time.perf_counter()
-                wav, _ = self.bigvgan(latent, [ap_.transpose(1, 2) for ap_ in auto_conditioning])
-                bigvgan_time += time.perf_counter() - m_start_time
-                wav = wav.squeeze(1)
-
-                wav = torch.clamp(32767 * wav, -32767.0, 32767.0)
-                # wavs.append(wav[:, :-512])
-                wavs.append(wav)  # to cpu before saving
+    async def infer_sentence(self, speaker: str, sentence, seed=None, timings=None, priority=PRIORITY_BACKGROUND,
+                             sampling=None):
+        """
+        合成 split_text 切出的单个句子，供长文本任务逐句合成、逐句持久化。
+        固定 seed 时同样使用句子级缓存。
+
+        Returns:
+            (sampling_rate, np.ndarray): int16 音频 (n, 1)。
+        """
+        own_timings = timings is None
+        if own_timings:
+            timings = RequestTimings(priority=priority)
+        with timings.stage("conditioning"):
+            speaker_entry = await self.get_speaker(speaker)
+        wavs = [
+            wav async for wav in self._infer_sentences(
+                speaker_entry["speech_conditioning_latent"], speaker_entry["speaker_embedding"], [sentence], timings,
+                seed=seed, speaker_id=speaker_entry["cache_id"], digest=speaker_entry["digest"],
+                use_cache=seed is not None, priority=priority, sampling=sampling)
+        ]
+        if own_timings:
+            timings.finish()
+        return 24000, wavs[0]
+
+    async def warmup(self, speaker=None, texts=None, rounds=2):
+        """启动预热，见 indextts.utils.warmup.run_warmup"""
+        report = await run_warmup(self, speaker, texts, rounds)
         torch.cuda.empty_cache()
-        end_time = time.perf_counter()
+        return report
 
-        wav = torch.cat(wavs, dim=1)
-        # wav_length = wav.shape[-1] / sampling_rate
-        # # print(f">> Total inference time: {end_time - start_time:.2f} seconds")
-        # print(f">> gpt_gen_time: {gpt_gen_time:.2f} seconds")
-        # print(f">> bigvgan_time: {bigvgan_time:.2f} seconds")
-        # print(f">> Total inference time: {end_time - start_time:.2f} seconds")
-        # print(f">> Generated audio length: {wav_length:.2f} seconds")
-        # print(f">> RTF: {(end_time - start_time) / wav_length:.4f}")
+    async def infer_text_stream(self, speaker: str, fragments, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                                priority=PRIORITY_NORMAL, sampling=None):
+        """
+        增量文本输入的流式推理：fragments 是逐段到达的文本（async iterator，如上游 LLM 的输出），
+        由 IncrementalSentenceSplitter 在句末标点或 token 上限处切出句子，每个句子立即提交生成，
+        音频按句子顺序 yield；fragments 结束时切出剩余文本。其余参数与输出同 infer_stream。
+        """
+        own_timings = timings is None
+        if own_timings:
+            timings = RequestTimings(priority=priority)
+        with timings.stage("conditioning"):
+            speaker_entry = await self.get_speaker(speaker)
+        splitter = IncrementalSentenceSplitter(self.tokenizer.tokenize, self.tokenizer.punctuation_marks_tokens,
+                                               text_filter=self._replace_interjections)
+
+        async def sentences():
+            async for fragment in fragments:
+                for sentence in await self.run_on_cpu(splitter.feed, fragment, priority=priority):
+                    yield sentence
+            for sentence in await self.run_on_cpu(splitter.flush, priority=priority):
+                yield sentence
+
+        wav_data = None
+        sentence_wavs = self._infer_sentences(speaker_entry["speech_conditioning_latent"], speaker_entry["speaker_embedding"],
+                                              sentences(), timings, seed=seed, speaker_id=speaker_entry["cache_id"],
+                                              digest=speaker_entry["digest"], use_cache=seed is not None or reuse_cache,
+                                              priority=priority, sampling=sampling)
+        try:
+            async for wav_data in sentence_wavs:
+                yield wav_data
+        finally:
+            await sentence_wavs.aclose()
+            if own_timings:
+                timings.finish()
+
+        if pad_tail and wav_data is not None:
+            pad_length = tail_silence_pad_length(wav_data)
+            if pad_length > 0:
+                yield np.zeros((pad_length, 1), dtype=np.int16)
+
+    def get_abort_stats(self):
+        """因客户端断开 / 超过截止时间而被中止的工作量"""
+        return {
+            "cancelled_sentences": self.cancelled_sentences,
+            "llm_aborted_requests": self.gpt.aborted_requests,
+            "vocoder_skipped": self.vocoder_batcher.stats["cancelled"] if self.vocoder_batcher is not None else 0,
+            "latent_skipped": self.latent_batcher.stats["cancelled"] if self.latent_batcher is not None else 0,
+        }
+
+    def get_early_stop_stats(self):
+        """因连续静音 / 重复循环被提前结束的生成数，以及按 max_tokens 估算省下的 decode 步数"""
+        return dict(self.gpt.early_stop_stats)
+
+    def get_prefix_cache_stats(self):
+        """vllm prefix caching 的命中情况：prompt token 中命中缓存、无需 prefill 的比例"""
+        if not self.gpt.enable_prefix_caching:
+            return None
+        stats = dict(self.gpt.prefix_cache_stats)
+        stats["hit_rate"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        return stats
+
+    def get_stats(self):
+        """微批调度器、缓存与中止计数的统计，供 /metrics 等使用"""
+        return {
+            "vocoder_batcher": self.vocoder_batcher.get_stats() if self.vocoder_batcher is not None else None,
+            "latent_batcher": self.latent_batcher.get_stats() if self.latent_batcher is not None else None,
+            "sentence_cache": self.sentence_cache.get_stats() if self.sentence_cache is not None else None,
+            "conditioning_cache": self.conditioning_cache.get_stats(),
+            "prefix_cache": self.get_prefix_cache_stats(),
+            "single_flight": {**self.single_flight.get_stats(), "coalesced_requests": self.coalesced_requests}
+            if self.single_flight is not None else None,
+            "early_stop": self.get_early_stop_stats(),
+            "aborts": self.get_abort_stats(),
+        }
+
+    def split_sentences(self, text, timings=None):
+        """文本归一化、分词并切分句子（CPU）"""
+        start_time = time.perf_counter()
+        text = self.tokenizer.preprocess(text)
+        normalized_time = time.perf_counter()
+        text_tokens_list = self.tokenizer.tokenize(text, preprocessed=True)
+        sentences = self.tokenizer.split_sentences(text_tokens_list)
+        if timings is not None:
+            timings.observe("text_normalize", normalized_time - start_time)
+            timings.observe("tokenize", time.perf_counter() - normalized_time)
+        return sentences
+
+    async def _infer_sentences(self, speech_conditioning_latent, speaker_embedding, sentences, timings=None,
+                               seed=None, speaker_id=None, digest=None, use_cache=False, priority=PRIORITY_NORMAL,
+                               sampling=None):
+        """
+        所有句子的 gpt 生成同时提交给 vllm（受 max_sentence_concurrency 限制），以利用 continuous batching；
+        按原顺序依次 await 结果，再经 bigvgan 合成后 yield int16 音频 (n, 1)。
+        sentences 也可以是逐个产生句子的 async iterator（增量文本输入），每个句子到达时即提交生成。
+        hf_latent 模式下，各句子生成完成后即在自己的任务里计算 latent，以便与其他句子合并前向。
+        speaker_id 为 speaker 的标识（随注册的参考音频变化），与句子 token、seed、采样参数一起构成句子的 key：
+        use_cache 为 True（固定了 seed，或调用方允许复用非确定性结果）时按 key 查询 / 写入句子级缓存，命中的句子不再提交生成；
+        同样只在 use_cache 为 True 时合并请求（single-flight）：key 相同的句子若已有请求在生成，则加入它而不是重新生成，
+        共享的生成按发起它的请求（leader）的优先级调度，占用 leader 的句子并发名额（semaphore），各阶段耗时也记在 leader 的 timings 中：
+        高优先级的请求加入低优先级请求的生成时，要等它在 leader 的微批队列与并发名额中轮到，不会被提升优先级。
+        timings 为请求的 RequestTimings，记录 vllm 排队 / prefill / decode、latent、vocoder 各阶段耗时。
+        priority 决定各句子在微批队列与线程池中的调度顺序；vllm 按到达顺序调度（见 model_vllm.build_engine_args）。
+        sampling 覆盖默认的采样参数；每个句子的 max_tokens 按其文本长度预估（见 estimate_max_mel_tokens）。
+        digest 为 speaker 条目中预先算好的 speaker_digest（prefix caching 的 prompt token id 用），避免每个句子都在 event loop 上计算。
+        """
+        if timings is None:
+            timings = RequestTimings()
+        semaphore = asyncio.Semaphore(self.max_sentence_concurrency)
+
+        async def generate_codes(text_tokens, max_tokens):
+            async with semaphore:
+                codes, latent = await self.gpt.inference_speech(speech_conditioning_latent, text_tokens, seed=seed,
+                                                                timings=timings, priority=priority, sampling=sampling,
+                                                                max_tokens=max_tokens, digest=digest)
+            if latent is None:
+                # hf_latent 模式：在各句子的任务里计算 latent，同时完成生成的句子（含其他请求的）可合并为一次前向
+                with timings.stage("latent"):
+                    if self.latent_batcher is not None:
+                        latent = await self.latent_batcher.get_latent(speech_conditioning_latent, text_tokens, codes,
+                                                                      priority=priority)
+                    else:
+                        latent = await self.run_on_gpu(self.get_latent, speech_conditioning_latent, text_tokens, codes,
+                                                       priority=priority)
+            if self.gpt.early_stop and list(codes).count(SILENT_MEL_TOKEN) > 15:
+                # 句中过长的停顿在 bigvgan 之前去掉；没有长静音的句子不需要这一步
+                latent = await self.run_on_gpu(self.remove_long_silence, codes, latent, priority=priority)
+            return codes, latent
+
+        # 未固定 seed 的请求各自采样，不合并；与句子级缓存是否开启无关
+        coalesce = use_cache and self.single_flight is not None
+        use_cache = use_cache and self.sentence_cache is not None
+
+        def store(cache_key, wav_data):
+            self.sentence_cache.put(cache_key, wav_data)
+            if self.sentence_cache.disk_dir is not None:
+                self.cpu_executor.submit(self.sentence_cache.write_disk, cache_key, wav_data, priority=PRIORITY_BACKGROUND)
+
+        async def synthesize(text_tokens, max_tokens, cache_key):
+            """一个句子从生成到 int16 音频的完整计算，供 key 相同的并发请求共享"""
+            codes, latent = await generate_codes(text_tokens, max_tokens)
+            wav_data = await self._vocode(latent, speaker_embedding, timings, priority)
+            if use_cache:
+                store(cache_key, wav_data)
+            return wav_data
+
+        tasks = []
+        flights = []
+        own_holds = {}  # 本请求对各 flight 的 join 次数，同一请求内重复的句子不算作与其他请求合并
+        request_coalesced = False
+
+        async def lookup_cache(key):
+            cached_wav = self.sentence_cache.get_memory(key)
+            if cached_wav is not None:
+                return cached_wav
+            if self.sentence_cache.disk_dir is not None:
+                # 磁盘层的 IO 在 CPU 线程池中执行，慢盘不阻塞 event loop 上的其他流
+                cached_wav = await self.run_on_cpu(self.sentence_cache.read_disk, key, priority=priority)
+            return self.sentence_cache.finish_lookup(key, cached_wav)
+
+        async def start_sentence(sentence):
+            """
+            查询句子级缓存，未命中时立即提交生成，或加入 key 相同、正在进行的生成；
+            返回 (task, flight, cache_key, cached_wav)
+            """
+            nonlocal request_coalesced
+            token_ids = self.tokenizer.convert_tokens_to_ids(sentence)
+            max_tokens = estimate_max_mel_tokens(sentence, self.max_tokens_factor)
+            key = None
+            if speaker_id is not None and (use_cache or coalesce):
+                key = self._sentence_cache_key(speaker_id, token_ids, seed, sampling, max_tokens)
+            if use_cache:
+                cached_wav = await lookup_cache(key)
+                if cached_wav is not None:
+                    return None, None, None, cached_wav
+            text_tokens = torch.tensor(token_ids, dtype=torch.int32, device=self.device).unsqueeze(0)
+            if key is not None and coalesce:
+                flight = self.single_flight.join(key, lambda: synthesize(text_tokens, max_tokens, key))
+                flights.append(flight)
+                own_holds[flight] = own_holds.get(flight, 0) + 1
+                if flight.holders > own_holds[flight] and not request_coalesced:
+                    request_coalesced = True
+                    self.coalesced_requests += 1
+                return None, flight, None, None
+            task = asyncio.ensure_future(generate_codes(text_tokens, max_tokens))
+            tasks.append(task)
+            return task, None, key if use_cache else None, None
+
+        feeder = None
+        if isinstance(sentences, list):
+            async def listed_entries():
+                # 所有句子同时查询缓存并提交生成，按原顺序返回
+                started = await asyncio.gather(*[start_sentence(sentence) for sentence in sentences])
+                for entry in started:
+                    yield entry
+
+            entries = listed_entries()
+        else:
+            # 句子逐个到达（增量文本输入）：每到一个句子就提交生成，不等待后续文本
+            queue = asyncio.Queue()
+
+            async def feed():
+                try:
+                    async for sentence in sentences:
+                        queue.put_nowait(await start_sentence(sentence))
+                    queue.put_nowait(None)
+                except Exception as ex:
+                    queue.put_nowait(ex)
+
+            async def queued_entries():
+                while True:
+                    entry = await queue.get()
+                    if entry is None:
+                        return
+                    if isinstance(entry, Exception):
+                        raise entry
+                    yield entry
+
+            feeder = asyncio.ensure_future(feed())
+            entries = queued_entries()
+
+        try:
+            async for task, flight, cache_key, cached_wav in entries:
+                if cached_wav is not None:
+                    timings.add_audio(cached_wav.shape[0])
+                    yield cached_wav
+                    continue
+                if flight is not None:
+                    # shield：本请求被取消时不取消共享的生成，由 leave 决定是否还有其他请求在等待
+                    wav_data = await asyncio.shield(flight.task)
+                else:
+                    codes, latent = await task
+                    wav_data = await self._vocode(latent, speaker_embedding, timings, priority)
+                    if cache_key is not None:
+                        store(cache_key, wav_data)
+                timings.add_audio(wav_data.shape[0])
+                yield wav_data
+        finally:
+            # 提前退出（客户端断开、超过截止时间、异常等）时取消剩余句子的生成，
+            # 已排队但未执行的 latent / bigvgan 微批 item 随之被跳过
+            if feeder is not None and not feeder.done():
+                feeder.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self.cancelled_sentences += 1
+            for flight in flights:
+                # 只有没有其他请求在等待时才取消共享的生成
+                if self.single_flight.leave(flight):
+                    self.cancelled_sentences += 1
+
+    def _sentence_cache_key(self, speaker_id, token_ids, seed, sampling=None, max_tokens=None):
+        """句子级缓存与 single-flight 共用的 key，包含本次生成实际使用的采样参数"""
+        sampling_params = {**DEFAULT_SAMPLING, **(sampling or {})}
+        if max_tokens is not None:
+            sampling_params["max_tokens"] = min(max_tokens, DEFAULT_SAMPLING["max_tokens"])
+        return make_sentence_key(speaker_id, token_ids, seed, sampling_params, self.model_fingerprint)
 
-        # save audio
-        wav = wav.cpu()  # to cpu
-        wav_data = wav.type(torch.int16)
-        wav_data = wav_data.numpy().T
-        wav_data = trim_and_pad_silence(wav_data)
-        return (sampling_rate, wav_data)
-    
     @torch.no_grad()
-    def registry_speaker(self, speaker: str, audio_paths: List[str]):
-        auto_conditioning = []
+    def get_latent(self, speech_conditioning_latent, text_tokens, codes):
+        """teacher-forced 前向：由 gpt 生成的 codes 计算 final_norm latent (1, len(codes), dim)"""
+        return self.gpt.forward_latents([(speech_conditioning_latent, text_tokens, codes)])[0]
+
+    @torch.no_grad()
+    def get_speaker_embedding(self, auto_conditioning):
+        """bigvgan 的 speaker embedding (1, 1, speaker_embedding_dim)，多个参考音频取平均"""
+        return self.bigvgan.compute_speaker_embedding([ap_.transpose(1, 2) for ap_ in auto_conditioning])
+
+    @torch.no_grad()
+    def _bigvgan_forward(self, latent, speaker_embedding):
+        wav, _ = self.bigvgan(latent, None, speaker_embedding=speaker_embedding)
+        return wav.squeeze(1).cpu()
+
+    @staticmethod
+    def _wav_to_int16(wav):
+        wav = torch.clamp(32767 * wav, -32767.0, 32767.0)
+        return wav.type(torch.int16).numpy().T
+
+    async def _vocode(self, latent, speaker_embedding, timings=None, priority=PRIORITY_NORMAL):
+        """
+        经 bigvgan 合成，返回 int16 音频 (n, 1)。
+        开启 vocoder 微批时，与其他请求的句子合并为一个 batch 合成。
+        """
+        m_start_time = time.perf_counter()
+        if self.vocoder_batcher is not None:
+            wav = await self.vocoder_batcher.vocode(latent, speaker_embedding, priority)
+        else:
+            wav = await self.run_on_gpu(self._bigvgan_forward, latent, speaker_embedding, priority=priority)
+        if timings is not None:
+            timings.observe("vocoder", time.perf_counter() - m_start_time)
+
+        m_start_time = time.perf_counter()
+        wav = await self.run_on_cpu(self._wav_to_int16, wav, priority=priority)
+        if timings is not None:
+            timings.observe("encode", time.perf_counter() - m_start_time)
+        return wav
+
+    @staticmethod
+    def read_references(audio_prompt):
+        """读取参考音频文件内容，已经是 bytes 的直接返回（CPU）"""
+        references = []
+        for ap_ in audio_prompt:
+            if isinstance(ap_, (bytes, bytearray)):
+                references.append(bytes(ap_))
+            else:
+                with open(ap_, "rb") as f:
+                    references.append(f.read())
+        return references
+
+    def get_resampler(self, sr):
+        resampler = self.resamplers.get(sr)
+        if resampler is None:
+            resampler = self.resamplers[sr] = torchaudio.transforms.Resample(sr, 24000)
+        return resampler
+
+    @torch.no_grad()
+    def load_cond_mels(self, audio_paths: List[str]):
+        """加载参考音频（文件路径或 bytes）并提取 mel（CPU）"""
+        cond_mels = []
         for ap_ in audio_paths:
-            audio, sr = torchaudio.load(ap_)
+            audio, sr = torchaudio.load(io.BytesIO(ap_) if isinstance(ap_, bytes) else ap_)
             audio = torch.mean(audio, dim=0, keepdim=True)
             if audio.shape[0] > 1:
                 audio = audio[0].unsqueeze(0)
-            audio = torchaudio.transforms.Resample(sr, 24000)(audio)
-            cond_mel = MelSpectrogramFeatures()(audio).to(self.device)
+            audio = self.get_resampler(sr)(audio)
+            cond_mel = self.mel_frontend(audio)
             # cond_mel_frame = cond_mel.shape[-1]
-            auto_conditioning.append(cond_mel)
+            cond_mels.append(cond_mel)
+        return cond_mels
+
+    def compute_speaker(self, cond_mels):
+        """由参考音频的 mel 计算 speaker 条目：auto_conditioning、speech_conditioning_latent 与 bigvgan speaker embedding"""
+        auto_conditioning, speech_conditioning_latent = self.get_conditioning(cond_mels)
+        return {
+            "auto_conditioning": auto_conditioning,
+            "speech_conditioning_latent": speech_conditioning_latent,
+            "speaker_embedding": self.get_speaker_embedding(auto_conditioning),
+            # prefix caching 的 prompt token id 由它决定，注册时算一次，不在每个句子的 event loop 上做 GPU -> CPU 拷贝
+            "digest": speaker_digest(speech_conditioning_latent),
+        }
+
+    @torch.no_grad()
+    def get_conditioning(self, cond_mels):
+        """由参考音频的 mel 计算 (auto_conditioning, speech_conditioning_latent)，多个参考音频取平均"""
+        auto_conditioning = [cond_mel.to(self.device) for cond_mel in cond_mels]
 
         speech_conditioning_latent = []
         for cond_mel in auto_conditioning:
@@ -371,9 +806,66 @@ class IndexTTS:
             speech_conditioning_latent.append(speech_conditioning_latent_)
         speech_conditioning_latent = torch.stack(speech_conditioning_latent).sum(dim=0)
         speech_conditioning_latent = speech_conditioning_latent / len(auto_conditioning)
+        return auto_conditioning, speech_conditioning_latent
 
-        self.speaker_dict[speaker] = {
-            "auto_conditioning": auto_conditioning,
-            "speech_conditioning_latent": speech_conditioning_latent
-        }
-        print(f"Speaker: {speaker} registered")
+    def add_speaker(self, speaker: str, audio_paths: List[str]):
+        """登记 speaker 的参考音频，第一次用到时再由 get_speaker 注册（优先从 speaker store 读取）"""
+        self.speaker_sources[speaker] = list(audio_paths)
+        self.speaker_dict.pop(speaker, None)
+        # 旧参考音频正在进行的注册不再写入 speaker_dict
+        self.speaker_futures.pop(speaker, None)
+
+    async def get_speaker(self, speaker: str):
+        """
+        返回 speaker 条目，第一次用到时在 GPU 线程池中注册。
+        并发的第一次使用共享同一个 future；speaker_dict 只在 event loop 上写入。
+        """
+        entry = self.speaker_dict.get(speaker)
+        if entry is not None:
+            return entry
+        if speaker not in self.speaker_sources:
+            raise KeyError(f"speaker not registered: {speaker}")
+        future = self.speaker_futures.get(speaker)
+        if future is None:
+            future = asyncio.ensure_future(self.run_on_gpu(self.build_speaker, speaker, self.speaker_sources[speaker]))
+            self.speaker_futures[speaker] = future
+
+            def finish(done):
+                if self.speaker_futures.get(speaker) is not done:
+                    return  # 注册期间 add_speaker 换了参考音频
+                del self.speaker_futures[speaker]
+                if not done.cancelled() and done.exception() is None:
+                    self.speaker_dict[speaker] = done.result()
+
+            future.add_done_callback(finish)
+        # 某个等待者被取消时不影响其他等待者与注册本身
+        return await asyncio.shield(future)
+
+    def registry_speaker(self, speaker: str, audio_paths: List[str]):
+        """同步注册 speaker（启动时预加载、tools/speaker_store.py build 使用）"""
+        entry = self.build_speaker(speaker, audio_paths)
+        self.speaker_futures.pop(speaker, None)
+        self.speaker_sources[speaker] = list(audio_paths)
+        self.speaker_dict[speaker] = entry
+        return entry
+
+    def build_speaker(self, speaker: str, audio_paths: List[str]):
+        """从 speaker store 读取或计算 speaker 条目，不修改 speaker_dict，可在 GPU 线程池中执行"""
+        entry = None
+        if self.speaker_store is not None:
+            store_key = self.speaker_store.entry_key(audio_paths)
+            entry = self.speaker_store.load(store_key, self.device)
+
+        if entry is None:
+            entry = self.compute_speaker(self.load_cond_mels(audio_paths))
+            if self.speaker_store is not None:
+                self.speaker_store.save(store_key, entry, speaker, audio_paths)
+            print(f"Speaker: {speaker} registered")
+        else:
+            if "digest" not in entry:
+                entry["digest"] = speaker_digest(entry["speech_conditioning_latent"])
+            print(f"Speaker: {speaker} loaded from speaker store")
+
+        # 句子缓存用的 speaker 标识带上与 prefix caching 相同的 speaker_digest，重新注册为不同音频后旧的缓存不会再命中
+        entry["cache_id"] = f"{speaker}-{entry['digest'].hex()}"
+        return entry
@@ -0,0 +1,162 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from indextts.utils.priority import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NAMES, PRIORITY_NORMAL
+from indextts.utils.text_utils import get_text_tts_dur
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int, status: dict):
+        super().__init__(f"server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.status = status
+
+
+class AdmissionTicket:
+    def __init__(self, cost: float, priority=PRIORITY_NORMAL):
+        self.cost = cost
+        self.priority = priority
+        self.start_time = time.perf_counter()
+        self.released = False
+
+
+class AdmissionController:
+    """
+    请求准入控制：按预估音频时长（秒）统计已接收但未完成的工作量。
+
+    新请求会使未完成工作量超过 max_outstanding_seconds（或并发请求数超过 max_requests）时，
+    最多等待 max_defer_seconds，仍放不下就拒绝，并按当前吞吐量（每秒合成的音频秒数）给出 Retry-After。
+    吞吐量由最近 throughput_window 秒内完成的请求统计，样本不足时使用 initial_throughput。
+    被接收的请求不会因为后续的突发流量而整体变慢。
+
+    优先级：各类请求的预算为 max_outstanding_seconds 乘以各自的比例（interactive 可超出 interactive_burst 倍，
+    background 只能使用 background_share），因此 background 任务总会给 interactive 留出余量；
+    有更高优先级的请求在等待时，background 请求不会被接收。
+    """
+
+    def __init__(self, max_outstanding_seconds=120.0, max_requests=0, max_defer_seconds=0.0,
+                 initial_throughput=20.0, throughput_window=30.0, background_share=0.5, interactive_burst=1.25):
+        """
+        Args:
+            max_outstanding_seconds (float): budget of estimated audio seconds admitted but not finished.
+            max_requests (int): max concurrent admitted requests, 0 means unlimited.
+            max_defer_seconds (float): how long a request may wait for capacity before being rejected, 0 rejects at once.
+            initial_throughput (float): audio seconds synthesized per second, used until enough requests have finished.
+            throughput_window (float): seconds of finished requests used to estimate the throughput.
+            background_share (float): fraction of the budget background requests may fill.
+            interactive_burst (float): multiple of the budget interactive requests may fill.
+        """
+        self.max_outstanding_seconds = max_outstanding_seconds
+        self.max_requests = max_requests
+        self.max_defer_seconds = max_defer_seconds
+        self.initial_throughput = initial_throughput
+        self.throughput_window = throughput_window
+        self.budget_scale = {PRIORITY_INTERACTIVE: interactive_burst, PRIORITY_NORMAL: 1.0, PRIORITY_BACKGROUND: background_share}
+
+        self.outstanding_seconds = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.in_flight_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.waiting_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.finished = deque()  # (finish_time, cost)
+        self._changed = asyncio.Condition()
+        self.stats = {"admitted": 0, "rejected": 0, "deferred": 0}
+
+    @staticmethod
+    def estimate_cost(text: str) -> float:
+        """预估合成音频的时长（秒），按较慢的语速取较大值"""
+        return max(get_text_tts_dur(text))
+
+    def throughput(self) -> float:
+        now = time.perf_counter()
+        while self.finished and self.finished[0][0] < now - self.throughput_window:
+            self.finished.popleft()
+        if len(self.finished) < 4:
+            return self.initial_throughput
+        elapsed = max(now - self.finished[0][0], 1.0)
+        return max(sum(cost for _, cost in self.finished) / elapsed, 0.1)
+
+    def estimated_wait(self, extra_seconds=0.0) -> float:
+        """当前未完成工作量（再加上 extra_seconds）按吞吐量全部完成所需的时间"""
+        return (self.outstanding_seconds + extra_seconds) / self.throughput()
+
+    def status(self) -> dict:
+        status = dict(self.stats)
+        status.update({
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "outstanding_audio_seconds": round(self.outstanding_seconds, 2),
+            "max_outstanding_seconds": self.max_outstanding_seconds,
+            "throughput": round(self.throughput(), 2),
+            "estimated_wait_seconds": round(self.estimated_wait(), 2),
+            "in_flight_by_priority": {PRIORITY_NAMES[p]: n for p, n in self.in_flight_by_priority.items()},
+            "waiting_by_priority": {PRIORITY_NAMES[p]: n for p, n in self.waiting_by_priority.items()},
+        })
+        return status
+
+    def _budget(self, priority):
+        return self.max_outstanding_seconds * self.budget_scale[priority]
+
+    def _fits(self, cost, priority=PRIORITY_NORMAL):
+        if self.max_requests > 0 and self.in_flight >= self.max_requests:
+            return False
+        if priority == PRIORITY_BACKGROUND and any(
+            self.waiting_by_priority[p] > 0 for p in (PRIORITY_INTERACTIVE, PRIORITY_NORMAL)
+        ):
+            return False
+        # 空闲时总是放行，超长的单个请求不会被永远拒绝
+        return self.in_flight == 0 or self.outstanding_seconds + cost <= self._budget(priority)
+
+    def _retry_after(self, cost, priority=PRIORITY_NORMAL):
+        over = self.outstanding_seconds + cost - self._budget(priority)
+        return max(1, math.ceil(max(over, 0.0) / self.throughput()))
+
+    async def acquire(self, cost: float, priority=PRIORITY_NORMAL) -> AdmissionTicket:
+        """接收请求并返回 ticket，请求结束时必须调用 release；放不下时抛出 AdmissionRejected"""
+        if not self._fits(cost, priority):
+            if self.max_defer_seconds <= 0 or self._retry_after(cost, priority) > self.max_defer_seconds:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(self._retry_after(cost, priority), self.status())
+            self.stats["deferred"] += 1
+            self.waiting += 1
+            self.waiting_by_priority[priority] += 1
+            try:
+                async with self._changed:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._fits(cost, priority)), self.max_defer_seconds
+                    )
+            except asyncio.TimeoutError:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(self._retry_after(cost, priority), self.status())
+            finally:
+                self.waiting -= 1
+                self.waiting_by_priority[priority] -= 1
+                # 等待的高优先级请求离开后，被它挡住的 background 请求可以重新检查
+                async with self._changed:
+                    self._changed.notify_all()
+
+        self.stats["admitted"] += 1
+        self.in_flight += 1
+        self.in_flight_by_priority[priority] += 1
+        self.outstanding_seconds += cost
+        return AdmissionTicket(cost, priority)
+
+    def extend(self, ticket: AdmissionTicket, extra_cost: float):
+        """文本逐段到达的请求（如 WebSocket 增量输入）在已接收后追加预估工作量，不会因此被拒绝"""
+        if ticket.released:
+            return
+        ticket.cost += extra_cost
+        self.outstanding_seconds += extra_cost
+
+    async def release(self, ticket: AdmissionTicket):
+        if ticket.released:
+            return
+        ticket.released = True
+        self.in_flight -= 1
+        self.in_flight_by_priority[ticket.priority] -= 1
+        self.outstanding_seconds = max(self.outstanding_seconds - ticket.cost, 0.0)
+        self.finished.append((time.perf_counter(), ticket.cost))
+        async with self._changed:
+            self._changed.notify_all()
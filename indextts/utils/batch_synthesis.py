@@ -0,0 +1,177 @@
+import asyncio
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+import soundfile as sf
+
+from indextts.utils.admission import AdmissionController
+
+
+@dataclass
+class BatchJob:
+    id: str
+    text: str
+    speaker: Optional[str]  # speaker.json 中的名字，或参考音频路径
+    output_path: str
+    seed: Optional[int] = None
+    estimated_seconds: float = 0.0
+
+
+def load_jobs(input_path, output_dir, default_speaker=None, default_seed=None) -> List[BatchJob]:
+    """
+    读取 JSONL（字段 text、speaker、output / output_path、seed、id）或 TSV（text[\\tspeaker[\\toutput[\\tseed]]]，
+    每行一个文本的纯文本文件也可直接使用）。缺省的 output 为 {output_dir}/{id}.wav，id 默认为行号。
+    """
+    jobs = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        if input_path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            fields = ["text", "speaker", "output", "seed"]
+            rows = [
+                {key: value for key, value in zip(fields, row) if value != ""}
+                for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE) if row and row[0].strip()
+            ]
+    for i, row in enumerate(rows):
+        job_id = str(row.get("id", f"{i:06d}"))
+        output_path = row.get("output") or row.get("output_path") or os.path.join(output_dir, f"{job_id}.wav")
+        seed = row.get("seed", default_seed)
+        jobs.append(BatchJob(
+            id=job_id,
+            text=row["text"].strip(),
+            speaker=row.get("speaker", default_speaker),
+            output_path=output_path,
+            seed=int(seed) if seed is not None else None,
+        ))
+    return jobs
+
+
+def bucket_jobs(jobs: List[BatchJob], bucket_seconds=2.0) -> List[BatchJob]:
+    """
+    按预估音频时长分桶并从长到短排序，桶内按 speaker 聚集。
+    按此顺序以有限并发提交时，同时在途的句子长度相近（vllm batch 与 bigvgan 微批的补齐更少），
+    最长的任务最先开始，避免末尾被一个长任务拖住；同一 speaker 连续出现，conditioning 缓存保持热。
+    """
+    for job in jobs:
+        job.estimated_seconds = AdmissionController.estimate_cost(job.text)
+    return sorted(jobs, key=lambda job: (-int(job.estimated_seconds // bucket_seconds), str(job.speaker), job.id))
+
+
+class Manifest:
+    """
+    JSONL 格式的完成记录，每个任务一行（id、output、status、耗时、音频时长等）。
+    重新运行时跳过 status 为 ok 且输出文件存在的任务。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 上次运行中断时写了一半的行
+                    if record.get("status") == "ok":
+                        self.done[record["id"]] = record
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def is_done(self, job: BatchJob) -> bool:
+        record = self.done.get(job.id)
+        return record is not None and record.get("output") == job.output_path and os.path.exists(job.output_path)
+
+    def append(self, record: dict):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if record.get("status") == "ok":
+            self.done[record["id"]] = record
+
+
+def write_wav(output_path, wav, sampling_rate):
+    """先写临时文件再替换，中断时不会留下被当作已完成的半个文件"""
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    sf.write(tmp_path, wav, sampling_rate, format="WAV")
+    os.replace(tmp_path, output_path)
+
+
+async def run_batch(tts, jobs: List[BatchJob], manifest: Manifest, concurrency=16, writers=4, bucket_seconds=2.0):
+    """
+    以有限并发把任务提交给 tts（IndexTTS，或接口相同的 ReplicaRouter / StubTTS），使引擎保持饱和；
+    音频写入在独立的线程池中进行，每个任务完成后追加一条 manifest 记录。
+
+    Returns:
+        dict: aggregate statistics (done, skipped, failed, audio seconds, wall time, throughput).
+    """
+    pending = [job for job in jobs if not manifest.is_done(job)]
+    stats = {"total": len(jobs), "skipped": len(jobs) - len(pending), "done": 0, "failed": 0,
+             "audio_seconds": 0.0, "synthesis_seconds": 0.0}
+    pending = bucket_jobs(pending, bucket_seconds)
+    print(f">> batch: {len(pending)} to synthesize, {stats['skipped']} already done")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    writer_executor = ThreadPoolExecutor(max_workers=max(1, writers), thread_name_prefix="indextts-batch-writer")
+    loop = asyncio.get_running_loop()
+    start_time = time.perf_counter()
+
+    async def run_job(job: BatchJob):
+        record = {"id": job.id, "output": job.output_path, "speaker": job.speaker, "seed": job.seed,
+                  "estimated_seconds": round(job.estimated_seconds, 2)}
+        try:
+            async with semaphore:
+                job_start = time.perf_counter()
+                if job.speaker in getattr(tts, "speaker_sources", {}):
+                    sampling_rate, wav = await tts.infer_with_ref_audio_embed(job.speaker, job.text, seed=job.seed)
+                else:
+                    # 不是已登记的 speaker 时视为参考音频路径，相同参考音频的 conditioning 只计算一次
+                    sampling_rate, wav = await tts.infer([job.speaker] if job.speaker else [], job.text, seed=job.seed,
+                                                         verbose=False)
+                synthesis_seconds = time.perf_counter() - job_start
+            write_start = time.perf_counter()
+            await loop.run_in_executor(writer_executor, write_wav, job.output_path, wav, sampling_rate)
+            audio_seconds = wav.shape[0] / sampling_rate
+            record.update({
+                "status": "ok",
+                "audio_seconds": round(audio_seconds, 3),
+                "synthesis_seconds": round(synthesis_seconds, 3),
+                "write_seconds": round(time.perf_counter() - write_start, 3),
+                "rtf": round(synthesis_seconds / audio_seconds, 4) if audio_seconds > 0 else None,
+            })
+            stats["done"] += 1
+            stats["audio_seconds"] += audio_seconds
+            stats["synthesis_seconds"] += synthesis_seconds
+        except Exception as ex:
+            record.update({"status": "error", "error": f"{type(ex).__name__}: {ex}"})
+            stats["failed"] += 1
+            print(f">> batch job {job.id} failed: {ex}")
+        manifest.append(record)
+        finished = stats["done"] + stats["failed"]
+        if finished % 100 == 0 or finished == len(pending):
+            elapsed = time.perf_counter() - start_time
+            print(f">> batch: {finished}/{len(pending)}, {stats['audio_seconds'] / max(elapsed, 1e-6):.2f} audio s/s")
+
+    try:
+        await asyncio.gather(*[run_job(job) for job in pending])
+    finally:
+        writer_executor.shutdown(wait=True)
+
+    wall_seconds = time.perf_counter() - start_time
+    stats.update({
+        "wall_seconds": round(wall_seconds, 3),
+        "audio_seconds": round(stats["audio_seconds"], 3),
+        "synthesis_seconds": round(stats["synthesis_seconds"], 3),
+        "audio_seconds_per_second": round(stats["audio_seconds"] / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "items_per_second": round(stats["done"] / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "rtf": round(wall_seconds / stats["audio_seconds"], 4) if stats["audio_seconds"] > 0 else None,
+    })
+    return stats
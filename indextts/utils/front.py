@@ -310,20 +310,29 @@ class TextTokenizer:
             tokens = [tokens]
         return [self.sp_model.PieceToId(token) for token in tokens]
 
-    def tokenize(self, text: str) -> List[str]:
-        return self.encode(text, out_type=str)
+    def tokenize(self, text: str, preprocessed=False) -> List[str]:
+        return self.encode(text, out_type=str, preprocessed=preprocessed)
 
-    def encode(self, text: str, **kwargs):
-        if len(text) == 0:
-            return []
+    def preprocess(self, text: str) -> str:
+        """encode 前的预处理：文本归一化与 pre_tokenizers，单个字符不处理"""
         if len(text.strip()) == 1:
-            return self.sp_model.Encode(text, out_type=kwargs.pop("out_type", int), **kwargs)
-        # 预处理
+            return text
         if self.normalizer:
             text = self.normalizer.normalize(text)
         if len(self.pre_tokenizers) > 0:
             for pre_tokenizer in self.pre_tokenizers:
                 text = pre_tokenizer(text)
+        return text
+
+    def encode(self, text: str, preprocessed=False, **kwargs):
+        """
+        Args:
+            preprocessed (bool): text has already been passed through preprocess.
+        """
+        if len(text) == 0:
+            return []
+        if not preprocessed:
+            text = self.preprocess(text)
         return self.sp_model.Encode(text, out_type=kwargs.pop("out_type", int), **kwargs)
 
     def batch_encode(self, texts: List[str], **kwargs):
@@ -428,6 +437,111 @@ class TextTokenizer:
         )
 
 
+class IncrementalSentenceSplitter:
+    """
+    流式输入文本（如上游 LLM 逐 token 输出）的句子切分，规则与 TextTokenizer.split_sentences 一致：
+    出现 split_tokens 中的句末标点，或当前句子超过 max_tokens_per_sentence 个 token 时切出句子，不必等待全文。
+
+    文本归一化依赖上下文（数字、小数点、缩写等），所以原始文本只在安全的断点（句末标点之后）截取，
+    截取的部分归一化、分词后再逐个 token 切分；一直没有断点的文本超过 max_pending_chars 时在逗号或空格处截取。
+    """
+
+    RAW_TERMINATORS = "。！？!?；;…\n"
+    RAW_SOFT_BREAKS = "，,、：: "
+    CLOSING_MARKS = "”’\"')）】」』"
+
+    def __init__(self, tokenize, split_tokens=None, max_tokens_per_sentence=120, max_pending_chars=200,
+                 text_filter=None):
+        """
+        Args:
+            tokenize (callable): text -> tokens, e.g. TextTokenizer.tokenize (normalises the text first).
+            split_tokens (list[str] | None): sentence terminators, default TextTokenizer.punctuation_marks_tokens.
+            max_tokens_per_sentence (int): token budget of one sentence.
+            max_pending_chars (int): raw text buffered without a terminator before it is cut at a soft break.
+            text_filter (callable | None): applied to each raw text segment before tokenize.
+        """
+        self.tokenize = tokenize
+        self.split_tokens = split_tokens if split_tokens is not None else TextTokenizer.punctuation_marks_tokens
+        self.max_tokens_per_sentence = max_tokens_per_sentence
+        self.max_pending_chars = max_pending_chars
+        self.text_filter = text_filter
+        self.text = ""  # 尚未分词的原始文本
+        self.current = []  # 尚未结束的句子
+
+    def feed(self, text: str) -> List[List[str]]:
+        """追加一段文本，返回因此完成的句子"""
+        self.text += text
+        sentences = []
+        while True:
+            cut = self._safe_cut()
+            if cut == 0:
+                return sentences
+            segment, self.text = self.text[:cut], self.text[cut:]
+            sentences.extend(self._push_tokens(self._tokenize(segment)))
+
+    def flush(self) -> List[List[str]]:
+        """输入结束：剩余的文本与未结束的句子全部切出"""
+        sentences = self._push_tokens(self._tokenize(self.text)) if self.text.strip() else []
+        if self.current:
+            sentences.append(self.current)
+        self.text = ""
+        self.current = []
+        return sentences
+
+    def _tokenize(self, text):
+        if self.text_filter is not None:
+            text = self.text_filter(text)
+        return self.tokenize(text)
+
+    def _safe_cut(self) -> int:
+        text = self.text
+        cut = 0
+        for i, ch in enumerate(text):
+            if ch == ".":
+                # 小数点、省略号中间、末尾还不确定的 . 都不是断点
+                if i + 1 >= len(text) or text[i + 1].isdigit() or text[i + 1] == ".":
+                    continue
+            elif ch not in self.RAW_TERMINATORS:
+                continue
+            j = i + 1
+            while j < len(text) and text[j] in self.CLOSING_MARKS:
+                j += 1
+            cut = j
+        if cut == 0 and len(text) > self.max_pending_chars:
+            soft = max(text.rfind(ch) for ch in self.RAW_SOFT_BREAKS)
+            cut = soft + 1 if soft > 0 else len(text)
+        return cut
+
+    def _push_tokens(self, tokens: List[str]) -> List[List[str]]:
+        sentences = []
+        for i, token in enumerate(tokens):
+            if not self.current and token in ["'", "▁'"]:
+                # 上一句的后引号在句子切出后才到达，不发音，直接丢弃
+                continue
+            self.current.append(token)
+            if token in self.split_tokens and len(self.current) > 2 and not self._is_decimal_point(tokens, i):
+                sentences.append(self.current)
+                self.current = []
+            elif len(self.current) > self.max_tokens_per_sentence:
+                # 超长：按 split_sentences_by_token 的规则（逗号、连字符、长度）切分，最后一段可能还没结束
+                parts = TextTokenizer.split_sentences_by_token(
+                    self.current, self.split_tokens, max_tokens_per_sentence=self.max_tokens_per_sentence
+                )
+                sentences.extend(parts[:-1])
+                self.current = parts[-1] if parts else []
+        return sentences
+
+    @staticmethod
+    def _is_decimal_point(tokens, i) -> bool:
+        """
+        两个数字之间的 . 是小数点，不是句末。
+        _safe_cut 不会在小数点之后截取，所以小数点后面的数字一定与它在同一段 tokens 中。
+        """
+        if tokens[i] != "." or i == 0 or i + 1 >= len(tokens):
+            return False
+        return tokens[i - 1][-1:].isdigit() and tokens[i + 1][:1].isdigit()
+
+
 if __name__ == "__main__":
     # 测试程序
 
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile as sf
+
+from indextts.utils.admission import AdmissionController, AdmissionRejected
+from indextts.utils.priority import PRIORITY_BACKGROUND
+from indextts.utils.text_utils import sentence_text
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class Job:
+    """
+    一个长文本合成任务，目录结构：
+        {jobs_dir}/{id}/job.json        元信息与状态
+        {jobs_dir}/{id}/sentences.json  切分后的句子
+        {jobs_dir}/{id}/segments/*.wav  已完成的句子音频，按句子序号命名
+        {jobs_dir}/{id}/output.wav      全部完成后拼接的结果
+    进度由已存在的 segment 文件决定，重启后只合成缺少的句子。
+    """
+
+    def __init__(self, job_dir, meta, sentences):
+        self.dir = job_dir
+        self.meta = meta
+        self.sentences = sentences
+        self.segment_seconds = {}  # 句子序号 -> 音频时长
+        self.run_start_time = None
+        self.run_completed = 0  # 本次运行中完成的句子数，用于估算剩余时间
+        self.task = None
+
+    @property
+    def id(self):
+        return self.meta["id"]
+
+    @property
+    def output_path(self):
+        return os.path.join(self.dir, "output.wav")
+
+    def segment_path(self, index):
+        return os.path.join(self.dir, "segments", f"{index:05d}.wav")
+
+    def load_segments(self):
+        for index in range(len(self.sentences)):
+            path = self.segment_path(index)
+            if os.path.exists(path):
+                try:
+                    info = sf.info(path)
+                except RuntimeError:
+                    continue  # 写了一半的文件，重新合成
+                self.segment_seconds[index] = info.frames / info.samplerate
+
+    def save(self):
+        write_json(os.path.join(self.dir, "job.json"), self.meta)
+
+    def status(self):
+        total = len(self.sentences)
+        completed = len(self.segment_seconds)
+        eta = None
+        if self.meta["status"] == JOB_RUNNING and self.run_completed > 0:
+            elapsed = time.time() - self.run_start_time
+            eta = round(elapsed / self.run_completed * (total - completed), 1)
+        return {
+            "job_id": self.id,
+            "status": self.meta["status"],
+            "speaker": self.meta["speaker"],
+            "sentences": total,
+            "completed": completed,
+            "progress": round(completed / total, 4) if total else 1.0,
+            "audio_seconds": round(sum(self.segment_seconds.values()), 2),
+            "eta_seconds": eta,
+            "created_at": self.meta["created_at"],
+            "finished_at": self.meta.get("finished_at"),
+            "error": self.meta.get("error"),
+        }
+
+
+class JobManager:
+    """
+    长文本异步任务：提交后立即返回 job id，句子以 background 优先级逐句合成，完成一句就写入磁盘，
+    全部完成后拼接为一个 WAV。服务重启后 resume 继续未完成的任务，已完成的句子不再重新合成。
+    所有任务共享 max_concurrent_sentences 个并发名额，按提交顺序获得。
+    """
+
+    def __init__(self, tts, jobs_dir, admission: AdmissionController = None, max_concurrent_sentences=4, max_retries=2,
+                 writers=2):
+        """
+        Args:
+            tts: IndexTTS, or an engine with the same interface (ReplicaRouter / StubTTS).
+            jobs_dir (str): directory of the persisted jobs.
+            admission (AdmissionController | None): each sentence is admitted at background priority, so jobs only use
+                the capacity left over by interactive traffic.
+            max_concurrent_sentences (int): sentences of all jobs synthesized at the same time.
+            max_retries (int): retries of a failing sentence before the job is marked as failed.
+            writers (int): threads writing segments and stitching the output.
+        """
+        self.tts = tts
+        self.jobs_dir = jobs_dir
+        self.admission = admission
+        self.max_retries = max_retries
+        self.jobs = {}
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent_sentences))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, writers), thread_name_prefix="indextts-jobs")
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def resume(self) -> int:
+        """加载磁盘上的任务，未完成的重新排队；返回重新排队的任务数"""
+        jobs = []
+        for job_id in os.listdir(self.jobs_dir):
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            try:
+                with open(os.path.join(job_dir, "job.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(os.path.join(job_dir, "sentences.json"), "r", encoding="utf-8") as f:
+                    sentences = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            jobs.append(Job(job_dir, meta, sentences))
+        resumed = 0
+        # 按创建时间排队，先提交的先完成
+        for job in sorted(jobs, key=lambda job: job.meta["created_at"]):
+            job.load_segments()
+            self.jobs[job.id] = job
+            if job.meta["status"] in (JOB_QUEUED, JOB_RUNNING):
+                job.meta["status"] = JOB_QUEUED
+                self._schedule(job)
+                resumed += 1
+        if resumed:
+            print(f">> resumed {resumed} unfinished jobs")
+        return resumed
+
+    async def submit(self, text: str, speaker: str, seed=None, sampling=None) -> dict:
+        sentences = await self.tts.split_text(text, priority=PRIORITY_BACKGROUND)
+        if not sentences:
+            raise ValueError("text is empty")
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(os.path.join(job_dir, "segments"))
+        meta = {
+            "id": job_id,
+            "speaker": speaker,
+            "seed": seed,
+            "sampling": sampling or {},
+            "text": text,
+            "status": JOB_QUEUED,
+            "created_at": time.time(),
+        }
+        job = Job(job_dir, meta, sentences)
+        write_json(os.path.join(job_dir, "sentences.json"), sentences)
+        job.save()
+        self.jobs[job_id] = job
+        self._schedule(job)
+        return job.status()
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return job.status() if job is not None else None
+
+    def list(self):
+        return [job.status() for job in sorted(self.jobs.values(), key=lambda job: job.meta["created_at"])]
+
+    def output_path(self, job_id):
+        """已完成任务的音频路径，未完成时为 None"""
+        job = self.jobs.get(job_id)
+        if job is None or job.meta["status"] != JOB_DONE:
+            return None
+        return job.output_path
+
+    async def cancel(self, job_id) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.meta["status"] not in (JOB_QUEUED, JOB_RUNNING):
+            return False
+        if job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        self._finish(job, JOB_CANCELLED)
+        return True
+
+    async def close(self):
+        """停止所有任务，状态保留为 running / queued，下次启动时 resume"""
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    def _schedule(self, job: Job):
+        job.task = asyncio.ensure_future(self._run_job(job))
+
+    def _finish(self, job: Job, status, error=None):
+        job.meta["status"] = status
+        job.meta["finished_at"] = time.time()
+        if error is not None:
+            job.meta["error"] = error
+        job.save()
+
+    async def _run_job(self, job: Job):
+        loop = asyncio.get_running_loop()
+        pending = [index for index in range(len(job.sentences)) if index not in job.segment_seconds]
+        tasks = [asyncio.ensure_future(self._synthesize_sentence(job, index)) for index in pending]
+        try:
+            await asyncio.gather(*tasks)
+            await loop.run_in_executor(self._executor, self._stitch, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            print(f">> job {job.id} failed: {ex}")
+            self._finish(job, JOB_FAILED, f"{type(ex).__name__}: {ex}")
+            return
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        self._finish(job, JOB_DONE)
+        print(f">> job {job.id} done: {len(job.sentences)} sentences, {sum(job.segment_seconds.values()):.1f}s audio")
+
+    async def _synthesize_sentence(self, job: Job, index: int):
+        sentence = job.sentences[index]
+        cost = AdmissionController.estimate_cost(sentence_text(sentence))
+        async with self._semaphore:
+            if job.meta["status"] == JOB_QUEUED:
+                job.meta["status"] = JOB_RUNNING
+                job.meta.pop("error", None)
+                job.run_start_time = time.time()
+                job.save()
+            for attempt in range(self.max_retries + 1):
+                ticket = await self._admit(cost)
+                try:
+                    sampling_rate, wav = await self.tts.infer_sentence(
+                        job.meta["speaker"], sentence, seed=job.meta["seed"], priority=PRIORITY_BACKGROUND,
+                        sampling=job.meta.get("sampling"))
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    if attempt == self.max_retries:
+                        raise
+                    print(f">> job {job.id} sentence {index} failed ({ex}), retrying")
+                finally:
+                    if ticket is not None:
+                        await self.admission.release(ticket)
+        path = job.segment_path(index)
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write_segment, path, wav, sampling_rate)
+        job.segment_seconds[index] = wav.shape[0] / sampling_rate
+        job.run_completed += 1
+
+    async def _admit(self, cost):
+        """background 优先级的准入：放不下时按 Retry-After 等待后重试，而不是失败"""
+        if self.admission is None:
+            return None
+        while True:
+            try:
+                return await self.admission.acquire(cost, PRIORITY_BACKGROUND)
+            except AdmissionRejected as ex:
+                await asyncio.sleep(ex.retry_after)
+
+    @staticmethod
+    def _write_segment(path, wav, sampling_rate):
+        tmp_path = f"{path}.tmp"
+        sf.write(tmp_path, wav, sampling_rate, format="WAV", subtype="PCM_16")
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _stitch(job: Job):
+        """按句子顺序把 segment 依次追加到输出文件，不需要把整本书的音频放进内存"""
+        tmp_path = f"{job.output_path}.tmp"
+        writer = None
+        try:
+            for index in range(len(job.sentences)):
+                wav, sampling_rate = sf.read(job.segment_path(index), dtype="int16", always_2d=True)
+                if writer is None:
+                    writer = sf.SoundFile(tmp_path, "w", samplerate=sampling_rate, channels=wav.shape[1],
+                                          format="WAV", subtype="PCM_16")
+                writer.write(wav)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, job.output_path)
@@ -0,0 +1,34 @@
+import torch
+
+from indextts.utils.micro_batcher import MicroBatcher
+from indextts.utils.priority import PRIORITY_NORMAL
+
+
+class LatentBatcher(MicroBatcher):
+    """
+    跨句子、跨请求的 teacher-forced latent 微批调度器（hf_latent 模式）。
+
+    把一个 batch 内各句子的 (conditioning latent, text tokens, codes) 交给 UnifiedVoice.forward_latents，
+    只跑一次 GPT2 stack。num_frames 为每个 item 拼接后的序列长度。
+    """
+
+    def __init__(self, gpt, max_batch_size=8, max_batch_frames=8192, max_wait_ms=5.0, executor=None):
+        """
+        Args:
+            gpt: UnifiedVoice with the HF GPT2Model kept (hf_latent=True).
+            max_batch_size (int): max number of sentences in one forward.
+            max_batch_frames (int): max padded tokens (batch size * longest sequence) per forward.
+            max_wait_ms (float): max time the first queued sentence waits for others to join its batch.
+            executor (concurrent.futures.Executor | None): executor running the GPT2 forward.
+        """
+        super().__init__(max_batch_size, max_batch_frames, max_wait_ms, executor)
+        self.gpt = gpt
+
+    async def get_latent(self, speech_conditioning_latent, text_tokens, codes, priority=PRIORITY_NORMAL) -> torch.Tensor:
+        """返回 final_norm latent (1, len(codes), dim)"""
+        # [conds, start_text, text, stop_text, start_mel, codes, stop_mel]
+        seq_len = speech_conditioning_latent.shape[1] + text_tokens.shape[-1] + len(codes) + 4
+        return await self.submit((speech_conditioning_latent, text_tokens, codes), seq_len, priority)
+
+    def forward(self, batch):
+        return self.gpt.forward_latents([item.inputs for item in batch])
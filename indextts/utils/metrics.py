@@ -0,0 +1,145 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from indextts.utils.priority import PRIORITY_NAMES, PRIORITY_NORMAL
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+# 阶段：text_normalize, tokenize, conditioning, vllm_queue, prefill, decode, latent, vocoder, encode, total
+STAGE_SECONDS = Histogram("indextts_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS)
+# 请求级指标按优先级（interactive / normal / background）分开统计
+REQUEST_RTF = Histogram("indextts_request_rtf", "Per-request real-time factor (total time / audio seconds)", ["priority"], buckets=RTF_BUCKETS)
+REQUEST_TTFA = Histogram("indextts_request_ttfa_seconds", "Per-request time to first audio", ["priority"], buckets=STAGE_BUCKETS)
+REQUEST_SECONDS = Histogram("indextts_request_seconds", "Per-request total latency", ["priority"], buckets=STAGE_BUCKETS)
+REQUESTS = Counter("indextts_requests_total", "Finished requests", ["priority"])
+MEL_TOKENS = Counter("indextts_mel_tokens_total", "Generated mel tokens, rate() gives tokens/s")
+AUDIO_SECONDS = Counter("indextts_audio_seconds_total", "Synthesized audio seconds, rate() gives audio-seconds/s")
+
+# 以下 gauge 在每次抓取 /metrics 时由 update_service_gauges 刷新
+REQUESTS_IN_FLIGHT = Gauge("indextts_requests_in_flight", "Admitted requests not finished yet")
+REQUESTS_QUEUED = Gauge("indextts_requests_queued", "Requests waiting for admission")
+REQUESTS_IN_FLIGHT_BY_PRIORITY = Gauge("indextts_requests_in_flight_by_priority", "Admitted requests not finished yet, by priority", ["priority"])
+REQUESTS_QUEUED_BY_PRIORITY = Gauge("indextts_requests_queued_by_priority", "Requests waiting for admission, by priority", ["priority"])
+OUTSTANDING_AUDIO_SECONDS = Gauge("indextts_outstanding_audio_seconds", "Estimated audio seconds of admitted requests not finished yet")
+THROUGHPUT = Gauge("indextts_throughput_audio_seconds_per_second", "Audio seconds synthesized per second, measured by admission control")
+BATCHER_QUEUE_DEPTH = Gauge("indextts_batcher_queue_depth", "Items waiting in a cross-request micro-batcher", ["batcher"])
+BATCHER_AVG_BATCH_SIZE = Gauge("indextts_batcher_avg_batch_size", "Average micro-batch size", ["batcher"])
+CACHE_HIT_RATIO = Gauge("indextts_cache_hit_ratio", "Cache hits / lookups", ["cache"])
+EARLY_STOP = Gauge("indextts_early_stop", "Generations stopped early (silence / repetition) and decode steps saved", ["kind"])
+SINGLE_FLIGHT = Gauge("indextts_single_flight", "Single-flight coalescing of identical in-flight sentences by kind", ["kind"])
+ABORTED = Gauge("indextts_aborted", "Aborted requests and work items by kind", ["kind"])
+
+
+class RequestTimings:
+    """
+    单个请求的计时上下文，沿推理流程传递（api_server -> IndexTTS -> UnifiedVoice）。
+    各阶段耗时既累加到本对象（用于日志），也逐次写入 prometheus 直方图；finish 时记录总耗时、RTF 与 TTFA。
+    各方法可在 event loop 与线程池中调用。
+    record_metrics 为 False 时只在本对象内累计（如启动预热），不写入 prometheus。
+    """
+
+    def __init__(self, sampling_rate=24000, priority=PRIORITY_NORMAL, record_metrics=True):
+        self.sampling_rate = sampling_rate
+        self.priority = priority
+        self.record_metrics = record_metrics
+        self.start_time = time.perf_counter()
+        self.stages = defaultdict(float)
+        self.first_audio_time = None
+        self.mel_tokens = 0
+        self.audio_seconds = 0.0
+        self.finished = False
+
+    def observe(self, stage: str, seconds: float):
+        self.stages[stage] += seconds
+        if self.record_metrics:
+            STAGE_SECONDS.labels(stage).observe(seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def add_mel_tokens(self, num_tokens: int):
+        self.mel_tokens += num_tokens
+        if self.record_metrics:
+            MEL_TOKENS.inc(num_tokens)
+
+    def add_audio(self, num_samples: int):
+        """一个句子的音频已就绪，第一次调用即为首包时刻"""
+        if self.first_audio_time is None:
+            self.first_audio_time = time.perf_counter()
+        seconds = num_samples / self.sampling_rate
+        self.audio_seconds += seconds
+        if self.record_metrics:
+            AUDIO_SECONDS.inc(seconds)
+
+    @property
+    def ttfa(self):
+        return self.first_audio_time - self.start_time if self.first_audio_time is not None else None
+
+    @property
+    def rtf(self):
+        total = self.stages.get("total")
+        return total / self.audio_seconds if total is not None and self.audio_seconds > 0 else None
+
+    def finish(self):
+        """请求结束（含被中止）时调用一次，重复调用无副作用"""
+        if self.finished:
+            return
+        self.finished = True
+        total = time.perf_counter() - self.start_time
+        self.observe("total", total)
+        if not self.record_metrics:
+            return
+        priority = PRIORITY_NAMES[self.priority]
+        REQUESTS.labels(priority).inc()
+        REQUEST_SECONDS.labels(priority).observe(total)
+        if self.ttfa is not None:
+            REQUEST_TTFA.labels(priority).observe(self.ttfa)
+        if self.rtf is not None:
+            REQUEST_RTF.labels(priority).observe(self.rtf)
+
+    def summary(self) -> str:
+        parts = [f"{stage}: {seconds:.3f}s" for stage, seconds in self.stages.items()]
+        if self.ttfa is not None:
+            parts.append(f"ttfa: {self.ttfa:.3f}s")
+        if self.rtf is not None:
+            parts.append(f"rtf: {self.rtf:.4f}")
+        parts.append(f"audio: {self.audio_seconds:.2f}s, mel tokens: {self.mel_tokens}")
+        return ", ".join(parts)
+
+
+def update_service_gauges(admission_status: dict, tts_stats: dict, abort_stats: dict = None):
+    """由 AdmissionController.status() 与 IndexTTS.get_stats() 刷新服务级 gauge"""
+    REQUESTS_IN_FLIGHT.set(admission_status["in_flight"])
+    REQUESTS_QUEUED.set(admission_status["waiting"])
+    OUTSTANDING_AUDIO_SECONDS.set(admission_status["outstanding_audio_seconds"])
+    THROUGHPUT.set(admission_status["throughput"])
+    for priority, count in admission_status.get("in_flight_by_priority", {}).items():
+        REQUESTS_IN_FLIGHT_BY_PRIORITY.labels(priority).set(count)
+    for priority, count in admission_status.get("waiting_by_priority", {}).items():
+        REQUESTS_QUEUED_BY_PRIORITY.labels(priority).set(count)
+    for batcher in ["vocoder", "latent"]:
+        stats = tts_stats.get(f"{batcher}_batcher")
+        if stats is not None:
+            BATCHER_QUEUE_DEPTH.labels(batcher).set(stats["queue_depth"])
+            BATCHER_AVG_BATCH_SIZE.labels(batcher).set(stats["avg_batch_size"])
+    for cache in ["sentence", "conditioning", "prefix"]:
+        stats = tts_stats.get(f"{cache}_cache")
+        if stats is not None:
+            CACHE_HIT_RATIO.labels(cache).set(stats["hit_rate"])
+    for kind, count in (tts_stats.get("early_stop") or {}).items():
+        EARLY_STOP.labels(kind).set(count)
+    single_flight = tts_stats.get("single_flight")
+    if single_flight is not None:
+        for kind in ["leaders", "coalesced", "coalesced_requests", "in_flight"]:
+            SINGLE_FLIGHT.labels(kind).set(single_flight[kind])
+    for kind, count in {**tts_stats.get("aborts", {}), **(abort_stats or {})}.items():
+        ABORTED.labels(kind).set(count)
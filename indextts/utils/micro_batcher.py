@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from indextts.utils.priority import PRIORITY_NORMAL, PriorityThreadPoolExecutor
+
+
+@dataclass
+class BatchItem:
+    inputs: tuple
+    num_frames: int  # 用于 max_batch_frames 限制的长度（latent 帧数 / token 数）
+    future: asyncio.Future
+    enqueue_time: float = field(default_factory=time.perf_counter)
+    priority: int = PRIORITY_NORMAL
+
+
+class MicroBatcher:
+    """
+    跨请求的微批调度器基类。
+
+    各请求通过 submit 提交输入，调度器在 max_wait_ms 的窗口内（或凑满 max_batch_size /
+    max_batch_frames 后立即）把它们合成一个 batch 交给 forward，再把结果逐个返回给请求。
+    第一个 item 入队后最多等待 max_wait_ms 就会被处理。子类实现 forward(batch) -> list。
+    指定 executor 时 forward 在该线程池中执行，不阻塞 event loop。
+    队列按 (priority, 入队顺序) 排列，高优先级（数值小）的 item 先进入 batch。
+    子类可重写 batch_key：只有 key 相同的 item 才会进入同一个 batch（如不允许补齐时只合并等长的输入）。
+    """
+
+    def __init__(self, max_batch_size=8, max_batch_frames=4096, max_wait_ms=5.0, executor=None):
+        """
+        Args:
+            max_batch_size (int): max number of items in one forward.
+            max_batch_frames (int): max padded frames (batch size * longest item) per forward.
+            max_wait_ms (float): max time the first queued item waits for others to join its batch.
+            executor (concurrent.futures.Executor | None): executor running forward, None runs it on the event loop.
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_frames = max_batch_frames
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+
+        self.pending = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "frames": 0,  # 实际帧数
+            "padded_frames": 0,  # 补齐后的帧数，frames / padded_frames 即占用率
+            "max_batch_size": 0,
+            "queue_wait_time": 0.0,
+            "cancelled": 0,  # 请求已取消、未执行 forward 就被丢弃的 item
+        }
+
+    async def submit(self, inputs: tuple, num_frames: int, priority=PRIORITY_NORMAL):
+        future = asyncio.get_running_loop().create_future()
+        item = BatchItem(inputs, num_frames, future, priority=priority)
+        # 插到同优先级的最后，同一优先级内先进先出
+        index = len(self.pending)
+        while index > 0 and self.pending[index - 1].priority > item.priority:
+            index -= 1
+        self.pending.insert(index, item)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+        return await future
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["queue_depth"] = len(self.pending)
+        stats["avg_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["occupancy"] = stats["frames"] / stats["padded_frames"] if stats["padded_frames"] else 0.0
+        return stats
+
+    def forward(self, batch):
+        raise NotImplementedError
+
+    def batch_key(self, item):
+        """能否进入同一个 batch 的分组 key，默认所有 item 都可以合并"""
+        return None
+
+    def _batch_ready(self):
+        key = self.batch_key(self.pending[0])
+        candidates = [item for item in self.pending if self.batch_key(item) == key]
+        if len(candidates) >= self.max_batch_size:
+            return True
+        max_frames = max(item.num_frames for item in candidates)
+        return max_frames * len(candidates) >= self.max_batch_frames
+
+    def _take_batch(self):
+        batch = []
+        max_frames = 0
+        key = None
+        index = 0
+        while index < len(self.pending) and len(batch) < self.max_batch_size:
+            item = self.pending[index]
+            if item.future.done():
+                # 请求已取消，跳过
+                del self.pending[index]
+                self.stats["cancelled"] += 1
+                continue
+            if batch and self.batch_key(item) != key:
+                # 不能与队首合并的 item 留在队列中，下一个 batch 再处理
+                index += 1
+                continue
+            new_max_frames = max(max_frames, item.num_frames)
+            if batch and new_max_frames * (len(batch) + 1) > self.max_batch_frames:
+                break
+            if not batch:
+                key = self.batch_key(item)
+            batch.append(item)
+            del self.pending[index]
+            max_frames = new_max_frames
+        return batch
+
+    def _update_stats(self, batch):
+        now = time.perf_counter()
+        max_frames = max(item.num_frames for item in batch)
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        self.stats["frames"] += sum(item.num_frames for item in batch)
+        self.stats["padded_frames"] += max_frames * len(batch)
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+        self.stats["queue_wait_time"] += sum(now - item.enqueue_time for item in batch)
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # 收集窗口：等待更多请求加入，直到凑满或最早入队的 item 等待超过 max_wait
+            deadline = min(item.enqueue_time for item in self.pending) + self.max_wait
+            while not self._batch_ready():
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if not batch:
+                continue
+            self._update_stats(batch)
+            try:
+                if self.executor is None:
+                    outputs = self.forward(batch)
+                elif isinstance(self.executor, PriorityThreadPoolExecutor):
+                    # batch 以其中最高的优先级排队
+                    priority = min(item.priority for item in batch)
+                    outputs = await asyncio.wrap_future(self.executor.submit(self.forward, batch, priority=priority))
+                else:
+                    outputs = await asyncio.get_running_loop().run_in_executor(self.executor, self.forward, batch)
+            except Exception as ex:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(ex)
+                continue
+            for item, output in zip(batch, outputs):
+                if not item.future.done():
+                    item.future.set_result(output)
@@ -0,0 +1,74 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import Executor, Future
+
+# 数值越小越优先，与 vllm priority 调度的约定一致
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BACKGROUND: "background"}
+PRIORITY_LEVELS = {name: level for level, name in PRIORITY_NAMES.items()}
+
+
+def parse_priority(value) -> int:
+    """"interactive" / "normal" / "background"（或 0 / 1 / 2），None 为 normal"""
+    if value is None or value == "":
+        return PRIORITY_NORMAL
+    if isinstance(value, str) and value.lower() in PRIORITY_LEVELS:
+        return PRIORITY_LEVELS[value.lower()]
+    level = int(value)
+    if level not in PRIORITY_NAMES:
+        raise ValueError(f"unknown priority: {value}")
+    return level
+
+
+class PriorityThreadPoolExecutor(Executor):
+    """
+    按优先级出队的线程池：同一优先级内先进先出，空闲线程总是先执行优先级最高的任务。
+    submit 不带 priority 时（如 loop.run_in_executor）按 normal 处理。
+    """
+
+    def __init__(self, max_workers=1, thread_name_prefix="priority-pool"):
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(max(1, max_workers)):
+            thread = threading.Thread(target=self._worker, name=f"{thread_name_prefix}_{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self._queue.put((priority, next(self._counter), future, fn, args, kwargs))
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            _, _, future, fn, args, kwargs = self._queue.get()
+            if future is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as ex:
+                future.set_exception(ex)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            # 关闭标记排在所有已提交的任务之后
+            for _ in self._threads:
+                self._queue.put((float("inf"), next(self._counter), None, None, None, None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,556 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import multiprocessing as mp
+import os
+import queue as queue_module
+import re
+import threading
+import traceback
+from collections import OrderedDict
+
+import numpy as np
+
+from indextts.utils.admission import AdmissionController
+from indextts.utils.metrics import RequestTimings
+from indextts.utils.priority import PRIORITY_BACKGROUND, PRIORITY_NORMAL, PriorityThreadPoolExecutor
+from indextts.utils.warmup import run_warmup
+
+
+class StubTTS:
+    """
+    不加载模型的假引擎，接口与 IndexTTS 中被 api_server / ReplicaRouter 用到的部分一致，用于在 CPU 上测试路由。
+    每个句子（按标点切分）等待 seconds_per_char * 字数 后返回对应时长的静音。
+    """
+
+    def __init__(self, seconds_per_char=0.002, audio_seconds_per_char=0.2, sampling_rate=24000, **kwargs):
+        self.seconds_per_char = seconds_per_char
+        self.audio_seconds_per_char = audio_seconds_per_char
+        self.sampling_rate = sampling_rate
+        self.speaker_sources = {}
+        self.cancelled_sentences = 0
+
+    def add_speaker(self, speaker, audio_paths):
+        self.speaker_sources[speaker] = list(audio_paths)
+
+    def registry_speaker(self, speaker, audio_paths):
+        self.add_speaker(speaker, audio_paths)
+
+    def split_sentences(self, text):
+        return [sentence for sentence in text.replace("。", ".").replace("，", ",").split(".") if sentence.strip()]
+
+    async def split_text(self, text, priority=PRIORITY_NORMAL):
+        return self.split_sentences(text)
+
+    async def infer_sentence(self, speaker, sentence, seed=None, timings=None, priority=PRIORITY_BACKGROUND, sampling=None):
+        wavs = [wav async for wav in self.infer_stream(speaker, sentence, pad_tail=False, seed=seed, timings=timings)]
+        return self.sampling_rate, np.concatenate(wavs, axis=0)
+
+    async def infer_stream(self, speaker, text, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                           priority=PRIORITY_NORMAL, sampling=None):
+        if speaker not in self.speaker_sources:
+            raise KeyError(f"unknown speaker: {speaker}")
+        async for wav in self._synthesize(text, timings):
+            yield wav
+
+    async def infer_text_stream(self, speaker, fragments, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                                priority=PRIORITY_NORMAL, sampling=None):
+        if speaker not in self.speaker_sources:
+            raise KeyError(f"unknown speaker: {speaker}")
+        text = ""
+        async for fragment in fragments:
+            # 按句末标点切出已完整的句子，其余留待后续文本
+            *sentences, text = re.split(r"(?<=[。.!?！？])", text + fragment)
+            for sentence in sentences:
+                async for wav in self._synthesize(sentence, timings):
+                    yield wav
+        async for wav in self._synthesize(text, timings):
+            yield wav
+
+    async def _synthesize(self, text, timings=None):
+        sentences = self.split_sentences(text)
+        for i, sentence in enumerate(sentences):
+            try:
+                await asyncio.sleep(self.seconds_per_char * len(sentence))
+            except asyncio.CancelledError:
+                self.cancelled_sentences += len(sentences) - i
+                raise
+            wav = np.zeros((int(self.audio_seconds_per_char * len(sentence) * self.sampling_rate), 1), dtype=np.int16)
+            if timings is not None:
+                timings.add_mel_tokens(len(sentence) * 10)
+                timings.add_audio(wav.shape[0])
+            yield wav
+
+    async def infer_with_ref_audio_embed(self, speaker, text, seed=None, reuse_cache=False, timings=None,
+                                         priority=PRIORITY_NORMAL, sampling=None):
+        wavs = [wav async for wav in self.infer_stream(speaker, text, pad_tail=False, seed=seed, timings=timings)]
+        return self.sampling_rate, np.concatenate(wavs, axis=0)
+
+    async def infer(self, audio_prompt=[], text="", output_path=None, verbose=False, seed=None, timings=None,
+                    priority=PRIORITY_NORMAL, sampling=None):
+        wavs = [wav async for wav in self._synthesize(text, timings)]
+        return self.sampling_rate, np.concatenate(wavs, axis=0)
+
+    async def warmup(self, speaker=None, texts=None, rounds=2):
+        return await run_warmup(self, speaker, texts, rounds)
+
+    def get_abort_stats(self):
+        return {"cancelled_sentences": self.cancelled_sentences}
+
+
+# worker 中带 RequestTimings 执行的合成调用
+TIMED_METHODS = {"infer", "infer_with_ref_audio_embed", "infer_sentence"}
+
+
+def build_engine(backend, engine_kwargs):
+    if backend == "stub":
+        return StubTTS(**engine_kwargs)
+    from indextts.infer_vllm import IndexTTS
+    return IndexTTS(**engine_kwargs)
+
+
+def worker_main(worker_id, backend, engine_kwargs, device, request_queue, response_queue):
+    """replica 进程入口：在导入 torch 之前固定可见的 GPU，然后在自己的 event loop 中运行一个引擎"""
+    if device is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+    asyncio.run(_worker_loop(worker_id, backend, engine_kwargs, request_queue, response_queue))
+
+
+async def _worker_loop(worker_id, backend, engine_kwargs, request_queue, response_queue):
+    try:
+        engine = build_engine(backend, engine_kwargs)
+    except Exception:
+        response_queue.put((worker_id, None, "error", traceback.format_exc()))
+        return
+    response_queue.put((worker_id, None, "ready", os.getpid()))
+
+    loop = asyncio.get_running_loop()
+    tasks = {}
+    inputs = {}  # infer_text_stream 的增量文本，fragment 可能先于 call 到达
+
+    async def read_fragments(request_id):
+        fragments = inputs.setdefault(request_id, asyncio.Queue())
+        while True:
+            fragment = await fragments.get()
+            if fragment is None:
+                return
+            yield fragment
+
+    async def handle(request_id, method, args, kwargs):
+        timings = RequestTimings(priority=kwargs.get("priority", PRIORITY_NORMAL))
+        try:
+            if method == "infer_stream":
+                async for chunk in engine.infer_stream(*args, timings=timings, **kwargs):
+                    response_queue.put((worker_id, request_id, "chunk", chunk))
+                result = None
+            elif method == "infer_text_stream":
+                async for chunk in engine.infer_text_stream(*args, read_fragments(request_id), timings=timings, **kwargs):
+                    response_queue.put((worker_id, request_id, "chunk", chunk))
+                result = None
+            elif method in TIMED_METHODS:
+                result = await getattr(engine, method)(*args, timings=timings, **kwargs)
+            else:
+                # warmup / split_text 等不记录请求计时的调用
+                result = await getattr(engine, method)(*args, **kwargs)
+            # 各阶段耗时随结果一起返回，由主进程写入它的 /metrics
+            worker_timings = {"stages": dict(timings.stages), "mel_tokens": timings.mel_tokens,
+                              "audio_seconds": timings.audio_seconds}
+            response_queue.put((worker_id, request_id, "done", (result, worker_timings)))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            response_queue.put((worker_id, request_id, "error", traceback.format_exc()))
+        finally:
+            tasks.pop(request_id, None)
+            inputs.pop(request_id, None)
+
+    while True:
+        message = await loop.run_in_executor(None, request_queue.get)
+        command = message[0]
+        if command == "call":
+            _, request_id, method, args, kwargs = message
+            tasks[request_id] = asyncio.ensure_future(handle(request_id, method, args, kwargs))
+        elif command == "fragment":
+            _, request_id, fragment = message
+            inputs.setdefault(request_id, asyncio.Queue()).put_nowait(fragment)
+        elif command == "abort":
+            task = tasks.get(message[1])
+            if task is not None:
+                task.cancel()
+        elif command == "broadcast":
+            # add_speaker / registry_speaker 等同步调用，按到达顺序执行
+            _, method, args, kwargs = message
+            try:
+                getattr(engine, method)(*args, **kwargs)
+            except Exception:
+                traceback.print_exc()
+        elif command == "stop":
+            break
+    for task in list(tasks.values()):
+        task.cancel()
+
+
+class Replica:
+    def __init__(self, worker_id, device, process, request_queue, max_affinity_keys):
+        self.worker_id = worker_id
+        self.device = device
+        self.process = process
+        self.request_queue = request_queue
+        self.max_affinity_keys = max_affinity_keys
+        self.outstanding_seconds = 0.0  # 已分配但未完成的预估音频时长
+        self.in_flight = 0
+        self.requests = 0
+        self.affinity = OrderedDict()  # 最近在本 replica 上合成过的 speaker / 参考音频
+        self.pending = set()  # 已发往本 replica、尚未结束的 request_id
+        self.alive = True  # worker 进程退出后由 ReplicaRouter 置为 False，不再接收请求
+
+    def touch(self, affinity_key):
+        self.affinity[affinity_key] = True
+        self.affinity.move_to_end(affinity_key)
+        while len(self.affinity) > self.max_affinity_keys:
+            self.affinity.popitem(last=False)
+
+    def get_stats(self):
+        return {
+            "worker_id": self.worker_id,
+            "device": self.device,
+            "alive": self.alive and self.process.is_alive(),
+            "in_flight": self.in_flight,
+            "outstanding_audio_seconds": round(self.outstanding_seconds, 2),
+            "requests": self.requests,
+        }
+
+
+class ReplicaRouter:
+    """
+    多 replica 路由：启动 num_replicas 个 worker 进程，每个固定到一个 device、持有一个 IndexTTS（或 StubTTS），
+    请求按最少未完成工作量（预估音频秒数）分配，同一 speaker 优先发往已合成过它的 replica，
+    使其 conditioning / 句子级缓存保持热；结果（音频块）经进程间队列返回。
+
+    对外提供与 IndexTTS 相同的 async 接口（infer / infer_with_ref_audio_embed / infer_stream / add_speaker 等），
+    api_server 可直接替换使用。
+    """
+
+    def __init__(self, num_replicas, backend="indextts", engine_kwargs=None, devices=None, affinity_slack_seconds=10.0,
+                 cpu_workers=2, max_affinity_keys=1024, liveness_interval=1.0):
+        """
+        Args:
+            num_replicas (int): number of worker processes.
+            backend (str): "indextts" or "stub" (StubTTS, no model, for CPU tests).
+            engine_kwargs (dict | None): keyword arguments of the engine constructor in each worker.
+            devices (list | None): CUDA device of each worker (set as CUDA_VISIBLE_DEVICES), default is 0..num_replicas-1.
+            affinity_slack_seconds (float): a request goes to a replica that has served its speaker unless that replica
+                has more than this many outstanding audio seconds above the least loaded one.
+            cpu_workers (int): threads for run_on_cpu in the router process (wav encoding).
+            max_affinity_keys (int): speakers remembered per replica for affinity.
+            liveness_interval (float): seconds between checks that the worker processes are still alive; requests
+                pending on a worker that exited fail instead of waiting forever.
+        """
+        self.num_replicas = num_replicas
+        self.backend = backend
+        self.engine_kwargs = dict(engine_kwargs or {})
+        self.devices = list(devices) if devices is not None else list(range(num_replicas))
+        assert len(self.devices) >= num_replicas, "need one device per replica"
+        self.affinity_slack_seconds = affinity_slack_seconds
+        self.max_affinity_keys = max_affinity_keys
+        self.liveness_interval = liveness_interval
+
+        self.cpu_executor = PriorityThreadPoolExecutor(max_workers=max(1, cpu_workers), thread_name_prefix="indextts-router-cpu")
+        self.replicas = []
+        self.response_queue = None
+        self.pending = {}
+        self.loop = None
+        self._reader = None
+        self._request_ids = itertools.count()
+        self.stats = {"requests": 0, "affinity_hits": 0, "aborted": 0, "errors": 0, "dead_replicas": 0}
+
+    def start(self, timeout=None):
+        """启动 worker 进程并等待引擎全部加载完成（阻塞）"""
+        ctx = mp.get_context("spawn")
+        self.response_queue = ctx.Queue()
+        for worker_id in range(self.num_replicas):
+            request_queue = ctx.Queue()
+            device = self.devices[worker_id]
+            process = ctx.Process(
+                target=worker_main, name=f"indextts-replica-{worker_id}", daemon=True,
+                args=(worker_id, self.backend, self.engine_kwargs, device, request_queue, self.response_queue),
+            )
+            process.start()
+            self.replicas.append(Replica(worker_id, device, process, request_queue, self.max_affinity_keys))
+
+        ready = set()
+        while len(ready) < self.num_replicas:
+            worker_id, _, kind, payload = self.response_queue.get(timeout=timeout)
+            if kind == "error":
+                self.close()
+                raise RuntimeError(f"replica {worker_id} failed to start:\n{payload}")
+            ready.add(worker_id)
+            print(f">> replica {worker_id} ready (device {self.replicas[worker_id].device}, pid {payload})")
+
+        self._reader = threading.Thread(target=self._read_responses, name="indextts-router-reader", daemon=True)
+        self._reader.start()
+        return self
+
+    def close(self):
+        for replica in self.replicas:
+            replica.alive = False  # 正常退出，不当作 worker 异常退出处理
+            if replica.process.is_alive():
+                replica.request_queue.put(("stop",))
+        for replica in self.replicas:
+            replica.process.join(timeout=10)
+            if replica.process.is_alive():
+                replica.process.terminate()
+        if self.response_queue is not None:
+            self.response_queue.put((None, None, "stop", None))
+        self.cpu_executor.shutdown(wait=False)
+
+    def _read_responses(self):
+        """
+        后台线程：读取所有 worker 的返回，转交给 event loop 上等待它的请求；
+        每隔 liveness_interval 检查一次 worker 进程，已退出的 replica 交给 _mark_dead 处理
+        """
+        while True:
+            try:
+                worker_id, request_id, kind, payload = self.response_queue.get(timeout=self.liveness_interval)
+            except queue_module.Empty:
+                pass
+            else:
+                if kind == "stop":
+                    break
+                if not self._call_in_loop(self._dispatch, request_id, kind, payload):
+                    print(f">> dropped {kind} of request {request_id} from replica {worker_id}: event loop is not running")
+            for replica in self.replicas:
+                if replica.alive and not replica.process.is_alive():
+                    if not self._call_in_loop(self._mark_dead, replica):
+                        self._mark_dead(replica, fail_pending=False)
+
+    def _call_in_loop(self, fn, *args) -> bool:
+        """
+        在 event loop 上执行 fn。还没有 event loop 或它已关闭时不执行，返回 False：
+        此时没有能接收结果的请求，asyncio.Queue 也不能在本线程上写入
+        """
+        loop = self.loop
+        if loop is None:
+            return False
+        try:
+            loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            return False
+        return True
+
+    def _mark_dead(self, replica, fail_pending=True):
+        """
+        worker 进程已退出：不再向它分配请求，仍在等待它的请求立即失败。
+        fail_pending=False 用于没有 event loop 时由读取线程调用，只记录退出，不写入请求的队列
+        """
+        if not replica.alive:
+            return
+        replica.alive = False
+        self.stats["dead_replicas"] += 1
+        message = f"replica {replica.worker_id} exited (exit code {replica.process.exitcode})"
+        if not fail_pending:
+            print(f">> {message}")
+            return
+        print(f">> {message}, failing {len(replica.pending)} pending requests")
+        for request_id in list(replica.pending):
+            self._dispatch(request_id, "error", message)
+
+    def _dispatch(self, request_id, kind, payload):
+        queue = self.pending.get(request_id)
+        if queue is not None:
+            queue.put_nowait((kind, payload))
+
+    def pick_replica(self, affinity_key) -> Replica:
+        """
+        最少未完成工作量优先；合成过该 speaker 的 replica 负载不超过最小值 + affinity_slack_seconds 时优先选它。
+        affinity_key 为 None 的调用与 speaker 无关，只按负载分配，也不记入 affinity
+        """
+        replicas = [replica for replica in self.replicas if replica.alive and replica.process.is_alive()]
+        if not replicas:
+            raise RuntimeError("no replica alive")
+        least = min(replicas, key=lambda replica: (replica.outstanding_seconds, replica.in_flight))
+        if affinity_key is None:
+            return least
+        warm = [replica for replica in replicas if affinity_key in replica.affinity]
+        if warm:
+            best_warm = min(warm, key=lambda replica: (replica.outstanding_seconds, replica.in_flight))
+            if best_warm.outstanding_seconds <= least.outstanding_seconds + self.affinity_slack_seconds:
+                self.stats["affinity_hits"] += 1
+                least = best_warm
+        least.touch(affinity_key)
+        return least
+
+    async def _request(self, method, affinity_key, text, args, kwargs, replica=None, request_id=None):
+        """
+        提交给选中的 replica（指定 replica 时不做路由），依次 yield (kind, payload)；
+        调用方提前退出时通知 worker 取消
+        """
+        self.loop = asyncio.get_running_loop()
+        cost = AdmissionController.estimate_cost(text)
+        if replica is None:
+            replica = self.pick_replica(affinity_key)
+        if request_id is None:
+            request_id = next(self._request_ids)
+        queue = asyncio.Queue()
+        self.pending[request_id] = queue
+        replica.pending.add(request_id)
+        if not replica.alive:
+            # 选中后、登记前 replica 已被判定退出
+            queue.put_nowait(("error", f"replica {replica.worker_id} exited"))
+        replica.outstanding_seconds += cost
+        replica.in_flight += 1
+        replica.requests += 1
+        self.stats["requests"] += 1
+        finished = False
+        try:
+            replica.request_queue.put(("call", request_id, method, args, kwargs))
+            while True:
+                kind, payload = await queue.get()
+                if kind == "error":
+                    finished = True
+                    self.stats["errors"] += 1
+                    raise RuntimeError(f"replica {replica.worker_id} failed:\n{payload}")
+                if kind == "done":
+                    finished = True
+                yield kind, payload
+                if kind == "done":
+                    return
+        finally:
+            self.pending.pop(request_id, None)
+            replica.pending.discard(request_id)
+            replica.outstanding_seconds = max(replica.outstanding_seconds - cost, 0.0)
+            replica.in_flight -= 1
+            if not finished and replica.alive:
+                # 客户端断开 / 超时：在 worker 中取消，进而 abort 其 vllm 请求
+                self.stats["aborted"] += 1
+                replica.request_queue.put(("abort", request_id))
+
+    @staticmethod
+    def _observe_worker_timings(timings, worker_timings):
+        if timings is None or worker_timings is None:
+            return
+        for stage, seconds in worker_timings["stages"].items():
+            timings.observe(stage, seconds)
+        timings.add_mel_tokens(worker_timings["mel_tokens"])
+
+    async def infer_stream(self, speaker, text, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                           priority=PRIORITY_NORMAL, sampling=None):
+        kwargs = {"pad_tail": pad_tail, "seed": seed, "reuse_cache": reuse_cache, "priority": priority, "sampling": sampling}
+        messages = self._request("infer_stream", speaker, text, (speaker, text), kwargs)
+        try:
+            async for kind, payload in messages:
+                if kind == "chunk":
+                    if timings is not None:
+                        timings.add_audio(payload.shape[0])
+                    yield payload
+                else:
+                    self._observe_worker_timings(timings, payload[1])
+        finally:
+            await messages.aclose()
+
+    async def infer_text_stream(self, speaker, fragments, pad_tail=True, seed=None, reuse_cache=False, timings=None,
+                                priority=PRIORITY_NORMAL, sampling=None):
+        """增量文本逐段转发给选中的 replica，由它切分句子并合成"""
+        kwargs = {"pad_tail": pad_tail, "seed": seed, "reuse_cache": reuse_cache, "priority": priority, "sampling": sampling}
+        replica = self.pick_replica(speaker)
+        request_id = next(self._request_ids)
+        messages = self._request("infer_text_stream", speaker, "", (speaker,), kwargs, replica, request_id)
+
+        async def forward_fragments():
+            try:
+                async for fragment in fragments:
+                    replica.request_queue.put(("fragment", request_id, fragment))
+                replica.request_queue.put(("fragment", request_id, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._dispatch(request_id, "error", traceback.format_exc())
+
+        forwarder = asyncio.ensure_future(forward_fragments())
+        try:
+            async for kind, payload in messages:
+                if kind == "chunk":
+                    if timings is not None:
+                        timings.add_audio(payload.shape[0])
+                    yield payload
+                else:
+                    self._observe_worker_timings(timings, payload[1])
+        finally:
+            forwarder.cancel()
+            await messages.aclose()
+
+    async def _call(self, method, affinity_key, text, args, kwargs, timings, replica=None):
+        messages = self._request(method, affinity_key, text, args, kwargs, replica)
+        try:
+            async for kind, payload in messages:
+                if kind == "done":
+                    result, worker_timings = payload
+                    self._observe_worker_timings(timings, worker_timings)
+                    if timings is not None and worker_timings is not None:
+                        timings.add_audio(int(worker_timings["audio_seconds"] * timings.sampling_rate))
+                    return result
+        finally:
+            # 立即释放 replica 的负载计数，而不是等待生成器被垃圾回收
+            await messages.aclose()
+
+    async def infer_with_ref_audio_embed(self, speaker, text, seed=None, reuse_cache=False, timings=None,
+                                         priority=PRIORITY_NORMAL, sampling=None):
+        kwargs = {"seed": seed, "reuse_cache": reuse_cache, "priority": priority, "sampling": sampling}
+        return await self._call("infer_with_ref_audio_embed", speaker, text, (speaker, text), kwargs, timings)
+
+    async def infer(self, audio_prompt=[], text="", output_path=None, verbose=False, seed=None, timings=None,
+                    priority=PRIORITY_NORMAL, sampling=None):
+        # 参考音频的内容（或路径）作为 affinity key，相同参考音频落到同一 replica，命中其 conditioning 缓存
+        h = hashlib.sha256()
+        for ap_ in audio_prompt:
+            h.update(hashlib.sha256(ap_ if isinstance(ap_, (bytes, bytearray)) else str(ap_).encode("utf-8")).digest())
+        kwargs = {"output_path": output_path, "verbose": verbose, "seed": seed, "priority": priority, "sampling": sampling}
+        return await self._call("infer", h.hexdigest(), text, (list(audio_prompt), text), kwargs, timings)
+
+    async def split_text(self, text, priority=PRIORITY_NORMAL):
+        """
+        由负载最少的 replica 切分句子（tokenizer 只在 replica 中加载）。
+        切分只用 tokenizer，与 speaker 无关，各 replica 的结果相同，因此不按 speaker 路由
+        """
+        return await self._call("split_text", None, "", (text,), {"priority": priority}, None)
+
+    async def infer_sentence(self, speaker, sentence, seed=None, timings=None, priority=PRIORITY_BACKGROUND, sampling=None):
+        text = "".join(map(str, sentence))
+        kwargs = {"seed": seed, "priority": priority, "sampling": sampling}
+        return await self._call("infer_sentence", speaker, text, (speaker, sentence), kwargs, timings)
+
+    async def warmup(self, speaker=None, texts=None, rounds=2):
+        """所有 replica 同时预热，返回各 replica 的预热报告"""
+        kwargs = {"speaker": speaker, "texts": texts, "rounds": rounds}
+        reports = await asyncio.gather(*[
+            self._call("warmup", None, "", (), kwargs, None, replica) for replica in self.replicas
+        ])
+        return {
+            "seconds": max(report["seconds"] for report in reports),
+            "replicas": reports,
+        }
+
+    def _broadcast(self, method, *args, **kwargs):
+        for replica in self.replicas:
+            replica.request_queue.put(("broadcast", method, args, kwargs))
+
+    def add_speaker(self, speaker, audio_paths):
+        """各 replica 都登记该 speaker（仍是第一次用到时才加载），路由时按 affinity 优先使用已加载的 replica"""
+        self._broadcast("add_speaker", speaker, list(audio_paths))
+
+    def registry_speaker(self, speaker, audio_paths):
+        self._broadcast("registry_speaker", speaker, list(audio_paths))
+
+    async def run_on_cpu(self, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        return await asyncio.wrap_future(self.cpu_executor.submit(functools.partial(fn, *args, **kwargs), priority=priority))
+
+    def get_abort_stats(self):
+        return {"router_aborted_requests": self.stats["aborted"]}
+
+    def get_stats(self):
+        return {
+            "router": dict(self.stats),
+            "replicas": [replica.get_stats() for replica in self.replicas],
+            "aborts": self.get_abort_stats(),
+        }
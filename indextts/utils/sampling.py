@@ -0,0 +1,59 @@
+import math
+
+from indextts.utils.text_utils import get_text_tts_dur, sentence_text
+
+# gpt 生成 mel token 的默认采样参数；max_tokens 为单个句子的硬上限
+DEFAULT_SAMPLING = {
+    "temperature": 1.0,
+    "top_p": 0.8,
+    "top_k": 30,  # 5, 30
+    "repetition_penalty": 10.0,  # 8.0
+    "max_tokens": 768,  # 605
+}
+# 可由请求覆盖的采样参数及其类型
+SAMPLING_FIELDS = {"temperature": float, "top_p": float, "top_k": int, "repetition_penalty": float}
+
+# 24kHz 音频每 1024 个采样点对应一个 mel token
+MEL_TOKENS_PER_SECOND = 24000 / 1024
+
+
+def parse_sampling(data) -> dict:
+    """
+    从请求（json / 表单）中取出 temperature、top_p、top_k、repetition_penalty，返回覆盖默认值的 dict（可能为空）。
+    取值不合法时抛出 ValueError。
+    """
+    sampling = {}
+    for name, cast in SAMPLING_FIELDS.items():
+        value = data.get(name)
+        if value is None or value == "":
+            continue
+        sampling[name] = cast(value)
+    if sampling.get("temperature", 1.0) < 0:
+        raise ValueError("temperature must be >= 0")
+    if not 0 < sampling.get("top_p", 1.0) <= 1:
+        raise ValueError("top_p must be in (0, 1]")
+    if sampling.get("top_k", -1) == 0 or sampling.get("top_k", -1) < -1:
+        raise ValueError("top_k must be -1 (disabled) or >= 1")
+    if sampling.get("repetition_penalty", 1.0) <= 0:
+        raise ValueError("repetition_penalty must be > 0")
+    return sampling
+
+
+def estimate_max_mel_tokens(sentence, safety_factor=1.5, min_tokens=50, max_tokens=DEFAULT_SAMPLING["max_tokens"]):
+    """
+    单个句子生成的 max_tokens：按最慢语速预估的音频时长 × mel token 速率 × safety_factor，
+    不少于 min_tokens、不超过 max_tokens。失控的生成（不停地输出静音 / 重复）在预算处截断，
+    vllm 为每个序列预留的 KV cache 也随之变小，可同时运行更多序列。
+
+    Args:
+        sentence (list[str] | str): tokens of a sentence (or its text).
+        safety_factor (float): margin over the slowest-speech estimate, <= 0 always returns max_tokens.
+        min_tokens (int): budget floor for very short sentences.
+        max_tokens (int): hard limit.
+    """
+    if safety_factor <= 0:
+        return max_tokens
+    seconds = max(get_text_tts_dur(sentence_text(sentence)))
+    # 另加 2 个 token：停止符及其前一位在输出中被截掉
+    budget = math.ceil(seconds * MEL_TOKENS_PER_SECOND * safety_factor) + 2
+    return int(min(max(budget, min_tokens), max_tokens))
@@ -0,0 +1,71 @@
+import asyncio
+
+
+class Flight:
+    """一个在途的计算：task 与持有它的调用方数"""
+
+    def __init__(self, key, task):
+        self.key = key
+        self.task = task
+        self.holders = 0
+
+
+class SingleFlight:
+    """
+    相同 key 的并发计算只执行一次：第一个调用方启动计算（leader），计算结束前到达的相同 key 加入同一个 task，
+    得到同一个结果（或异常）。
+    flight 在最后一个持有者 leave 之前一直保留，即使 task 已经完成：一个请求还在合成后面的句子时，
+    同时到达的相同请求也能直接拿到它已完成的前几个句子。
+    最后一个持有者离开时 task 仍未完成（所有调用方都已断开）则取消它；
+    失败或被取消的 task 立即移出，之后到达的调用方重新计算。
+    只在 event loop 线程中使用。
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "cancelled": 0}
+
+    def join(self, key, factory) -> Flight:
+        """
+        加入 key 对应的 flight，不存在时以 factory() 返回的 coroutine 启动一个。
+        每次 join 都必须对应一次 leave；等待结果请用 asyncio.shield(flight.task)，单个调用方被取消不影响其他调用方。
+        """
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(key, asyncio.ensure_future(factory()))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda task, flight=flight: self._on_done(flight))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        flight.holders += 1
+        return flight
+
+    def leave(self, flight: Flight) -> bool:
+        """释放一次 join；返回是否因为没有其他持有者而取消了未完成的计算"""
+        flight.holders -= 1
+        if flight.holders > 0:
+            return False
+        self._discard(flight)
+        if not flight.task.done():
+            flight.task.cancel()
+            self.stats["cancelled"] += 1
+            return True
+        return False
+
+    def _on_done(self, flight: Flight):
+        # 成功的结果保留到最后一个持有者离开；失败 / 取消的结果不再分给之后到达的调用方
+        if flight.task.cancelled() or flight.task.exception() is not None:
+            self._discard(flight)
+
+    def _discard(self, flight: Flight):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+    def get_stats(self):
+        joins = self.stats["leaders"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "in_flight": len(self.flights),
+            "coalesce_rate": self.stats["coalesced"] / joins if joins else 0.0,
+        }
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import List
+
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+def audio_content_hash(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def checkpoint_version(*paths) -> str:
+    """
+    模型版本：各权重文件的文件名、大小及首尾 1MB 内容的哈希。
+    与路径、修改时间无关，离线构建的 speaker store 拷贝到其他机器后仍然有效。
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        size = os.path.getsize(path)
+        h.update(f"{os.path.basename(path)}:{size};".encode("utf-8"))
+        with open(path, "rb") as f:
+            h.update(f.read(1 << 20))
+            f.seek(max(size - (1 << 20), 0))
+            h.update(f.read(1 << 20))
+    return h.hexdigest()[:16]
+
+
+class SpeakerStore:
+    """
+    持久化的 speaker 注册结果（speech_conditioning_latent、参考音频 mel、bigvgan speaker embedding），
+    以及 conditioning latent 的 speaker_digest（存在 metadata 中，读取时不必再做 GPU -> CPU 拷贝计算）。
+
+    每个条目一个 safetensors 文件 {store_dir}/{key}.safetensors，key 由模型版本与各参考音频的内容哈希决定，
+    参考音频或模型变化后 key 随之变化，旧条目不会再被读到（可用 tools/speaker_store.py prune 清理）。
+    读取使用 safetensors 的 mmap，只在用到某个 speaker 时才加载。
+    """
+
+    def __init__(self, store_dir, model_version: str):
+        self.store_dir = store_dir
+        self.model_version = model_version
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def entry_key(self, audio_paths: List[str]) -> str:
+        audio_hashes = [audio_content_hash(path) for path in audio_paths]
+        payload = json.dumps({"model_version": self.model_version, "audio": audio_hashes})
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.safetensors")
+
+    def load(self, key: str, device="cpu"):
+        """返回 speaker 条目，不存在时返回 None"""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        # safe_open 通过 mmap 只读取条目中用到的张量，不会先把整个文件读入内存
+        with safe_open(path, framework="pt", device=str(device)) as f:
+            metadata = f.metadata()
+            num_refs = int(metadata["num_refs"])
+            entry = {
+                "auto_conditioning": [f.get_tensor(f"auto_conditioning.{i}") for i in range(num_refs)],
+                "speech_conditioning_latent": f.get_tensor("speech_conditioning_latent"),
+                "speaker_embedding": f.get_tensor("speaker_embedding"),
+            }
+        # 早期写入的条目没有 digest，由调用方重新计算
+        if "digest" in metadata:
+            entry["digest"] = bytes.fromhex(metadata["digest"])
+        return entry
+
+    def save(self, key: str, entry: dict, speaker: str, audio_paths: List[str]):
+        tensors = {
+            "speech_conditioning_latent": entry["speech_conditioning_latent"],
+            "speaker_embedding": entry["speaker_embedding"],
+        }
+        for i, cond_mel in enumerate(entry["auto_conditioning"]):
+            tensors[f"auto_conditioning.{i}"] = cond_mel
+        tensors = {name: tensor.detach().contiguous().cpu() for name, tensor in tensors.items()}
+        metadata = {
+            "speaker": speaker,
+            "model_version": self.model_version,
+            "num_refs": str(len(entry["auto_conditioning"])),
+            "audio_paths": json.dumps([str(path) for path in audio_paths], ensure_ascii=False),
+        }
+        if entry.get("digest") is not None:
+            metadata["digest"] = entry["digest"].hex()
+        # 先写临时文件再替换，避免并发读到写了一半的文件；多个 replica 进程可能共用同一个 store
+        tmp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        save_file(tensors, tmp_path, metadata=metadata)
+        os.replace(tmp_path, self.path(key))
+
+    @staticmethod
+    def read_metadata(path) -> dict:
+        with safe_open(path, framework="pt") as f:
+            return f.metadata() or {}
+
+    def entries(self):
+        """遍历 store 中的所有条目，返回 (key, metadata)"""
+        for name in sorted(os.listdir(self.store_dir)):
+            if name.endswith(".safetensors"):
+                path = os.path.join(self.store_dir, name)
+                yield name[:-len(".safetensors")], self.read_metadata(path)
+
+
+class ConditioningCache:
+    """
+    按参考音频内容哈希索引的 speaker 条目 LRU，用于 /tts_url 这类每次请求都带参考音频的场景。
+    条目与 IndexTTS.compute_speaker 的返回值相同（auto_conditioning、speech_conditioning_latent、speaker_embedding）。
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(audio_bytes_list) -> str:
+        h = hashlib.sha256()
+        for audio_bytes in audio_bytes_list:
+            h.update(hashlib.sha256(audio_bytes).digest())
+        return h.hexdigest()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, entry: dict):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self.entries)
+        return stats
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def make_sentence_key(speaker: str, text_tokens, seed, sampling_params: dict, model_fingerprint: str) -> str:
+    """句子级缓存的 key：(speaker, 归一化后的句子 token ids, seed, 采样参数, 模型指纹) 的 sha256"""
+    payload = json.dumps({
+        "speaker": speaker,
+        "text_tokens": [int(t) for t in text_tokens],
+        "seed": seed,
+        "sampling_params": sampling_params,
+        "model": model_fingerprint,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(*paths) -> str:
+    """由权重文件的路径、大小与修改时间得到模型指纹，换模型后旧缓存自动失效"""
+    h = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        h.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class SentenceCache:
+    """
+    句子级合成结果缓存，值为 int16 PCM (n, 1)。
+
+    内存层为按字节数限制的 LRU；指定 disk_dir 时增加磁盘层，以 .npy 文件保存，读取时使用 mmap。
+    内存未命中时查询磁盘层，磁盘命中的结果会放回内存层。
+    get / put 在 event loop 中调用；在 event loop 中使用磁盘层时，依次调用 get_memory、在线程池中执行 read_disk、
+    再调用 finish_lookup，磁盘 IO 不阻塞 event loop。磁盘写入 write_disk 同样放到线程池执行。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None, disk_max_bytes=None):
+        """
+        Args:
+            max_bytes (int): max total bytes of PCM kept in memory, 0 disables the memory tier.
+            disk_dir (str | None): directory of the on-disk tier, None disables it.
+            disk_max_bytes (int | None): max total bytes on disk, oldest files are removed first. None means unbounded.
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self._disk_lock = threading.Lock()
+        self.disk_bytes = 0
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.disk_bytes = sum(os.path.getsize(path) for path in self._disk_files())
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def get(self, key: str):
+        wav = self.get_memory(key)
+        if wav is not None:
+            return wav
+        return self.finish_lookup(key, self.read_disk(key))
+
+    def get_memory(self, key: str):
+        """只查询内存层，命中时计数；未命中返回 None 且不计数（由 finish_lookup 计入）"""
+        wav = self.entries.get(key)
+        if wav is not None:
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return wav
+
+    def read_disk(self, key: str):
+        """读取磁盘层（mmap），不修改内存层与统计，可在线程池中执行"""
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def finish_lookup(self, key: str, wav):
+        """记录内存未命中后的查询结果：磁盘命中时放回内存层"""
+        if wav is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._put_memory(key, wav)
+        return wav
+
+    def put(self, key: str, wav: np.ndarray):
+        """写入内存层；磁盘层需另外调用 write_disk"""
+        self.stats["puts"] += 1
+        self._put_memory(key, wav)
+
+    def write_disk(self, key: str, wav: np.ndarray):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(wav))
+        os.replace(tmp_path, path)
+        with self._disk_lock:
+            self.disk_bytes += os.path.getsize(path)
+            if self.disk_max_bytes is not None and self.disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["entries"] = len(self.entries)
+        stats["bytes"] = self.bytes
+        stats["disk_bytes"] = self.disk_bytes
+        return stats
+
+    def _put_memory(self, key, wav):
+        if wav.nbytes > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key).nbytes
+        self.entries[key] = wav
+        self.bytes += wav.nbytes
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".npy"):
+                    yield os.path.join(root, name)
+
+    def _evict_disk(self):
+        # 按修改时间从旧到新删除，直到回到上限的 90%
+        files = sorted(self._disk_files(), key=os.path.getmtime)
+        for path in files:
+            if self.disk_bytes <= self.disk_max_bytes * 0.9:
+                break
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.disk_bytes -= size
+            self.stats["disk_evictions"] += 1
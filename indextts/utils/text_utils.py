@@ -38,4 +38,11 @@ def get_text_tts_dur(text):
     max_dur = syllable_num * ratio / max_speed
     min_dur = syllable_num * ratio / min_speed
 
-    return max_dur, min_dur
\ No newline at end of file
+    return max_dur, min_dur
+
+
+def sentence_text(sentence) -> str:
+    """切分出的句子（token 列表或字符串）对应的文本，用于预估音频时长"""
+    if isinstance(sentence, str):
+        return sentence
+    return "".join(str(token) for token in sentence).replace("▁", " ")
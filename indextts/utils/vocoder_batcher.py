@@ -0,0 +1,78 @@
+import numpy as np
+import torch
+
+from indextts.utils.micro_batcher import MicroBatcher
+from indextts.utils.priority import PRIORITY_NORMAL
+
+
+def get_hop_length(bigvgan) -> int:
+    """bigvgan 每个 latent 帧对应的输出采样点数"""
+    h = bigvgan.h
+    hop_length = int(np.prod(h.upsample_rates))
+    if h.feat_upsample:
+        hop_length *= 4
+    return hop_length
+
+
+class VocoderBatcher(MicroBatcher):
+    """
+    跨请求的 bigvgan 微批调度器。
+
+    帧数落在同一个长度桶（bucket_frames 帧一档）内的 latent 合成一个 batch：较短的 latent 重复最后一帧补齐到
+    batch 内最长的长度，带上各自的 speaker embedding 只跑一次 BigVGAN.forward，再按 hop_length 把波形切回每个请求。
+    补齐只影响每条 latent 末尾感受野内（几帧到十几帧）的输出；重复最后一帧而不是补零，
+    避免 conv_pre 的 bias 与 cond_layer 在补零处产生的突变扩散回有效部分。batch 内最长的一条与逐条合成完全一致。
+    """
+
+    def __init__(self, bigvgan, max_batch_size=8, max_batch_frames=4096, max_wait_ms=5.0, executor=None, output_device=None,
+                 bucket_frames=32):
+        """
+        Args:
+            bigvgan: BigVGAN generator.
+            max_batch_size (int): max number of items vocoded in one forward.
+            max_batch_frames (int): max padded latent frames (batch size * longest item) per forward.
+            max_wait_ms (float): max time the first queued item waits for others to join its batch.
+            executor (concurrent.futures.Executor | None): executor running the bigvgan forward.
+            output_device (str | None): device the batch waveform is copied to (once per batch), e.g. "cpu".
+            bucket_frames (int): width of the latent length buckets, items of one bucket are padded to a common
+                length and vocoded together; 0 only batches latents of exactly the same length (no padding).
+        """
+        super().__init__(max_batch_size, max_batch_frames, max_wait_ms, executor)
+        self.bigvgan = bigvgan
+        self.hop_length = get_hop_length(bigvgan)
+        self.output_device = output_device
+        self.bucket_frames = bucket_frames
+
+    async def vocode(self, latent: torch.Tensor, speaker_embedding: torch.Tensor, priority=PRIORITY_NORMAL) -> torch.Tensor:
+        """
+        Args:
+            latent: (1, t, gpt_dim)
+            speaker_embedding: (1, 1, speaker_embedding_dim)
+            priority (int): queueing priority, see indextts.utils.priority.
+        Returns:
+            bigvgan 输出的波形 (1, t * hop_length)
+        """
+        return await self.submit((latent, speaker_embedding), latent.shape[1], priority)
+
+    def batch_key(self, item):
+        if self.bucket_frames <= 0:
+            return item.num_frames
+        return (item.num_frames - 1) // self.bucket_frames
+
+    @staticmethod
+    def pad_latent(latent, num_frames):
+        """重复最后一帧，把 latent (1, t, dim) 补齐到 num_frames 帧"""
+        if latent.shape[1] >= num_frames:
+            return latent
+        return torch.cat([latent, latent[:, -1:].expand(-1, num_frames - latent.shape[1], -1)], dim=1)
+
+    @torch.no_grad()
+    def forward(self, batch):
+        max_frames = max(item.num_frames for item in batch)
+        latent = torch.cat([self.pad_latent(item.inputs[0], max_frames) for item in batch], dim=0)
+        speaker_embedding = torch.cat([item.inputs[1] for item in batch], dim=0)
+        wav, _ = self.bigvgan(latent, None, speaker_embedding=speaker_embedding)
+        wav = wav.squeeze(1)
+        if self.output_device is not None:
+            wav = wav.to(self.output_device)
+        return [wav[i:i + 1, :item.num_frames * self.hop_length] for i, item in enumerate(batch)]
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+import traceback
+
+from indextts.utils.metrics import RequestTimings
+from indextts.utils.priority import PRIORITY_BACKGROUND
+
+# 按长度分桶的预热文本：单句、几句、多句长段落，覆盖中文、英文与数字的文本归一化
+DEFAULT_WARMUP_TEXTS = [
+    "你好。",
+    "欢迎使用语音合成服务，今天是二零二四年三月五日。",
+    "The quick brown fox jumps over the lazy dog, 123 times.",
+    "大家好，我是一个语音合成模型。接下来我会读一段比较长的文字，用来测试多个句子同时生成时的速度。"
+    "如果你能听到这段话，说明服务已经准备好了。最后，祝你有美好的一天！",
+]
+
+
+def load_warmup_texts(path):
+    """每行一条预热文本，空行忽略"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def run_warmup(tts, speaker=None, texts=None, rounds=2):
+    """
+    启动预热：用各长度的假文本走一遍完整的合成流程（文本归一化、conditioning、vllm prefill / decode、
+    latent、bigvgan、int16 编码），让 CUDA context、cuDNN autotune、vllm 的各 batch 形状与显存分配器
+    在真实请求到来前完成初始化。
+    第一轮逐条执行（batch 为 1 的路径），之后各轮所有文本并发执行（跨请求合批的路径）。
+    不使用句子级缓存，计时不写入 prometheus。
+
+    Args:
+        tts: IndexTTS, or an engine with the same interface (StubTTS).
+        speaker (str | None): registered speaker used for synthesis, None uses infer() with the default reference audio.
+        texts (list[str] | None): warmup texts, None uses DEFAULT_WARMUP_TEXTS.
+        rounds (int): number of rounds, the first one sequential and the rest concurrent.
+    Returns:
+        dict: total seconds and per-round / per-text timing.
+    """
+    texts = list(texts or DEFAULT_WARMUP_TEXTS)
+
+    async def synthesize(text):
+        timings = RequestTimings(priority=PRIORITY_BACKGROUND, record_metrics=False)
+        start_time = time.perf_counter()
+        if speaker is not None:
+            await tts.infer_with_ref_audio_embed(speaker, text, timings=timings, priority=PRIORITY_BACKGROUND)
+        else:
+            await tts.infer([], text, timings=timings, priority=PRIORITY_BACKGROUND)
+        timings.finish()
+        return {
+            "chars": len(text),
+            "seconds": round(time.perf_counter() - start_time, 3),
+            "audio_seconds": round(timings.audio_seconds, 3),
+        }
+
+    report = {"speaker": speaker, "texts": len(texts), "rounds": []}
+    start_time = time.perf_counter()
+    for i in range(max(1, rounds)):
+        round_start = time.perf_counter()
+        if i == 0:
+            items = [await synthesize(text) for text in texts]
+        else:
+            items = await asyncio.gather(*[synthesize(text) for text in texts])
+        round_seconds = time.perf_counter() - round_start
+        report["rounds"].append({
+            "mode": "sequential" if i == 0 else "concurrent",
+            "seconds": round(round_seconds, 3),
+            "items": list(items),
+        })
+        item_seconds = ", ".join(f"{item['seconds']:.2f}s" for item in items)
+        print(f">> warmup round {i + 1}: {round_seconds:.2f}s ({item_seconds})")
+    report["seconds"] = round(time.perf_counter() - start_time, 3)
+    return report
+
+
+def select_warmup_speaker(speakers, requested=None):
+    """
+    选择预热使用的 speaker：参考音频都存在的才可用；指定的 speaker 不可用时给出警告并改用第一个可用的。
+    没有可用的 speaker 时返回 None（用默认参考音频走 infer）。
+
+    Args:
+        speakers (dict): speaker name -> reference audio paths.
+        requested (str | None): speaker given by --warmup_speaker.
+    """
+    usable = [speaker for speaker, audio_paths in speakers.items()
+              if audio_paths and all(os.path.exists(path) for path in audio_paths)]
+    if requested is not None:
+        if requested in usable:
+            return requested
+        reason = "not registered" if requested not in speakers else "missing reference audio"
+        print(f">> WARNING: warmup speaker {requested!r} is not usable ({reason}), falling back")
+    return usable[0] if usable else None
+
+
+async def run_startup_warmup(tts, state, speaker=None, texts=None, rounds=2, attempts=3, backoff_seconds=5.0):
+    """
+    服务启动时在后台执行预热，结果写入 state（/ready 据此判断）。
+    失败时按 backoff_seconds、2 * backoff_seconds …… 等待后重试，共 attempts 次；
+    全部失败时状态为 failed，服务仍然就绪（预热只影响首批请求的延迟），错误保留在 state 中供 /ready 展示。
+
+    Args:
+        tts: IndexTTS, ReplicaRouter or StubTTS.
+        state (dict): warmup state shared with /ready; status becomes running, then done or failed.
+        attempts (int): max number of warmup attempts.
+        backoff_seconds (float): wait before the first retry, doubled after each failure.
+    """
+    state.update({"status": "running", "speaker": speaker, "started_at": time.time(), "attempts": 0, "errors": []})
+    for attempt in range(max(1, attempts)):
+        if attempt > 0:
+            delay = backoff_seconds * 2 ** (attempt - 1)
+            print(f">> warmup attempt {attempt} failed, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        state["attempts"] = attempt + 1
+        try:
+            report = await tts.warmup(speaker=speaker, texts=texts, rounds=rounds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            state["errors"].append(str(ex))
+            traceback.print_exc()
+            continue
+        state.update({"status": "done", "report": report})
+        print(f">> warmup done in {report['seconds']:.2f}s")
+        break
+    else:
+        state.update({"status": "failed", "error": state["errors"][-1]})
+        print(f">> WARNING: warmup failed after {state['attempts']} attempts, serving without warmup")
+    state["finished_at"] = time.time()
+    return state
@@ -0,0 +1,105 @@
+# file: event_loop_lag_test.py
+# 并发压测时持续探测 /health 的响应时延，用来观察服务端 event loop 是否被同步计算阻塞。
+# /health 不做任何计算，它的时延近似于 event loop 的调度延迟：空载与满载下的直方图应基本一致。
+# 用法: python test/event_loop_lag_test.py --url http://127.0.0.1:11996 --character 67a0410a81974dbb94a51c211aee2499 --concurrency 16
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import numpy as np
+import pyrootutils
+
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+# 直方图分桶（毫秒）
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+
+
+def load_lines(path):
+    lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line:
+                lines.append(json.loads(line) if line.startswith('"') else line)
+    return lines
+
+
+async def probe_health(session, base_url, stop_event, interval=0.02):
+    """每 interval 秒请求一次 /health，返回各次时延（毫秒）"""
+    latencies = []
+    while not stop_event.is_set():
+        start_time = time.perf_counter()
+        async with session.get(f"{base_url}/health") as response:
+            await response.read()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def tts_worker(session, base_url, character, lines, num_requests, results):
+    for i in range(num_requests):
+        payload = {"text": lines[i % len(lines)], "character": character}
+        start_time = time.perf_counter()
+        async with session.post(f"{base_url}/tts", json=payload) as response:
+            await response.read()
+            results.append((response.status, time.perf_counter() - start_time))
+
+
+def print_histogram(name, latencies):
+    latencies = np.array(latencies)
+    print(f"\n{name}: {len(latencies)} probes, "
+          f"p50 {np.percentile(latencies, 50):.1f} ms, p90 {np.percentile(latencies, 90):.1f} ms, "
+          f"p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms")
+    lower = 0
+    for upper in BUCKETS_MS:
+        count = int(((latencies >= lower) & (latencies < upper)).sum())
+        label = f"{lower:>5}-{upper:<5}" if upper != float("inf") else f"{lower:>5}+     "
+        print(f"  {label} ms | {count:6d} | {'#' * int(60 * count / len(latencies))}")
+        lower = upper
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:11996")
+    parser.add_argument("--character", type=str, default="67a0410a81974dbb94a51c211aee2499")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests_per_worker", type=int, default=4)
+    parser.add_argument("--idle_seconds", type=float, default=5.0)
+    parser.add_argument("--lines", type=str, default=str(ROOT / "test/lines.txt"))
+    args = parser.parse_args()
+    lines = load_lines(args.lines)
+
+    timeout = aiohttp.ClientTimeout(total=3600)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        # 空载基线
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(session, args.url, stop_event))
+        await asyncio.sleep(args.idle_seconds)
+        stop_event.set()
+        idle_latencies = await probe
+
+        # 并发压测
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(session, args.url, stop_event))
+        results = []
+        start_time = time.perf_counter()
+        await asyncio.gather(*[
+            tts_worker(session, args.url, args.character, lines[i:] + lines[:i], args.requests_per_worker, results)
+            for i in range(args.concurrency)
+        ])
+        elapsed_time = time.perf_counter() - start_time
+        stop_event.set()
+        load_latencies = await probe
+
+    ok = [t for status, t in results if status == 200]
+    print(f"\n{len(ok)}/{len(results)} tts requests succeeded in {elapsed_time:.2f}s, "
+          f"avg latency {np.mean(ok) if ok else 0:.2f}s")
+    print_histogram("/health latency, idle", idle_latencies)
+    print_histogram(f"/health latency, {args.concurrency} concurrent tts workers", load_latencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
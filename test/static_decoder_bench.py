@@ -0,0 +1,90 @@
+# file: static_decoder_bench.py
+# 非 vllm 路径的 gpt 生成在 CPU 上的吞吐对比：HF generate（UnifiedVoice.inference_speech）与预分配 KV cache 的
+# StaticKVDecoder（eager / torch.compile）。使用贪心解码，两者生成的 codes 应完全相同，latent 的差异只来自数值误差。
+# 默认使用随机权重的小模型；指定 --model_dir 时按 config.yaml 加载实际的 gpt 权重。
+# 用法: python test/static_decoder_bench.py --max_tokens 200 --runs 3 [--model_dir checkpoints] [--compile]
+import argparse
+import os
+import time
+
+import pyrootutils
+import torch
+
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from indextts.gpt.model import UnifiedVoice
+from indextts.gpt.static_decoder import StaticKVDecoder
+
+SMALL_CONFIG = dict(
+    layers=8, model_dim=512, heads=8, max_text_tokens=120, max_mel_tokens=250, number_text_tokens=256,
+    condition_num_latent=32,
+    condition_module=dict(output_size=512, linear_units=2048, attention_heads=8, num_blocks=2, input_layer="conv2d2",
+                          perceiver_mult=2),
+)
+
+
+def load_model(model_dir):
+    if model_dir is None:
+        torch.manual_seed(0)
+        return UnifiedVoice(**SMALL_CONFIG)
+    from omegaconf import OmegaConf
+    from indextts.utils.checkpoint import load_checkpoint
+    cfg = OmegaConf.load(os.path.join(model_dir, "config.yaml"))
+    model = UnifiedVoice(**cfg.gpt)
+    load_checkpoint(model, os.path.join(model_dir, cfg.gpt_checkpoint))
+    return model
+
+
+def run(generate, conditioning, text_tokens, max_tokens, runs):
+    """返回最后一次的 (codes, latent) 与平均每秒生成的 token 数"""
+    kwargs = dict(do_sample=False, repetition_penalty=10.0, num_return_sequences=1, max_generate_length=max_tokens)
+    with torch.no_grad():
+        generate(conditioning, text_tokens, **kwargs)  # warmup（含编译）
+        num_tokens, seconds = 0, 0.0
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            codes, latent = generate(conditioning, text_tokens, **kwargs)
+            seconds += time.perf_counter() - start_time
+            num_tokens += codes.shape[1] + 1  # codes 不含第一个生成的 token
+    return codes, latent, num_tokens / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", type=str, default=None, help="含 config.yaml 与 gpt 权重的目录，不指定则使用随机权重的小模型")
+    parser.add_argument("--text_tokens", type=int, default=30, help="句子的文本 token 数")
+    parser.add_argument("--max_tokens", type=int, default=200, help="每次生成的 mel token 上限")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU 线程数")
+    parser.add_argument("--compile", action="store_true", default=False, help="同时测试 torch.compile 编译的 decode 步")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = load_model(args.model_dir)
+    model.post_init_gpt2_config()
+    model.eval()
+    generator = torch.Generator().manual_seed(1)
+    conditioning = torch.randn(1, model.cond_num, model.model_dim, generator=generator) * 0.1
+    text_tokens = torch.randint(2, model.number_text_tokens, (1, args.text_tokens), generator=generator)
+
+    engines = [("hf generate", model.inference_speech), ("static", StaticKVDecoder(model).generate)]
+    if args.compile:
+        engines.append(("static + compile", StaticKVDecoder(model, compile=True).generate))
+
+    results = {}
+    for name, generate in engines:
+        results[name] = run(generate, conditioning, text_tokens, args.max_tokens, args.runs)
+        print(f"{name:>16}: {results[name][2]:8.1f} tokens/s")
+
+    hf_codes, hf_latent, hf_speed = results["hf generate"]
+    for name, (codes, latent, speed) in results.items():
+        if name == "hf generate":
+            continue
+        same_codes = torch.equal(codes, hf_codes)
+        latent_diff = (latent - hf_latent).abs().max().item() if latent.shape == hf_latent.shape else float("nan")
+        print(f"{name:>16}: {speed / hf_speed:.2f}x, codes identical: {same_codes}, max latent diff: {latent_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
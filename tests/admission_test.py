@@ -0,0 +1,65 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+
+from indextts.utils.admission import AdmissionController, AdmissionRejected
+
+# 准入控制：超出预算时拒绝并给出 Retry-After，或在 defer 时间内等待空位
+# 用法: python tests/admission_test.py
+
+
+def test_estimate_cost():
+    short = AdmissionController.estimate_cost("你好")
+    long = AdmissionController.estimate_cost("你好，这是一个模型加载和说话人注册的测试。" * 4)
+    assert 0 < short < long, (short, long)
+
+
+async def check_reject():
+    admission = AdmissionController(max_outstanding_seconds=10.0, initial_throughput=5.0)
+    # 空闲时超长请求也会被接收
+    big = await admission.acquire(30.0)
+    try:
+        await admission.acquire(1.0)
+        raise AssertionError("should be rejected")
+    except AdmissionRejected as ex:
+        # 超出 21 秒，按 5 秒/秒的吞吐量约 5 秒后重试
+        assert ex.retry_after == 5, ex.retry_after
+        assert ex.status["in_flight"] == 1 and ex.status["rejected"] == 1, ex.status
+    await admission.release(big)
+    await admission.release(big)  # 重复释放无副作用
+
+    tickets = [await admission.acquire(4.0), await admission.acquire(4.0)]
+    assert admission.status()["outstanding_audio_seconds"] == 8.0
+    for ticket in tickets:
+        await admission.release(ticket)
+    assert admission.status()["in_flight"] == 0 and admission.outstanding_seconds == 0.0
+
+
+async def check_max_requests_and_defer():
+    admission = AdmissionController(max_outstanding_seconds=100.0, max_requests=1, max_defer_seconds=2.0)
+    first = await admission.acquire(1.0)
+
+    async def release_later():
+        await asyncio.sleep(0.1)
+        await admission.release(first)
+
+    asyncio.ensure_future(release_later())
+    second = await admission.acquire(1.0)  # 等到 first 释放后被接收
+    assert admission.stats["deferred"] == 1 and admission.in_flight == 1
+
+    admission.max_defer_seconds = 0.05
+    admission.initial_throughput = 100.0
+    try:
+        await admission.acquire(1.0)
+        raise AssertionError("should be rejected after waiting")
+    except AdmissionRejected:
+        pass
+    await admission.release(second)
+    assert admission.stats["admitted"] == 2 and admission.stats["rejected"] == 1, admission.stats
+
+
+if __name__ == "__main__":
+    test_estimate_cost()
+    asyncio.run(check_reject())
+    asyncio.run(check_max_requests_and_defer())
+    print("admission test passed")
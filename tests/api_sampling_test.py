@@ -0,0 +1,27 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+from fastapi.testclient import TestClient
+
+import api_server
+
+# 不合法的采样参数返回 400 与错误信息，而不是 500 与 traceback；校验在合成之前，不需要加载模型
+# 用法: python tests/api_sampling_test.py
+
+
+def test_invalid_sampling_returns_400():
+    client = TestClient(api_server.app)
+    for route, payload in [
+        ("/tts", {"text": "你好。", "character": "alice", "temperature": -1}),
+        ("/tts", {"text": "你好。", "character": "alice", "top_p": 1.5}),
+        ("/tts_url", {"text": "你好。", "audio_paths": [], "top_k": 0}),
+        ("/audio/speech", {"input": "你好。", "voice": "alice", "model": "tts-1", "temperature": "hot"}),
+    ]:
+        response = client.post(route, json=payload)
+        assert response.status_code == 400, (route, response.status_code, response.text)
+        body = response.json()
+        assert body["status"] == "error" and "Traceback" not in body["error"], body
+
+
+if __name__ == "__main__":
+    test_invalid_sampling_returns_400()
+    print("api sampling test passed")
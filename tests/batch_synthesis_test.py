@@ -0,0 +1,62 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import json
+import os
+import tempfile
+
+from indextts.utils.batch_synthesis import Manifest, bucket_jobs, load_jobs, run_batch
+from indextts.utils.replica_router import StubTTS
+
+# 批量离线合成：输入解析、按长度分桶排序、manifest 记录与断点续跑（用 StubTTS 在 CPU 上运行）
+# 用法: python tests/batch_synthesis_test.py
+
+LINES = ["你好。", "这是一个比较长的句子，用来测试分桶排序是否把它放在前面。第二句。", "中等长度的句子在这里。"]
+
+
+def test_load_and_bucket():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tsv_path = os.path.join(tmp_dir, "lines.txt")
+        with open(tsv_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(LINES) + "\n\n")
+        jobs = load_jobs(tsv_path, "out", default_speaker="alice", default_seed=8)
+        assert [job.id for job in jobs] == ["000000", "000001", "000002"]
+        assert jobs[0].output_path == os.path.join("out", "000000.wav") and jobs[0].seed == 8
+
+        jsonl_path = os.path.join(tmp_dir, "lines.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "a", "text": LINES[0], "speaker": "bob", "output": "x.wav", "seed": 3}) + "\n")
+        job = load_jobs(jsonl_path, "out", default_speaker="alice")[0]
+        assert (job.id, job.speaker, job.output_path, job.seed) == ("a", "bob", "x.wav", 3)
+
+    ordered = bucket_jobs(jobs, bucket_seconds=0.5)
+    assert [job.id for job in ordered] == ["000001", "000002", "000000"]
+
+
+def test_run_and_resume():
+    tts = StubTTS(seconds_per_char=0.001)
+    tts.add_speaker("alice", [])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "lines.txt")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(LINES))
+        manifest_path = os.path.join(tmp_dir, "manifest.jsonl")
+        jobs = load_jobs(input_path, tmp_dir, default_speaker="alice")
+
+        stats = asyncio.run(run_batch(tts, jobs, Manifest(manifest_path), concurrency=2, writers=2))
+        assert stats["done"] == 3 and stats["failed"] == 0 and stats["skipped"] == 0, stats
+        assert stats["audio_seconds"] > 0 and stats["audio_seconds_per_second"] > 0
+        assert all(os.path.exists(job.output_path) for job in jobs)
+        records = [json.loads(line) for line in open(manifest_path, encoding="utf-8")]
+        assert len(records) == 3 and all(record["status"] == "ok" and record["rtf"] is not None for record in records)
+
+        # 删除一个输出后重新运行，只合成缺失的那一个
+        os.remove(jobs[1].output_path)
+        stats = asyncio.run(run_batch(tts, jobs, Manifest(manifest_path), concurrency=2, writers=2))
+        assert stats["done"] == 1 and stats["skipped"] == 2, stats
+
+
+if __name__ == "__main__":
+    test_load_and_bucket()
+    test_run_and_resume()
+    print("batch synthesis test passed")
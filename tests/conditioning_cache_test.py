@@ -0,0 +1,101 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+from indextts.infer_vllm import IndexTTS
+from indextts.utils.speaker_store import ConditioningCache
+
+# 参考音频 conditioning 缓存：LRU 淘汰、按内容哈希命中，以及 conditioning_cache_size=0 时不缓存
+# IndexTTS.get_reference_speaker 使用替身对象执行，不加载模型
+# 用法: python tests/conditioning_cache_test.py
+
+
+def test_lru_eviction():
+    cache = ConditioningCache(max_entries=2)
+    cache.put("a", {"name": "a"})
+    cache.put("b", {"name": "b"})
+    assert cache.get("a")["name"] == "a"  # a 变为最近使用
+    cache.put("c", {"name": "c"})  # 淘汰最久未使用的 b
+    assert cache.get("b") is None
+    assert cache.get("a")["name"] == "a" and cache.get("c")["name"] == "c"
+    stats = cache.get_stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1 and stats["evictions"] == 1 and stats["entries"] == 2, stats
+    assert stats["hit_rate"] == 0.75, stats
+
+
+def test_content_key():
+    # key 只取决于音频内容与顺序，与文件路径无关；各段分别哈希，拼接边界不同的内容不会冲突
+    assert ConditioningCache.make_key([b"ab", b"c"]) == ConditioningCache.make_key([b"ab", b"c"])
+    assert ConditioningCache.make_key([b"ab", b"c"]) != ConditioningCache.make_key([b"a", b"bc"])
+    assert ConditioningCache.make_key([b"ab", b"c"]) != ConditioningCache.make_key([b"c", b"ab"])
+
+
+def make_stub_tts(conditioning_cache_size):
+    """只提供 IndexTTS.get_reference_speaker 用到的属性与方法"""
+    computed = []
+
+    async def run_inline(fn, *args, priority=None, **kwargs):
+        return fn(*args, **kwargs)
+
+    def compute_speaker(cond_mels):
+        computed.append(cond_mels)
+        return {"speech_conditioning_latent": f"latent-{len(computed)}", "speaker_embedding": "embedding"}
+
+    tts = SimpleNamespace(
+        conditioning_cache=ConditioningCache(conditioning_cache_size),
+        run_on_cpu=run_inline,
+        run_on_gpu=run_inline,
+        read_references=IndexTTS.read_references,
+        load_cond_mels=lambda references: [f"mel-{len(reference)}" for reference in references],
+        compute_speaker=compute_speaker,
+    )
+    return tts, computed
+
+
+def test_reference_speaker_hit():
+    tts, computed = make_stub_tts(conditioning_cache_size=4)
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for name in ["a.wav", "copy_of_a.wav"]:
+            paths.append(f"{root}/{name}")
+            with open(paths[-1], "wb") as f:
+                f.write(b"reference audio a")
+
+        async def lookups():
+            # 同一音频：文件路径、另一个路径下的相同内容、直接上传的 bytes 都命中同一条目
+            first = await IndexTTS.get_reference_speaker(tts, [paths[0]])
+            second = await IndexTTS.get_reference_speaker(tts, [paths[1]])
+            third = await IndexTTS.get_reference_speaker(tts, [b"reference audio a"])
+            other = await IndexTTS.get_reference_speaker(tts, [b"reference audio b"])
+            return first, second, third, other
+
+        first, second, third, other = asyncio.run(lookups())
+    assert first[0] == second[0] == third[0] != other[0]
+    assert first[1] is second[1] is third[1]
+    assert len(computed) == 2, computed
+    stats = tts.conditioning_cache.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["entries"] == 2, stats
+
+
+def test_reference_speaker_bypass():
+    tts, computed = make_stub_tts(conditioning_cache_size=0)
+
+    async def lookups():
+        return [await IndexTTS.get_reference_speaker(tts, [b"reference audio a"]) for _ in range(3)]
+
+    results = asyncio.run(lookups())
+    # 不缓存：每次都重新计算，key 仍按内容计算
+    assert len(computed) == 3 and len({key for key, _ in results}) == 1
+    assert len({entry["speech_conditioning_latent"] for _, entry in results}) == 3
+    stats = tts.conditioning_cache.get_stats()
+    assert stats["hits"] == 0 and stats["entries"] == 0 and stats["evictions"] == 0, stats
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_content_key()
+    test_reference_speaker_hit()
+    test_reference_speaker_bypass()
+    print("conditioning cache test passed")
@@ -0,0 +1,74 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import torch
+
+from indextts.gpt.early_stop import SILENT_MEL_TOKEN, EarlyStopProcessor, long_silence_keep_mask
+
+# 连续静音 / 重复循环的提前停止，以及向量化的长静音过滤
+# 用法: python tests/early_stop_test.py
+
+STOP = 8193
+
+
+def reference_keep(codes, silent_token, max_consecutive):
+    """原 remove_long_silence 中逐个 token 的实现"""
+    keep = []
+    counter = 0
+    for token in codes:
+        counter = counter + 1 if token == silent_token else 0
+        keep.append(counter <= max_consecutive)
+    return keep
+
+
+def test_keep_mask():
+    generator = torch.Generator().manual_seed(0)
+    for _ in range(50):
+        # 大量静音 token，随机长度的静音段
+        codes = torch.randint(0, 4, (200,), generator=generator)
+        codes = torch.where(codes == 0, torch.tensor(100), torch.tensor(SILENT_MEL_TOKEN))
+        for max_consecutive in [0, 3, 15]:
+            mask = long_silence_keep_mask(codes, SILENT_MEL_TOKEN, max_consecutive)
+            assert mask.tolist() == reference_keep(codes.tolist(), SILENT_MEL_TOKEN, max_consecutive)
+    assert long_silence_keep_mask([]).tolist() == []
+
+
+def run(processor, tokens):
+    """逐步喂入 tokens，返回被强制停止时的步数"""
+    for step in range(len(tokens) + 1):
+        logits = torch.zeros(8194)
+        logits = processor(tokens[:step], logits)
+        if processor.reason is not None:
+            assert logits.argmax().item() == STOP and torch.isinf(logits[0])
+            return step
+    return None
+
+
+def test_processor():
+    # 正常的序列不触发
+    generator = torch.Generator().manual_seed(1)
+    normal = torch.randint(0, 8192, (300,), generator=generator).tolist()
+    processor = EarlyStopProcessor(STOP, max_tokens=768)
+    assert run(processor, normal) is None and processor.steps_saved == 0
+
+    # 连续 30 个静音 token
+    processor = EarlyStopProcessor(STOP, max_tokens=768)
+    assert run(processor, normal[:20] + [SILENT_MEL_TOKEN] * 40) == 50
+    assert processor.reason == "silence" and processor.trim_to is None
+    assert processor.steps_saved == 768 - 50 - 1
+
+    # 周期为 3 的循环：只保留第一个周期
+    processor = EarlyStopProcessor(STOP, max_tokens=768)
+    loop = [7, 8, 9] * 30
+    assert run(processor, normal[:20] + loop) == 20 + 48
+    assert processor.reason == "repetition"
+    assert processor.trim_to == 20 + 3, processor.trim_to
+
+    # 关闭检测
+    processor = EarlyStopProcessor(STOP, max_tokens=768, max_silent_tokens=0, max_loop_period=0)
+    assert run(processor, [SILENT_MEL_TOKEN] * 100) is None
+
+
+if __name__ == "__main__":
+    test_keep_mask()
+    test_processor()
+    print("early stop test passed")
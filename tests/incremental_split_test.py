@@ -0,0 +1,68 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from indextts.utils.front import IncrementalSentenceSplitter, TextTokenizer
+
+# 增量句子切分：文本逐段到达时，句末标点一出现就切出句子，输入结束时切出剩余部分
+# 用法: python tests/incremental_split_test.py
+
+
+def char_tokenize(text):
+    """按字符分词的简化 tokenizer，句末标点映射为 TextTokenizer.punctuation_marks_tokens 中的 token"""
+    return [{"。": ".", "！": "!", "？": "?", "，": ","}.get(ch, ch) for ch in text if not ch.isspace()]
+
+
+def joined(sentences):
+    return ["".join(sentence) for sentence in sentences]
+
+
+def test_emit_on_terminator():
+    splitter = IncrementalSentenceSplitter(char_tokenize)
+    assert splitter.feed("你好，世") == []
+    assert joined(splitter.feed("界。今天")) == ["你好,世界."]
+    assert joined(splitter.feed("天气很好！明")) == ["今天天气很好!"]
+    assert joined(splitter.flush()) == ["明"]
+    assert splitter.flush() == []
+
+
+def test_wait_for_ambiguous_dot():
+    # 末尾的 . 可能是小数点，等下一个字符到达再决定；两个数字之间的 . 不切分
+    splitter = IncrementalSentenceSplitter(lambda text: list(text.replace(" ", "")), split_tokens=["."])
+    assert splitter.feed("It costs 2.") == []
+    assert splitter.feed("5 dollars") == []
+    assert joined(splitter.feed(". Next")) == ["Itcosts2.5dollars."]
+    assert joined(splitter.flush()) == ["Next"]
+
+    # 数字后的句号仍然是句末
+    splitter = IncrementalSentenceSplitter(lambda text: list(text.replace(" ", "")), split_tokens=["."])
+    assert joined(splitter.feed("It costs 2. Next")) == ["Itcosts2."]
+    assert joined(splitter.flush()) == ["Next"]
+
+
+def test_token_budget():
+    splitter = IncrementalSentenceSplitter(char_tokenize, max_tokens_per_sentence=8, max_pending_chars=6)
+    sentences = splitter.feed("一二三四五六，七八九十一二三四五六七")
+    sentences += splitter.flush()
+    assert all(len(sentence) <= 8 for sentence in sentences), joined(sentences)
+    assert "".join(joined(sentences)) == "一二三四五六,七八九十一二三四五六七"
+
+
+def test_matches_batch_split():
+    text = "第一句话。第二句话，有逗号！第三句？最后一句没有标点"
+    batch = TextTokenizer.split_sentences_by_token(char_tokenize(text), TextTokenizer.punctuation_marks_tokens, 120)
+    splitter = IncrementalSentenceSplitter(char_tokenize)
+    sentences = []
+    for ch in text:
+        sentences += splitter.feed(ch)
+    sentences += splitter.flush()
+    # 增量切分不合并相邻的短句（以便尽早开始合成），拼起来与一次性切分相同
+    assert sum(sentences, []) == sum(batch, []), (joined(sentences), joined(batch))
+    assert len(sentences) == 4
+
+
+if __name__ == "__main__":
+    test_emit_on_terminator()
+    test_wait_for_ambiguous_dot()
+    test_token_budget()
+    test_matches_batch_split()
+    print("incremental split test passed")
@@ -0,0 +1,94 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import os
+import tempfile
+
+import soundfile as sf
+
+from indextts.utils.admission import AdmissionController
+from indextts.utils.job_manager import JOB_DONE, JOB_FAILED, JobManager
+from indextts.utils.replica_router import StubTTS
+
+# 长文本异步任务：逐句持久化、拼接输出，重启后只合成缺少的句子
+# 用法: python tests/job_manager_test.py
+
+TEXT = "第一章。" + "".join(f"这是第{i}句话，用来测试长文本任务。" for i in range(12))
+
+
+class CountingTTS(StubTTS):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sentence_calls = 0
+
+    async def infer_sentence(self, *args, **kwargs):
+        self.sentence_calls += 1
+        return await super().infer_sentence(*args, **kwargs)
+
+
+async def wait_for_status(jobs, job_id, statuses, timeout=10.0):
+    for _ in range(int(timeout / 0.01)):
+        status = jobs.get(job_id)
+        if status["status"] in statuses:
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {jobs.get(job_id)}")
+
+
+def test_job_lifecycle():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(check_job_lifecycle(os.path.join(tmp_dir, "lifecycle")))
+
+
+async def check_job_lifecycle(jobs_dir):
+    tts = CountingTTS(seconds_per_char=0.001)
+    tts.add_speaker("alice", [])
+    jobs = JobManager(tts, jobs_dir, admission=AdmissionController(max_outstanding_seconds=30.0),
+                      max_concurrent_sentences=3)
+    submitted = await jobs.submit(TEXT, "alice")
+    assert submitted["sentences"] == len(tts.split_sentences(TEXT)) and submitted["completed"] == 0
+    status = await wait_for_status(jobs, submitted["job_id"], [JOB_DONE, JOB_FAILED])
+    assert status["status"] == JOB_DONE and status["progress"] == 1.0, status
+    info = sf.info(jobs.output_path(submitted["job_id"]))
+    assert abs(info.frames / info.samplerate - status["audio_seconds"]) < 0.01, (info, status)
+    assert jobs.admission.in_flight == 0
+
+    # 未注册的 speaker：重试后任务失败，错误写入状态
+    failed = await jobs.submit("你好。", "nobody")
+    status = await wait_for_status(jobs, failed["job_id"], [JOB_DONE, JOB_FAILED])
+    assert status["status"] == JOB_FAILED and "unknown speaker" in status["error"], status
+    await jobs.close()
+
+
+def test_resume():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(check_resume(os.path.join(tmp_dir, "resume")))
+
+
+async def check_resume(jobs_dir):
+    tts = CountingTTS(seconds_per_char=0.01)
+    tts.add_speaker("alice", [])
+    jobs = JobManager(tts, jobs_dir, max_concurrent_sentences=1)
+    job_id = (await jobs.submit(TEXT, "alice"))["job_id"]
+    while jobs.get(job_id)["completed"] < 3:
+        await asyncio.sleep(0.01)
+    await jobs.close()  # 模拟服务停止
+    completed = jobs.get(job_id)["completed"]
+    total = jobs.get(job_id)["sentences"]
+    assert 3 <= completed < total
+
+    tts = CountingTTS(seconds_per_char=0.001)
+    tts.add_speaker("alice", [])
+    jobs = JobManager(tts, jobs_dir)
+    assert jobs.resume() == 1
+    assert jobs.get(job_id)["completed"] == completed
+    status = await wait_for_status(jobs, job_id, [JOB_DONE, JOB_FAILED])
+    assert status["status"] == JOB_DONE
+    assert tts.sentence_calls == total - completed, (tts.sentence_calls, total, completed)
+    await jobs.close()
+
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_resume()
+    print("job manager test passed")
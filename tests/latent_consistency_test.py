@@ -0,0 +1,58 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+
+import torch
+
+from indextts.infer_vllm import IndexTTS
+
+# 比较 vllm decode 时捕获的 latent 与 HF GPT2Model teacher-forced 前向得到的 latent，以及多句合批前向与逐句前向的 latent
+# 用法: VLLM_USE_V1=0 python tests/latent_consistency_test.py
+
+
+async def main():
+    prompt_wav = "tests/sample_prompt.wav"
+    # hf_latent=True 保留 HF GPT2Model，以便两条路径在同一个实例上对比
+    tts = IndexTTS(cfg_path="checkpoints/config.yaml", model_dir="checkpoints", hf_latent=True)
+    tts.gpt.capture_hidden_states = True
+    tts.registry_speaker("prompt", [prompt_wav])
+    speech_conditioning_latent = tts.speaker_dict["prompt"]["speech_conditioning_latent"]
+
+    texts = [
+        "晕 XUAN4 是 一 种 GAN3 觉",
+        "There is a vehicle arriving in dock number 7?",
+        "大家好，我现在正在bilibili 体验 ai 科技，说实话，来之前我绝对想不到！",
+    ]
+    for text in texts:
+        for sent in tts.tokenizer.split_sentences(tts.tokenizer.tokenize(text)):
+            text_tokens = tts.tokenizer.convert_tokens_to_ids(sent)
+            text_tokens = torch.tensor(text_tokens, dtype=torch.int32, device=tts.device).unsqueeze(0)
+            codes, latent_vllm = await tts.gpt.inference_speech(speech_conditioning_latent, text_tokens, seed=8)
+            latent_hf = tts.get_latent(speech_conditioning_latent, text_tokens, codes)
+
+            assert latent_vllm.shape == latent_hf.shape, (latent_vllm.shape, latent_hf.shape)
+            max_diff = (latent_vllm - latent_hf).abs().max().item()
+            cos = torch.nn.functional.cosine_similarity(latent_vllm, latent_hf, dim=-1).min().item()
+            print(f"codes: {len(codes)}, max abs diff: {max_diff:.4f}, min cosine: {cos:.5f}")
+            # vllm 以 fp16 运行，HF 路径为 fp32，只要求逐帧方向一致
+            assert cos > 0.99, f"latent mismatch for: {text}"
+
+    # 多个句子合并为一次 teacher-forced 前向，应与逐句前向一致
+    items = []
+    for sent in tts.tokenizer.split_sentences(tts.tokenizer.tokenize(texts[-1] + texts[0] + texts[1])):
+        text_tokens = tts.tokenizer.convert_tokens_to_ids(sent)
+        text_tokens = torch.tensor(text_tokens, dtype=torch.int32, device=tts.device).unsqueeze(0)
+        codes, _ = await tts.gpt.inference_speech(speech_conditioning_latent, text_tokens, seed=8)
+        items.append((speech_conditioning_latent, text_tokens, codes))
+    latents_batched = tts.gpt.forward_latents(items)
+    for item, latent_batched in zip(items, latents_batched):
+        latent_single = tts.get_latent(*item)
+        assert latent_batched.shape == latent_single.shape, (latent_batched.shape, latent_single.shape)
+        max_diff = (latent_batched - latent_single).abs().max().item()
+        print(f"batched codes: {len(item[2])}, max abs diff: {max_diff:.6f}")
+        assert max_diff < 1e-3, "batched latent mismatch"
+    print("latent consistency test passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import time
+
+from prometheus_client import REGISTRY
+
+from indextts.utils.metrics import RequestTimings
+from indextts.utils.priority import PRIORITY_INTERACTIVE
+
+# 请求计时上下文：阶段耗时累加、TTFA / RTF 计算与 prometheus 直方图
+# 用法: python tests/metrics_test.py
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_request_timings():
+    vocoder_count = sample("indextts_stage_seconds_count", stage="vocoder")
+    requests = sample("indextts_requests_total", priority="interactive")
+    background_requests = sample("indextts_requests_total", priority="background")
+
+    timings = RequestTimings(sampling_rate=24000, priority=PRIORITY_INTERACTIVE)
+    for _ in range(2):
+        with timings.stage("vocoder"):
+            time.sleep(0.01)
+    timings.observe("decode", 0.5)
+    timings.add_mel_tokens(120)
+    assert timings.ttfa is None and timings.rtf is None
+    timings.add_audio(24000)
+    timings.add_audio(12000)
+
+    timings.finish()
+    timings.finish()  # 重复调用无副作用
+    assert timings.stages["vocoder"] >= 0.02 and timings.stages["decode"] == 0.5
+    assert timings.audio_seconds == 1.5 and timings.mel_tokens == 120
+    assert 0 < timings.ttfa <= timings.stages["total"]
+    assert abs(timings.rtf - timings.stages["total"] / 1.5) < 1e-9
+    assert sample("indextts_stage_seconds_count", stage="vocoder") == vocoder_count + 2
+    assert sample("indextts_requests_total", priority="interactive") == requests + 1
+    assert sample("indextts_requests_total", priority="background") == background_requests
+    assert sample("indextts_request_ttfa_seconds_count", priority="interactive") >= 1
+
+
+if __name__ == "__main__":
+    test_request_timings()
+    print("metrics test passed")
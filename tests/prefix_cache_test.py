@@ -0,0 +1,40 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import torch
+
+from indextts.gpt.prefix_cache import prompt_token_ids, select_uncomputed_embeds, speaker_digest
+
+# prefix caching 的伪 token id 与命中后 prompt embeds 的裁剪
+# 用法: python tests/prefix_cache_test.py
+
+
+def test_prompt_token_ids():
+    generator = torch.Generator().manual_seed(0)
+    speaker_a = speaker_digest(torch.randn(1, 32, 16, generator=generator))
+    speaker_b = speaker_digest(torch.randn(1, 32, 16, generator=generator))
+    short = prompt_token_ids(speaker_a, [5, 6, 7], 32 + 6)
+    long = prompt_token_ids(speaker_a, list(range(100, 140)), 32 + 43)
+    # 同一 speaker 的 conditioning 前缀相同，不同 speaker 不同
+    assert short[:32] == long[:32]
+    assert prompt_token_ids(speaker_b, [5, 6, 7], 32 + 6)[:32] != short[:32]
+    # 相同的 prompt 完全相同（可整条命中），文本不同时文本部分不同
+    assert prompt_token_ids(speaker_a, [5, 6, 7], 32 + 6) == short
+    assert prompt_token_ids(speaker_a, [5, 6, 8], 32 + 6)[32:] != short[32:]
+    # id 的集合仍是 range(n)（repetition_penalty 不变），0 是第一个且唯一的 placeholder
+    for ids in [short, long]:
+        assert sorted(ids) == list(range(len(ids)))
+        assert ids[0] == 0
+
+
+def test_select_uncomputed_embeds():
+    seq_lens, context_lens = [40, 35, 50], [32, 0, 48]
+    embeds = torch.arange(sum(seq_lens)).view(-1, 1).float()
+    selected = select_uncomputed_embeds(embeds, seq_lens, context_lens)
+    expected = list(range(32, 40)) + list(range(40, 75)) + list(range(75 + 48, 125))
+    assert selected.view(-1).tolist() == expected
+
+
+if __name__ == "__main__":
+    test_prompt_token_ids()
+    test_select_uncomputed_embeds()
+    print("prefix cache test passed")
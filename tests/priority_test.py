@@ -0,0 +1,103 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import threading
+
+from indextts.utils.admission import AdmissionController, AdmissionRejected
+from indextts.utils.micro_batcher import MicroBatcher
+from indextts.utils.priority import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL,
+                                     PriorityThreadPoolExecutor, parse_priority)
+
+# 优先级：线程池 / 微批队列按优先级出队，准入控制为 background 预留余量
+# 用法: python tests/priority_test.py
+
+
+def test_parse_priority():
+    assert parse_priority(None) == PRIORITY_NORMAL
+    assert parse_priority("Interactive") == PRIORITY_INTERACTIVE
+    assert parse_priority("2") == PRIORITY_BACKGROUND
+    try:
+        parse_priority("urgent")
+        raise AssertionError("should reject unknown priority")
+    except ValueError:
+        pass
+
+
+def test_executor_order():
+    executor = PriorityThreadPoolExecutor(max_workers=1)
+    gate = threading.Event()
+    order = []
+    executor.submit(gate.wait)  # 占住唯一的线程，后面的任务都在队列中等待
+    futures = [
+        executor.submit(order.append, "background", priority=PRIORITY_BACKGROUND),
+        executor.submit(order.append, "normal-1"),
+        executor.submit(order.append, "interactive", priority=PRIORITY_INTERACTIVE),
+        executor.submit(order.append, "normal-2"),
+    ]
+    gate.set()
+    for future in futures:
+        future.result(timeout=5)
+    executor.shutdown()
+    assert order == ["interactive", "normal-1", "normal-2", "background"], order
+
+
+class RecordingBatcher(MicroBatcher):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def forward(self, batch):
+        self.batches.append([item.inputs[0] for item in batch])
+        return [item.inputs[0] for item in batch]
+
+
+async def check_batcher_order():
+    batcher = RecordingBatcher(max_batch_size=2, max_wait_ms=50.0)
+    names = [("background", PRIORITY_BACKGROUND), ("normal", PRIORITY_NORMAL), ("interactive", PRIORITY_INTERACTIVE)]
+    results = await asyncio.gather(*[batcher.submit((name,), 1, priority) for name, priority in names])
+    assert results == ["background", "normal", "interactive"], results
+    assert batcher.batches == [["interactive", "normal"], ["background"]], batcher.batches
+
+
+async def check_admission_classes():
+    admission = AdmissionController(max_outstanding_seconds=10.0, background_share=0.5, interactive_burst=1.5)
+    first = await admission.acquire(4.0, PRIORITY_BACKGROUND)
+    try:
+        await admission.acquire(2.0, PRIORITY_BACKGROUND)  # 超出 background 的 5 秒预算
+        raise AssertionError("background should be throttled")
+    except AdmissionRejected:
+        pass
+    normal = await admission.acquire(6.0)
+    interactive = await admission.acquire(4.0, PRIORITY_INTERACTIVE)  # 14 秒，仍在 interactive 的 15 秒以内
+    status = admission.status()
+    assert status["in_flight_by_priority"] == {"interactive": 1, "normal": 1, "background": 1}, status
+    for ticket in [first, normal, interactive]:
+        await admission.release(ticket)
+    assert admission.status()["in_flight"] == 0
+
+    # 有 normal 请求在等待时，background 请求不会插队
+    admission = AdmissionController(max_outstanding_seconds=10.0, max_requests=1, max_defer_seconds=2.0)
+    holder = await admission.acquire(1.0)
+    admitted = []
+
+    async def wait_for(priority, name):
+        ticket = await admission.acquire(1.0, priority)
+        admitted.append(name)
+        await asyncio.sleep(0.05)
+        await admission.release(ticket)
+
+    waiters = [asyncio.ensure_future(wait_for(PRIORITY_NORMAL, "normal"))]
+    await asyncio.sleep(0.01)
+    waiters.append(asyncio.ensure_future(wait_for(PRIORITY_BACKGROUND, "background")))
+    await asyncio.sleep(0.01)
+    await admission.release(holder)
+    await asyncio.gather(*waiters)
+    assert admitted == ["normal", "background"], admitted
+
+
+if __name__ == "__main__":
+    test_parse_priority()
+    test_executor_order()
+    asyncio.run(check_batcher_order())
+    asyncio.run(check_admission_classes())
+    print("priority test passed")
@@ -0,0 +1,144 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import time
+
+from indextts.utils.metrics import RequestTimings
+from indextts.utils.replica_router import ReplicaRouter
+
+# 多 replica 路由：用 StubTTS 在 CPU 上验证结果回传、speaker affinity、最少负载分配、取消与 worker 退出
+# 用法: python tests/router_test.py
+
+TEXT = "你好，这是一个测试。第二句话在这里。"
+
+
+def replica_requests(router):
+    return [replica["requests"] for replica in router.get_stats()["replicas"]]
+
+
+async def check_routing(router):
+    for speaker in ["alice", "bob"]:
+        router.add_speaker(speaker, [])
+
+    # 空闲时同一 speaker 始终发往同一个 replica
+    timings = RequestTimings()
+    sr, wav = await router.infer_with_ref_audio_embed("alice", TEXT, timings=timings)
+    assert sr == 24000 and wav.shape[1] == 1 and wav.shape[0] > 0
+    assert timings.audio_seconds == wav.shape[0] / sr and timings.mel_tokens > 0
+    await router.infer_with_ref_audio_embed("alice", TEXT)
+    assert sorted(replica_requests(router)) == [0, 2], replica_requests(router)
+    assert router.stats["affinity_hits"] == 1
+
+    # 并发时新的 speaker 分配到负载最少的 replica
+    await asyncio.gather(
+        router.infer_with_ref_audio_embed("alice", TEXT * 4),
+        router.infer_with_ref_audio_embed("bob", TEXT * 4),
+    )
+    assert replica_requests(router) in ([3, 1], [1, 3]), replica_requests(router)
+
+    # 流式结果逐块返回
+    chunks = [chunk async for chunk in router.infer_stream("bob", TEXT)]
+    assert len(chunks) == 2, len(chunks)
+
+    # 调用方提前退出时 worker 中的请求被取消
+    stream = router.infer_stream("bob", TEXT * 20)
+    await stream.__anext__()
+    await stream.aclose()
+    assert router.stats["aborted"] == 1
+    assert all(replica["in_flight"] == 0 for replica in router.get_stats()["replicas"])
+
+    # worker 中的错误原样抛出
+    try:
+        await router.infer_with_ref_audio_embed("carol", TEXT)
+        raise AssertionError("unknown speaker should fail")
+    except RuntimeError as ex:
+        assert "unknown speaker" in str(ex)
+
+    # 切分句子与 speaker 无关，只按负载分配，不记入 affinity
+    assert await router.split_text(TEXT) == ["你好,这是一个测试", "第二句话在这里"]
+    assert all(None not in replica.affinity for replica in router.replicas)
+
+
+async def check_text_stream(router):
+    # 增量文本逐段转发给 replica，句子完成一个就返回一个
+    async def fragments():
+        for fragment in ["你好，这是", "一个测试。第二句", "话在这里"]:
+            await asyncio.sleep(0.01)
+            yield fragment
+
+    timings = RequestTimings()
+    chunks = [chunk async for chunk in router.infer_text_stream("alice", fragments(), timings=timings)]
+    assert len(chunks) == 2, len(chunks)
+    assert timings.audio_seconds == sum(chunk.shape[0] for chunk in chunks) / 24000
+
+
+async def check_warmup(router):
+    # 每个 replica 都执行预热，不经过路由、不计入请求数
+    requests = replica_requests(router)
+    report = await router.warmup(speaker="alice", texts=["你好。", TEXT], rounds=2)
+    assert len(report["replicas"]) == 2 and report["seconds"] > 0
+    assert all(len(replica["rounds"]) == 2 for replica in report["replicas"])
+    assert [r + 1 for r in requests] == replica_requests(router), replica_requests(router)
+
+
+async def check_dead_worker(router):
+    router.add_speaker("alice", [])
+    request = asyncio.ensure_future(router.infer_with_ref_audio_embed("alice", TEXT * 50))
+    await asyncio.sleep(0.2)
+    [busy] = [replica for replica in router.replicas if replica.in_flight == 1]
+    # worker 进程在请求中途退出：请求失败而不是一直等待，replica 不再接收新的请求
+    busy.process.kill()
+    try:
+        await asyncio.wait_for(request, timeout=10)
+        raise AssertionError("request on a dead replica should fail")
+    except RuntimeError as ex:
+        assert "exited" in str(ex), ex
+    assert router.stats["dead_replicas"] == 1 and not busy.pending and busy.in_flight == 0
+    assert [replica["alive"] for replica in router.get_stats()["replicas"]].count(False) == 1
+    sr, wav = await router.infer_with_ref_audio_embed("alice", TEXT)
+    assert wav.shape[0] > 0 and busy.requests == 1
+
+
+def test_router():
+    router = ReplicaRouter(2, backend="stub", engine_kwargs={"seconds_per_char": 0.005}, affinity_slack_seconds=1.0)
+    router.start(timeout=60)
+    try:
+        asyncio.run(check_routing(router))
+        asyncio.run(check_text_stream(router))
+        asyncio.run(check_warmup(router))
+    finally:
+        router.close()
+
+
+def test_dead_worker():
+    router = ReplicaRouter(2, backend="stub", engine_kwargs={"seconds_per_char": 0.005}, liveness_interval=0.1)
+    router.start(timeout=60)
+    try:
+        asyncio.run(check_dead_worker(router))
+    finally:
+        router.close()
+
+
+def test_dead_worker_without_loop():
+    router = ReplicaRouter(2, backend="stub", engine_kwargs={"seconds_per_char": 0.005}, liveness_interval=0.1)
+    router.start(timeout=60)
+    try:
+        # 还没有请求、没有 event loop 时 worker 退出：读取线程只记录退出，不在本线程上执行 event loop 的工作
+        assert router.loop is None
+        router.replicas[0].process.kill()
+        deadline = time.monotonic() + 10
+        while router.replicas[0].alive and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not router.replicas[0].alive and router.stats["dead_replicas"] == 1
+        router.add_speaker("alice", [])
+        sr, wav = asyncio.run(router.infer_with_ref_audio_embed("alice", TEXT))
+        assert wav.shape[0] > 0 and router.replicas[1].requests == 1
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    test_router()
+    test_dead_worker()
+    test_dead_worker_without_loop()
+    print("router test passed")
@@ -0,0 +1,40 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from indextts.utils.sampling import DEFAULT_SAMPLING, MEL_TOKENS_PER_SECOND, estimate_max_mel_tokens, parse_sampling
+
+# 请求级采样参数的解析，以及按句子长度预估的 max_tokens
+# 用法: python tests/sampling_test.py
+
+
+def test_parse_sampling():
+    assert parse_sampling({"text": "你好", "seed": 8}) == {}
+    sampling = parse_sampling({"temperature": "0.7", "top_k": "20", "top_p": 0.9, "repetition_penalty": None})
+    assert sampling == {"temperature": 0.7, "top_k": 20, "top_p": 0.9}, sampling
+    for invalid in [{"top_p": 0}, {"top_p": 1.5}, {"top_k": 0}, {"temperature": -1}, {"repetition_penalty": 0}]:
+        try:
+            parse_sampling(invalid)
+            raise AssertionError(f"should reject {invalid}")
+        except ValueError:
+            pass
+
+
+def test_max_mel_tokens():
+    # 很短的句子取下限
+    assert estimate_max_mel_tokens(["你", "好"]) == 50
+    # 19 个字按每秒 3 个字、0.8517 的比例预估约 5.4 秒
+    sentence = list("今天的天气非常好我们一起去公园散步吧好")
+    assert len(sentence) == 19
+    budget = estimate_max_mel_tokens(sentence)
+    expected_seconds = 19 * 0.8517 / 3
+    assert budget >= expected_seconds * MEL_TOKENS_PER_SECOND, budget
+    assert budget < DEFAULT_SAMPLING["max_tokens"], budget
+    # 长文本不超过上限；factor 为 0 时固定使用上限
+    assert estimate_max_mel_tokens("好" * 500) == DEFAULT_SAMPLING["max_tokens"]
+    assert estimate_max_mel_tokens(["你", "好"], safety_factor=0) == DEFAULT_SAMPLING["max_tokens"]
+
+
+if __name__ == "__main__":
+    test_parse_sampling()
+    test_max_mel_tokens()
+    print("sampling test passed")
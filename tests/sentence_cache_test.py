@@ -0,0 +1,77 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from indextts.utils.synthesis_cache import SentenceCache, make_sentence_key
+
+# 句子级缓存：内存 LRU 按字节淘汰、磁盘层 mmap 读取与容量上限
+# 用法: python tests/sentence_cache_test.py
+
+SAMPLING_PARAMS = {"temperature": 1.0, "top_p": 0.8, "top_k": 30, "repetition_penalty": 10.0, "max_tokens": 768}
+
+
+def key(i, seed=8):
+    return make_sentence_key("speaker", [i, i + 1], seed, SAMPLING_PARAMS, "fingerprint")
+
+
+def wav(i):
+    return np.full((500, 1), i, dtype=np.int16)  # 1000 bytes
+
+
+def test_key():
+    assert key(0) == key(0)
+    assert key(0) != key(0, seed=9)
+    assert key(0) != make_sentence_key("speaker", [0, 1], 8, SAMPLING_PARAMS, "other")
+
+
+def test_memory_lru():
+    cache = SentenceCache(max_bytes=3000)
+    for i in range(3):
+        cache.put(key(i), wav(i))
+    assert cache.get(key(0)) is not None  # 0 变为最近使用
+    cache.put(key(3), wav(3))  # 淘汰 1
+    assert cache.get(key(1)) is None
+    assert cache.get(key(3))[0, 0] == 3
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 3000 and stats["hits"] == 2 and stats["misses"] == 1, stats
+
+
+def test_disk_tier():
+    with tempfile.TemporaryDirectory() as disk_dir:
+        cache = SentenceCache(max_bytes=3000, disk_dir=disk_dir, disk_max_bytes=5000)
+        for i in range(5):
+            cache.put(key(i), wav(i))
+            cache.write_disk(key(i), wav(i))
+        assert cache.get_stats()["disk_evictions"] > 0
+        assert cache.get_stats()["disk_bytes"] <= 5000
+
+        # 新实例（如服务重启）从磁盘层读取
+        cache = SentenceCache(max_bytes=3000, disk_dir=disk_dir)
+        result = cache.get(key(4))
+        assert isinstance(result, np.memmap) and result.shape == (500, 1) and result[0, 0] == 4
+        assert cache.get(key(0)) is None
+        stats = cache.get_stats()
+        assert stats["disk_hits"] == 1 and stats["misses"] == 1, stats
+
+        # 分步查询（磁盘读取在线程池中执行）：内存未命中不计数，由 finish_lookup 计入
+        cache = SentenceCache(max_bytes=3000, disk_dir=disk_dir)
+        assert cache.get_memory(key(4)) is None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            disk_wav = executor.submit(cache.read_disk, key(4)).result()
+            assert executor.submit(cache.read_disk, key(0)).result() is None
+        assert cache.get_stats()["misses"] == 0 and len(cache.entries) == 0
+        assert cache.finish_lookup(key(4), disk_wav)[0, 0] == 4
+        assert cache.finish_lookup(key(0), None) is None
+        assert cache.get_memory(key(4))[0, 0] == 4
+        stats = cache.get_stats()
+        assert stats["disk_hits"] == 1 and stats["misses"] == 1 and stats["hits"] == 1, stats
+
+
+if __name__ == "__main__":
+    test_key()
+    test_memory_lru()
+    test_disk_tier()
+    print("sentence cache test passed")
@@ -0,0 +1,117 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+
+from indextts.utils.single_flight import SingleFlight
+
+# single-flight：相同 key 的并发计算只执行一次，调用方断开时不影响仍在等待的调用方
+# 用法: python tests/single_flight_test.py
+
+
+def test_coalesce():
+    asyncio.run(check_coalesce())
+
+
+async def check_coalesce():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def request(key, value):
+        flight = single_flight.join(key, lambda: compute(value))
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            single_flight.leave(flight)
+
+    results = await asyncio.gather(request("a", 1), request("a", 1), request("a", 1), request("b", 2))
+    assert results == [2, 2, 2, 4], results
+    assert calls == [1, 2], calls
+    stats = single_flight.get_stats()
+    assert stats["leaders"] == 2 and stats["coalesced"] == 2 and stats["in_flight"] == 0, stats
+
+    # 已完成的结果保留到最后一个持有者离开，之后到达的调用方重新计算
+    holder = single_flight.join("a", lambda: compute(1))
+    await holder.task
+    assert await request("a", 1) == 2 and calls == [1, 2, 1], calls
+    single_flight.leave(holder)
+    assert await request("a", 1) == 2 and calls == [1, 2, 1, 1], calls
+
+
+def test_cancel():
+    asyncio.run(check_cancel())
+
+
+async def check_cancel():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def request():
+        flight = single_flight.join("key", compute)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            single_flight.leave(flight)
+
+    # leader 断开，follower 仍然得到结果
+    leader = asyncio.ensure_future(request())
+    follower = asyncio.ensure_future(request())
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await follower == "done"
+    assert single_flight.stats["cancelled"] == 0
+
+    # 所有调用方都断开时取消计算
+    first = asyncio.ensure_future(request())
+    second = asyncio.ensure_future(request())
+    await asyncio.sleep(0.01)
+    task = single_flight.flights["key"].task
+    first.cancel()
+    second.cancel()
+    await asyncio.gather(first, second, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert task.cancelled() and not single_flight.flights, single_flight.flights
+    assert single_flight.stats["cancelled"] == 1
+
+
+def test_error():
+    asyncio.run(check_error())
+
+
+async def check_error():
+    single_flight = SingleFlight()
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    holder = single_flight.join("key", compute)
+    try:
+        await asyncio.shield(holder.task)
+        raise AssertionError("should raise")
+    except RuntimeError:
+        pass
+    # 失败的 flight 立即移出，即使还有持有者，之后到达的调用方重新计算
+    retry = single_flight.join("key", compute)
+    assert retry is not holder and await retry.task == "ok"
+    single_flight.leave(holder)
+    single_flight.leave(retry)
+    assert not single_flight.flights
+
+
+if __name__ == "__main__":
+    test_coalesce()
+    test_cancel()
+    test_error()
+    print("single flight test passed")
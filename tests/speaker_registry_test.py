@@ -0,0 +1,110 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from indextts.infer_vllm import IndexTTS
+
+# speaker 第一次使用时的注册：并发请求只注册一次，speaker_dict 只在 event loop 线程上写入，
+# 注册期间 add_speaker 换了参考音频时旧结果不会写入；IndexTTS.get_speaker 使用替身对象执行，不加载模型
+# 用法: python tests/speaker_registry_test.py
+
+
+def make_stub_tts():
+    """只提供 IndexTTS.get_speaker / add_speaker 用到的属性与方法"""
+    built = []
+
+    async def run_in_thread(fn, *args, priority=None, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def build_speaker(speaker, audio_paths):
+        built.append((speaker, list(audio_paths), threading.current_thread().name))
+        time.sleep(0.05)
+        return {"speaker": speaker, "audio_paths": list(audio_paths)}
+
+    tts = SimpleNamespace(speaker_dict={}, speaker_sources={}, speaker_futures={}, run_on_gpu=run_in_thread,
+                          build_speaker=build_speaker)
+    tts.add_speaker = lambda speaker, audio_paths: IndexTTS.add_speaker(tts, speaker, audio_paths)
+    return tts, built
+
+
+class LoopOnlyDict(dict):
+    """只允许在创建它的线程（event loop 线程）上写入"""
+
+    def __init__(self):
+        super().__init__()
+        self.owner = threading.get_ident()
+
+    def __setitem__(self, key, value):
+        assert threading.get_ident() == self.owner, "speaker_dict written off the event loop"
+        super().__setitem__(key, value)
+
+
+def test_concurrent_first_use():
+    tts, built = make_stub_tts()
+
+    async def check_concurrent_first_use():
+        tts.speaker_dict = LoopOnlyDict()
+        tts.add_speaker("alice", ["alice.wav"])
+        entries = await asyncio.gather(*[IndexTTS.get_speaker(tts, "alice") for _ in range(8)])
+        assert len(built) == 1, built
+        assert all(entry is entries[0] for entry in entries)
+        assert tts.speaker_dict["alice"] is entries[0] and not tts.speaker_futures
+        # 注册后直接命中 speaker_dict
+        assert await IndexTTS.get_speaker(tts, "alice") is entries[0] and len(built) == 1
+
+    asyncio.run(check_concurrent_first_use())
+
+
+def test_cancelled_waiter():
+    tts, built = make_stub_tts()
+
+    async def check_cancelled_waiter():
+        tts.add_speaker("alice", ["alice.wav"])
+        first = asyncio.ensure_future(IndexTTS.get_speaker(tts, "alice"))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(IndexTTS.get_speaker(tts, "alice"))
+        await asyncio.sleep(0)
+        first.cancel()
+        entry = await second
+        assert entry["audio_paths"] == ["alice.wav"] and len(built) == 1
+        assert tts.speaker_dict["alice"] is entry
+
+    asyncio.run(check_cancelled_waiter())
+
+
+def test_replaced_during_registration():
+    tts, built = make_stub_tts()
+
+    async def check_replaced_during_registration():
+        tts.add_speaker("alice", ["old.wav"])
+        stale = asyncio.ensure_future(IndexTTS.get_speaker(tts, "alice"))
+        await asyncio.sleep(0)
+        tts.add_speaker("alice", ["new.wav"])
+        assert (await stale)["audio_paths"] == ["old.wav"]
+        # 旧参考音频的结果不写入 speaker_dict，下一次使用按新参考音频注册
+        assert "alice" not in tts.speaker_dict
+        assert (await IndexTTS.get_speaker(tts, "alice"))["audio_paths"] == ["new.wav"]
+        assert [paths for _, paths, _ in built] == [["old.wav"], ["new.wav"]]
+
+    asyncio.run(check_replaced_during_registration())
+
+
+def test_unknown_speaker():
+    tts, _ = make_stub_tts()
+    try:
+        asyncio.run(IndexTTS.get_speaker(tts, "nobody"))
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("unknown speaker should raise KeyError")
+
+
+if __name__ == "__main__":
+    test_concurrent_first_use()
+    test_cancelled_waiter()
+    test_replaced_during_registration()
+    test_unknown_speaker()
+    print("speaker registry test passed")
@@ -0,0 +1,120 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import argparse
+import os
+import tempfile
+
+import torch
+
+from indextts.utils.speaker_store import SpeakerStore, checkpoint_version
+from tools import speaker_store as speaker_store_tool
+
+# speaker store 在 CPU 上的保存 / 读取、模型版本失效，以及 tools/speaker_store.py 的 prune / export / import
+# 用法: python tests/speaker_store_test.py
+
+
+def make_entry(num_refs=2):
+    return {
+        "auto_conditioning": [torch.randn(1, 100, 50 + i) for i in range(num_refs)],
+        "speech_conditioning_latent": torch.randn(1, 32, 1280),
+        "speaker_embedding": torch.randn(1, 512, 1),
+    }
+
+
+def write_file(path, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def make_model_dir(root, gpt_content: bytes):
+    model_dir = os.path.join(root, "checkpoints")
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, "config.yaml"), "w") as f:
+        f.write("gpt_checkpoint: gpt.pth\nbigvgan_checkpoint: bigvgan_generator.pth\n")
+    write_file(os.path.join(model_dir, "gpt.pth"), gpt_content)
+    write_file(os.path.join(model_dir, "bigvgan_generator.pth"), b"bigvgan")
+    return model_dir
+
+
+def save_speaker(store, root, speaker, num_refs=2):
+    audio_paths = [write_file(os.path.join(root, f"{speaker}_{i}.wav"), f"{speaker}-{i}".encode()) for i in range(num_refs)]
+    key = store.entry_key(audio_paths)
+    entry = make_entry(num_refs)
+    store.save(key, entry, speaker, audio_paths)
+    return key, entry, audio_paths
+
+
+def assert_entry_equal(loaded, entry):
+    assert len(loaded["auto_conditioning"]) == len(entry["auto_conditioning"])
+    for cond_mel, expected in zip(loaded["auto_conditioning"], entry["auto_conditioning"]):
+        assert torch.equal(cond_mel, expected)
+    assert torch.equal(loaded["speech_conditioning_latent"], entry["speech_conditioning_latent"])
+    assert torch.equal(loaded["speaker_embedding"], entry["speaker_embedding"])
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as root:
+        store = SpeakerStore(os.path.join(root, "store"), model_version="v1")
+        key, entry, audio_paths = save_speaker(store, root, "alice", num_refs=3)
+        assert_entry_equal(store.load(key, "cpu"), entry)
+        assert "digest" not in store.load(key, "cpu")  # 没有 digest 的条目由调用方重新计算
+        assert store.load("missing", "cpu") is None
+        # speaker_digest 存在 metadata 中，读取时原样返回
+        entry["digest"] = bytes(range(16))
+        store.save(key, entry, "alice", audio_paths)
+        assert store.load(key, "cpu")["digest"] == entry["digest"]
+        # key 只取决于模型版本与参考音频内容，与路径无关
+        copied = [write_file(os.path.join(root, f"copy_{i}.wav"), open(path, "rb").read()) for i, path in enumerate(audio_paths)]
+        assert store.entry_key(copied) == key
+        [(entry_key, metadata)] = list(store.entries())
+        assert entry_key == key
+        assert metadata["speaker"] == "alice" and metadata["model_version"] == "v1" and metadata["num_refs"] == "3"
+        assert not [name for name in os.listdir(store.store_dir) if name.endswith(".tmp")]
+
+
+def test_version_invalidation():
+    with tempfile.TemporaryDirectory() as root:
+        model_dir = make_model_dir(root, b"gpt weights v1")
+        version = speaker_store_tool.model_version(model_dir)
+        assert version == checkpoint_version(os.path.join(model_dir, "gpt.pth"), os.path.join(model_dir, "bigvgan_generator.pth"))
+        store = SpeakerStore(os.path.join(root, "store"), model_version=version)
+        key, _, audio_paths = save_speaker(store, root, "alice")
+
+        # 权重变化后 key 随之变化，旧条目不会再被读到
+        make_model_dir(root, b"gpt weights v2")
+        new_store = SpeakerStore(store.store_dir, model_version=speaker_store_tool.model_version(model_dir))
+        assert new_store.model_version != version
+        new_key = new_store.entry_key(audio_paths)
+        assert new_key != key and new_store.load(new_key, "cpu") is None
+
+
+def test_prune_export_import():
+    with tempfile.TemporaryDirectory() as root:
+        model_dir = make_model_dir(root, b"gpt weights v1")
+        store_dir = os.path.join(root, "store")
+        old_store = SpeakerStore(store_dir, model_version=speaker_store_tool.model_version(model_dir))
+        stale_key, _, _ = save_speaker(old_store, root, "stale")
+        make_model_dir(root, b"gpt weights v2")
+        store = SpeakerStore(store_dir, model_version=speaker_store_tool.model_version(model_dir))
+        alice_key, alice, _ = save_speaker(store, root, "alice")
+        bob_key, _, _ = save_speaker(store, root, "bob", num_refs=1)
+
+        speaker_store_tool.prune(argparse.Namespace(store_dir=store_dir, model_dir=model_dir))
+        assert sorted(key for key, _ in store.entries()) == sorted([alice_key, bob_key])
+        assert store.load(stale_key, "cpu") is None
+
+        archive = os.path.join(root, "speakers.tar")
+        speaker_store_tool.export(argparse.Namespace(store_dir=store_dir, archive=archive, speakers=["alice"]))
+        import_dir = os.path.join(root, "imported")
+        speaker_store_tool.import_entries(argparse.Namespace(store_dir=import_dir, archive=archive))
+        imported = SpeakerStore(import_dir, model_version=store.model_version)
+        assert [key for key, _ in imported.entries()] == [alice_key]
+        assert_entry_equal(imported.load(alice_key, "cpu"), alice)
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_version_invalidation()
+    test_prune_export_import()
+    print("speaker store test passed")
@@ -0,0 +1,63 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import torch
+from transformers import (RepetitionPenaltyLogitsProcessor, TemperatureLogitsWarper, TopKLogitsWarper,
+                          TopPLogitsWarper)
+
+from indextts.gpt.model import UnifiedVoice
+from indextts.gpt.static_decoder import StaticKVDecoder, apply_repetition_penalty, logits_to_probs
+
+# StaticKVDecoder 的采样与 HF logits processor 一致，贪心解码的 codes / latent 与 HF generate 一致
+# 用法: python tests/static_decoder_test.py
+
+TINY_CONFIG = dict(
+    layers=2, model_dim=64, heads=4, max_text_tokens=40, max_mel_tokens=80, number_text_tokens=100,
+    number_mel_codes=8194, condition_num_latent=32,
+    condition_module=dict(output_size=64, linear_units=128, attention_heads=4, num_blocks=1, input_layer="conv2d2",
+                          perceiver_mult=2),
+)
+
+
+def test_sampling():
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(2, 500, generator=generator) * 3
+    generated = torch.randint(0, 500, (2, 20), generator=generator)
+    generated_mask = torch.zeros_like(logits, dtype=torch.bool).scatter_(1, generated, True)
+
+    expected = RepetitionPenaltyLogitsProcessor(10.0)(generated, logits.clone())
+    penalized = apply_repetition_penalty(logits, generated_mask, 10.0)
+    assert torch.allclose(penalized, expected)
+
+    for temperature, top_k, top_p in [(1.0, 30, 0.8), (0.7, 5, 1.0), (1.3, None, 0.5)]:
+        expected = TemperatureLogitsWarper(temperature)(generated, penalized.clone())
+        if top_k is not None:
+            expected = TopKLogitsWarper(top_k)(generated, expected)
+        if top_p < 1.0:
+            expected = TopPLogitsWarper(top_p)(generated, expected)
+        probs = logits_to_probs(penalized, temperature, top_k, top_p)
+        assert torch.allclose(probs, expected.softmax(dim=-1), atol=1e-6)
+
+
+def test_greedy_matches_hf():
+    torch.manual_seed(0)
+    model = UnifiedVoice(**TINY_CONFIG)
+    model.post_init_gpt2_config()
+    model.eval()
+    decoder = StaticKVDecoder(model)
+    generator = torch.Generator().manual_seed(1)
+    conditioning = torch.randn(1, 32, 64, generator=generator) * 0.1
+    kwargs = dict(do_sample=False, repetition_penalty=10.0, num_return_sequences=1)
+    for max_tokens in [1, 2, 30]:
+        text_tokens = torch.randint(2, 100, (1, 12), generator=generator)
+        with torch.no_grad():
+            hf_codes, hf_latent = model.inference_speech(conditioning, text_tokens, max_generate_length=max_tokens, **kwargs)
+            codes, latent = decoder.generate(conditioning, text_tokens, max_generate_length=max_tokens, **kwargs)
+        assert torch.equal(codes, hf_codes), (codes, hf_codes)
+        assert latent.shape == hf_latent.shape, (latent.shape, hf_latent.shape)
+        assert torch.allclose(latent, hf_latent, atol=1e-4)
+
+
+if __name__ == "__main__":
+    test_sampling()
+    test_greedy_matches_hf()
+    print("static decoder test passed")
@@ -0,0 +1,70 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+from types import SimpleNamespace
+
+import torch
+
+from indextts.gpt.model_vllm import UnifiedVoice, build_engine_args
+from indextts.utils.priority import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+# vllm 使用 fcfs 调度：priority 策略的 recompute 抢占会重新 prefill prompt 与已生成的 token，
+# GPT2TTSModel 的 prompt embeds 无法处理；请求优先级不传给 vllm
+# 用法: python tests/vllm_scheduling_test.py
+
+
+def test_engine_args_fcfs():
+    engine_args = build_engine_args("checkpoints/vllm", 0.25, enable_prefix_caching=True)
+    assert engine_args.scheduling_policy == "fcfs", engine_args.scheduling_policy
+    assert engine_args.enable_prefix_caching
+
+
+class RecordingLLM:
+    """记录 generate 的参数，直接返回一个已完成的输出"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate(self, prompt, sampling_params, request_id, **kwargs):
+        self.calls.append(kwargs)
+        yield SimpleNamespace(finished=True, outputs=[SimpleNamespace(token_ids=[5, 6, 7, 8, 9])])
+
+    async def abort(self, request_id):
+        raise AssertionError("finished request should not be aborted")
+
+
+def make_stub_gpt(llm):
+    """只提供 UnifiedVoice.inference_speech 用到的属性与方法"""
+    return SimpleNamespace(
+        llm=llm,
+        build_prompt_embeds=lambda speech_conditioning_latent, text_inputs: torch.zeros(1, 40, 8),
+        build_sampling_params=lambda sampling, seed, max_tokens: SimpleNamespace(max_tokens=10, logits_processors=None),
+        capture_hidden_states=False,
+        early_stop=False,
+        enable_prefix_caching=False,
+        stop_mel_token=8193,
+        aborted_requests=0,
+    )
+
+
+def test_priority_not_sent_to_vllm():
+    llm = RecordingLLM()
+    gpt = make_stub_gpt(llm)
+
+    async def generate_all():
+        return [
+            await UnifiedVoice.inference_speech(gpt, torch.zeros(1, 32, 8), torch.zeros(1, 6, dtype=torch.int32),
+                                                priority=priority)
+            for priority in [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+        ]
+
+    results = asyncio.run(generate_all())
+    assert [list(codes) for codes, _ in results] == [[5, 6, 7]] * 2
+    assert llm.calls == [{}, {}], llm.calls
+    assert gpt.aborted_requests == 0
+
+
+if __name__ == "__main__":
+    test_engine_args_fcfs()
+    test_priority_not_sent_to_vllm()
+    print("vllm scheduling test passed")
@@ -0,0 +1,143 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from omegaconf import OmegaConf
+
+from indextts.BigVGAN.models import BigVGAN
+from indextts.utils.vocoder_batcher import VocoderBatcher
+
+# 用随机初始化的小 BigVGAN 在 CPU 上验证：微批合成后切回的波形与逐条合成一致（补齐的 latent 末尾除外）
+# 用法: python tests/vocoder_batch_test.py
+
+
+def build_small_bigvgan():
+    h = OmegaConf.create({
+        "gpt_dim": 32,
+        "num_mels": 20,
+        "speaker_embedding_dim": 16,
+        "upsample_initial_channel": 32,
+        "upsample_rates": [4, 4],
+        "upsample_kernel_sizes": [8, 8],
+        "resblock": "1",
+        "resblock_kernel_sizes": [3],
+        "resblock_dilation_sizes": [[1, 3, 5]],
+        "activation": "snakebeta",
+        "snake_logscale": True,
+        "feat_upsample": False,
+        "cond_d_vector_in_each_upsampling_layer": True,
+    })
+    torch.manual_seed(0)
+    bigvgan = BigVGAN(h, use_cuda_kernel=False)
+    bigvgan.remove_weight_norm()
+    return bigvgan.eval()
+
+
+async def vocode_all(batcher, latents, speaker_embeddings):
+    return await asyncio.gather(*[
+        batcher.vocode(latent, speaker_embedding) for latent, speaker_embedding in zip(latents, speaker_embeddings)
+    ])
+
+
+# 补齐只影响较短 latent 末尾感受野内的输出：小 BigVGAN 的感受野（conv_pre、两级上采样与 resblock）不超过 ±10 帧，
+# 比较时最后 TAIL_MARGIN 帧只要求长度一致、差异有界，其余部分与逐条合成一致
+TAIL_MARGIN = 20
+TAIL_TOLERANCE = 0.5
+
+
+def test_batched_matches_unbatched():
+    bigvgan = build_small_bigvgan()
+    # 同一长度桶（32 帧一档）内不同长度的 latent 补齐后合成一个 batch，100 帧的单独一个 batch
+    lengths = [60, 45, 62, 33, 100, 50]
+    latents = [torch.randn(1, length, 32) for length in lengths]
+    speaker_embeddings = [bigvgan.compute_speaker_embedding([torch.randn(1, 50, 20)]) for _ in lengths]
+
+    # 在 event loop 上直接执行，以及像 IndexTTS 一样在专用线程上执行
+    for executor in [None, ThreadPoolExecutor(max_workers=1)]:
+        batcher = VocoderBatcher(bigvgan, max_batch_size=8, max_wait_ms=50, executor=executor)
+        batched = asyncio.run(vocode_all(batcher, latents, speaker_embeddings))
+
+        stats = batcher.get_stats()
+        assert stats["batches"] == 2 and stats["items"] == len(lengths), stats
+        assert stats["max_batch_size"] == 5 and stats["occupancy"] < 1.0, stats
+        assert batcher.hop_length == 16
+        check_matches_unbatched(bigvgan, latents, speaker_embeddings, batched, batcher.hop_length,
+                                unpadded_lengths={62, 100})
+
+
+def test_exact_length_batches():
+    bigvgan = build_small_bigvgan()
+    # bucket_frames=0：只合并等长的 latent，不补齐，整条波形与逐条合成一致
+    lengths = [60, 45, 60, 33, 45, 60]
+    latents = [torch.randn(1, length, 32) for length in lengths]
+    speaker_embeddings = [bigvgan.compute_speaker_embedding([torch.randn(1, 50, 20)]) for _ in lengths]
+    batcher = VocoderBatcher(bigvgan, max_batch_size=8, max_wait_ms=50, bucket_frames=0)
+    batched = asyncio.run(vocode_all(batcher, latents, speaker_embeddings))
+    stats = batcher.get_stats()
+    assert stats["batches"] == 3 and stats["max_batch_size"] == 3 and stats["occupancy"] == 1.0, stats
+    check_matches_unbatched(bigvgan, latents, speaker_embeddings, batched, batcher.hop_length)
+
+
+def check_matches_unbatched(bigvgan, latents, speaker_embeddings, batched, hop_length, unpadded_lengths=None):
+    """
+    unpadded_lengths 为各 batch 内最长（未补齐）的长度，None 表示都未补齐；
+    未补齐的 latent 整条波形都应一致，补齐的只比较最后 TAIL_MARGIN 帧之前的部分
+    """
+    with torch.no_grad():
+        for latent, speaker_embedding, wav_batched in zip(latents, speaker_embeddings, batched):
+            wav, _ = bigvgan(latent, None, speaker_embedding=speaker_embedding)
+            wav = wav.squeeze(1)
+            num_frames = latent.shape[1]
+            assert wav_batched.shape == wav.shape == (1, num_frames * hop_length), (wav_batched.shape, wav.shape)
+            exact_len = wav.shape[-1]
+            if unpadded_lengths is not None and num_frames not in unpadded_lengths:
+                exact_len = (num_frames - TAIL_MARGIN) * hop_length
+                tail_diff = (wav_batched[:, exact_len:] - wav[:, exact_len:]).abs().max().item()
+                assert tail_diff < TAIL_TOLERANCE, f"length {num_frames}: tail max abs diff {tail_diff}"
+            diff = (wav_batched[:, :exact_len] - wav[:, :exact_len]).abs().max().item()
+            assert diff < 1e-4, f"length {num_frames}: max abs diff {diff}"
+
+
+def test_batch_limits():
+    bigvgan = build_small_bigvgan()
+    latents = [torch.randn(1, 40, 32) for _ in range(5)]
+    speaker_embeddings = [bigvgan.compute_speaker_embedding([torch.randn(1, 50, 20)]) for _ in latents]
+
+    # 每个 batch 最多 2 条，或最多 100 个补齐后的 latent 帧
+    for batcher in [VocoderBatcher(bigvgan, max_batch_size=2, max_wait_ms=50),
+                    VocoderBatcher(bigvgan, max_batch_size=8, max_batch_frames=100, max_wait_ms=50)]:
+        wavs = asyncio.run(vocode_all(batcher, latents, speaker_embeddings))
+        stats = batcher.get_stats()
+        assert len(wavs) == len(latents)
+        assert stats["max_batch_size"] == 2 and stats["batches"] == 3, stats
+
+
+def test_cancelled_items_skipped():
+    bigvgan = build_small_bigvgan()
+    latents = [torch.randn(1, 40, 32) for _ in range(4)]
+    speaker_embeddings = [bigvgan.compute_speaker_embedding([torch.randn(1, 50, 20)]) for _ in latents]
+
+    async def vocode_and_cancel(batcher):
+        tasks = [asyncio.ensure_future(batcher.vocode(latent, speaker_embedding))
+                 for latent, speaker_embedding in zip(latents, speaker_embeddings)]
+        await asyncio.sleep(0)
+        # 收集窗口内取消其中两条（如客户端断开），它们不应再进入 bigvgan 前向
+        tasks[1].cancel()
+        tasks[3].cancel()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    batcher = VocoderBatcher(bigvgan, max_batch_size=8, max_wait_ms=50)
+    results = asyncio.run(vocode_and_cancel(batcher))
+    assert isinstance(results[1], asyncio.CancelledError) and isinstance(results[3], asyncio.CancelledError)
+    stats = batcher.get_stats()
+    assert stats["items"] == 2 and stats["cancelled"] == 2, stats
+
+
+if __name__ == "__main__":
+    test_batched_matches_unbatched()
+    test_exact_length_batches()
+    test_batch_limits()
+    test_cancelled_items_skipped()
+    print("vocoder batch test passed")
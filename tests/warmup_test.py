@@ -0,0 +1,93 @@
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+import asyncio
+import os
+import tempfile
+
+from prometheus_client import REGISTRY
+
+from indextts.utils.replica_router import StubTTS
+from indextts.utils.warmup import run_startup_warmup, select_warmup_speaker
+
+# 启动预热：各长度文本逐条、再并发合成一遍，返回各轮耗时，且不计入 prometheus 指标；
+# 失败时退避重试，全部失败后仍进入就绪；预热 speaker 只选参考音频都存在的
+# 用法: python tests/warmup_test.py
+
+TEXTS = ["你好。", "欢迎使用语音合成服务。", "大家好，我是一个语音合成模型。这是一段比较长的文字，用来测试多个句子。"]
+
+
+def test_warmup():
+    asyncio.run(check_warmup())
+
+
+async def check_warmup():
+    tts = StubTTS(seconds_per_char=0.001)
+    tts.add_speaker("alice", [])
+    audio_seconds = REGISTRY.get_sample_value("indextts_audio_seconds_total") or 0.0
+
+    report = await tts.warmup(speaker="alice", texts=TEXTS, rounds=3)
+    assert [r["mode"] for r in report["rounds"]] == ["sequential", "concurrent", "concurrent"], report
+    for round_report in report["rounds"]:
+        assert [item["chars"] for item in round_report["items"]] == [len(text) for text in TEXTS]
+        assert all(item["audio_seconds"] > 0 for item in round_report["items"])
+    assert report["seconds"] >= sum(r["seconds"] for r in report["rounds"]) - 1e-3
+    assert (REGISTRY.get_sample_value("indextts_audio_seconds_total") or 0.0) == audio_seconds
+
+    # 未指定 speaker 时走 infer（默认参考音频）
+    report = await tts.warmup(texts=TEXTS[:1], rounds=1)
+    assert report["speaker"] is None and len(report["rounds"]) == 1
+
+
+class FlakyTTS(StubTTS):
+    """前 failures 次预热抛出异常"""
+
+    def __init__(self, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    async def warmup(self, speaker=None, texts=None, rounds=2):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("CUDA out of memory")
+        return await super().warmup(speaker, texts, rounds)
+
+
+def test_retry():
+    asyncio.run(check_retry())
+
+
+async def check_retry():
+    # 失败后退避重试，成功即 done
+    tts = FlakyTTS(failures=2, seconds_per_char=0.001)
+    tts.add_speaker("alice", [])
+    state = {"status": "pending"}
+    await run_startup_warmup(tts, state, "alice", TEXTS[:1], rounds=1, attempts=3, backoff_seconds=0.01)
+    assert state["status"] == "done" and state["attempts"] == 3 and len(state["errors"]) == 2, state
+
+    # 全部失败：状态为 failed（/ready 仍然通过），带上最后一次的错误
+    tts = FlakyTTS(failures=5, seconds_per_char=0.001)
+    state = {"status": "pending"}
+    await run_startup_warmup(tts, state, "alice", TEXTS[:1], rounds=1, attempts=2, backoff_seconds=0.01)
+    assert state["status"] == "failed" and state["attempts"] == 2, state
+    assert "out of memory" in state["error"] and "finished_at" in state
+
+
+def test_select_speaker():
+    with tempfile.TemporaryDirectory() as root:
+        audio_path = os.path.join(root, "bob.wav")
+        open(audio_path, "wb").close()
+        speakers = {"alice": [os.path.join(root, "missing.wav")], "bob": [audio_path], "carol": []}
+        # 参考音频缺失的 speaker 不可用，指定的不可用时回退到第一个可用的
+        assert select_warmup_speaker(speakers) == "bob"
+        assert select_warmup_speaker(speakers, "bob") == "bob"
+        assert select_warmup_speaker(speakers, "alice") == "bob"
+        assert select_warmup_speaker(speakers, "dave") == "bob"
+        assert select_warmup_speaker({"alice": speakers["alice"]}, "alice") is None
+        assert select_warmup_speaker({}) is None
+
+
+if __name__ == "__main__":
+    test_warmup()
+    test_retry()
+    test_select_speaker()
+    print("warmup test passed")
@@ -0,0 +1,120 @@
+# speaker_store.py
+# 离线构建 / 导出 / 导入 speaker store，服务启动时即可直接读取，不再逐个计算 conditioning
+#   构建:  VLLM_USE_V1=0 python tools/speaker_store.py build --model_dir checkpoints
+#   查看:  python tools/speaker_store.py list
+#   导出:  python tools/speaker_store.py export speakers.tar [--speakers a b]
+#   导入:  python tools/speaker_store.py import speakers.tar
+#   清理:  python tools/speaker_store.py prune --model_dir checkpoints   # 删除模型版本不匹配的条目
+import argparse
+import json
+import os
+import tarfile
+
+import pyrootutils
+ROOT = pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from indextts.utils.speaker_store import SpeakerStore, checkpoint_version
+
+
+def load_speaker_json(speaker_json):
+    speaker_dict = json.load(open(speaker_json, "r", encoding="utf-8"))
+    return {
+        speaker: [str(ROOT / audio_path) for audio_path in audio_paths]
+        for speaker, audio_paths in speaker_dict.items()
+    }
+
+
+def model_version(model_dir):
+    from omegaconf import OmegaConf
+    cfg = OmegaConf.load(os.path.join(model_dir, "config.yaml"))
+    return checkpoint_version(os.path.join(model_dir, cfg.gpt_checkpoint), os.path.join(model_dir, cfg.bigvgan_checkpoint))
+
+
+def build(args):
+    from indextts.infer_vllm import IndexTTS
+
+    tts = IndexTTS(model_dir=args.model_dir, cfg_path=os.path.join(args.model_dir, "config.yaml"),
+                   gpu_memory_utilization=args.gpu_memory_utilization, speaker_store_dir=args.store_dir)
+    speakers = load_speaker_json(args.speaker_json)
+    for speaker, audio_paths in speakers.items():
+        # 已存在且未过期的条目直接读取，只计算缺失的
+        tts.registry_speaker(speaker, audio_paths)
+    print(f"speaker store at {args.store_dir}: {len(speakers)} speakers")
+
+
+def list_entries(args):
+    store = SpeakerStore(args.store_dir, model_version="")
+    for key, metadata in store.entries():
+        audio_paths = json.loads(metadata.get("audio_paths", "[]"))
+        print(f"{key[:16]}  {metadata.get('model_version', '?'):16}  {metadata.get('speaker', '?')}  ({len(audio_paths)} refs)")
+
+
+def prune(args):
+    store = SpeakerStore(args.store_dir, model_version=model_version(args.model_dir))
+    removed = 0
+    for key, metadata in list(store.entries()):
+        if metadata.get("model_version") != store.model_version:
+            os.remove(store.path(key))
+            removed += 1
+    print(f"removed {removed} stale entries")
+
+
+def export(args):
+    store = SpeakerStore(args.store_dir, model_version="")
+    count = 0
+    with tarfile.open(args.archive, "w") as tar:
+        for key, metadata in store.entries():
+            if args.speakers and metadata.get("speaker") not in args.speakers:
+                continue
+            tar.add(store.path(key), arcname=os.path.basename(store.path(key)))
+            count += 1
+    print(f"exported {count} entries to {args.archive}")
+
+
+def import_entries(args):
+    store = SpeakerStore(args.store_dir, model_version="")
+    count = 0
+    with tarfile.open(args.archive, "r") as tar:
+        for member in tar.getmembers():
+            name = os.path.basename(member.name)
+            if not member.isfile() or not name.endswith(".safetensors"):
+                continue
+            with tar.extractfile(member) as src, open(os.path.join(store.store_dir, name), "wb") as dst:
+                dst.write(src.read())
+            count += 1
+    print(f"imported {count} entries into {args.store_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IndexTTS speaker store")
+    parser.add_argument("--store_dir", type=str, default=str(ROOT / "assets/speaker_store"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="register all speakers in speaker.json into the store")
+    build_parser.add_argument("--model_dir", type=str, default=str(ROOT / "checkpoints"))
+    build_parser.add_argument("--speaker_json", type=str, default=str(ROOT / "assets/speaker.json"))
+    build_parser.add_argument("--gpu_memory_utilization", type=float, default=0.25)
+    build_parser.set_defaults(func=build)
+
+    list_parser = subparsers.add_parser("list", help="list store entries")
+    list_parser.set_defaults(func=list_entries)
+
+    prune_parser = subparsers.add_parser("prune", help="remove entries built with another model version")
+    prune_parser.add_argument("--model_dir", type=str, default=str(ROOT / "checkpoints"))
+    prune_parser.set_defaults(func=prune)
+
+    export_parser = subparsers.add_parser("export", help="pack store entries into a tar archive")
+    export_parser.add_argument("archive", type=str)
+    export_parser.add_argument("--speakers", nargs="*", default=None)
+    export_parser.set_defaults(func=export)
+
+    import_parser = subparsers.add_parser("import", help="unpack a tar archive into the store")
+    import_parser.add_argument("archive", type=str)
+    import_parser.set_defaults(func=import_entries)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()